@@ -0,0 +1,242 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from constants import (
+    EMBEDDING_DIMENSION,
+    IVF_N_LISTS,
+    IVF_NPROBE,
+    IVF_TRAIN_ITERATIONS,
+    IVF_TRAIN_SAMPLE_SIZE,
+    IVF_MIN_ROWS_PER_LIST,
+    IVF_INDEX_PATH,
+)
+from local_search_index import LocalVectorIndex, normalize_query, normalize_rows
+
+'''
+Approximate nearest-neighbour search: inverted-file (IVF) index
+
+Training clusters the normalised embeddings into n_lists centroids with
+spherical k-means; every row is stored in the inverted list of its nearest
+centroid. A query is compared with the centroids first and only the rows of the
+nprobe closest lists are scored, so a search touches roughly nprobe / n_lists of
+the corpus. Larger nprobe means higher recall and more work; nprobe == n_lists
+is an exact scan. Filtering, thresholds and result rows are the same as
+LocalVectorIndex.
+'''
+
+_ASSIGN_BLOCK_SIZE = 65536 # rows scored against the centroids at a time
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK_SIZE):
+        block = vectors[start:start + _ASSIGN_BLOCK_SIZE]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = IVF_TRAIN_ITERATIONS, seed: int = 0) -> np.ndarray:
+    '''k-means on unit vectors using cosine similarity; returns normalised centroids'''
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty clusters with random points
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+@dataclass
+class IVFConfig:
+    n_lists: int = IVF_N_LISTS # number of centroids / inverted lists (build time)
+    nprobe: int = IVF_NPROBE # lists scanned per query (query time, recall vs latency)
+    train_iterations: int = IVF_TRAIN_ITERATIONS
+    train_sample_size: int = IVF_TRAIN_SAMPLE_SIZE
+    index_path: str = IVF_INDEX_PATH # saved index, reused across restarts; empty to disable
+
+    @classmethod
+    def from_env(cls, env_vars: Dict[str, str]) -> "IVFConfig":
+        return cls(
+            n_lists=int(env_vars.get("IVF_N_LISTS", IVF_N_LISTS)),
+            nprobe=int(env_vars.get("IVF_NPROBE", IVF_NPROBE)),
+            train_iterations=int(env_vars.get("IVF_TRAIN_ITERATIONS", IVF_TRAIN_ITERATIONS)),
+            train_sample_size=int(env_vars.get("IVF_TRAIN_SAMPLE_SIZE", IVF_TRAIN_SAMPLE_SIZE)),
+            index_path=env_vars.get("IVF_INDEX_PATH", IVF_INDEX_PATH),
+        )
+
+
+class IVFIndex(LocalVectorIndex):
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, n_lists: int = IVF_N_LISTS, nprobe: int = IVF_NPROBE,
+                 train_iterations: int = IVF_TRAIN_ITERATIONS, train_sample_size: int = IVF_TRAIN_SAMPLE_SIZE,
+                 initial_capacity: int = 1024, embedding_model: str = ""):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.train_sample_size = train_sample_size
+        super().__init__(dimension, initial_capacity, embedding_model)
+
+    def _reset(self):
+        super()._reset()
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = [] # cached np views of _lists
+
+    @classmethod
+    def from_config(cls, config: IVFConfig, dimension: int = EMBEDDING_DIMENSION, embedding_model: str = "") -> "IVFIndex":
+        return cls(dimension, n_lists=config.n_lists, nprobe=config.nprobe,
+                   train_iterations=config.train_iterations, train_sample_size=config.train_sample_size,
+                   embedding_model=embedding_model)
+
+    @classmethod
+    def open(cls, config: IVFConfig, rag_system, dimension: int = EMBEDDING_DIMENSION) -> "IVFIndex":
+        '''
+        Load the index saved at config.index_path and add rows stored since,
+        or build it from bug_embeddings (and save it) when there is no saved index,
+        the saved one holds vectors of another embedding model or embeddings were
+        removed since it was built.
+        '''
+        index = cls.from_config(config, dimension, rag_system.embedding_model)
+        if config.index_path and os.path.exists(config.index_path):
+            index.load_file(config.index_path)
+        if index.embedding_model != rag_system.embedding_model or index.dimension != dimension:
+            logging.info(f"Saved index is for {index.embedding_model or 'an unknown model'}, rebuilding for {rag_system.embedding_model}")
+            index = cls.from_config(config, dimension, rag_system.embedding_model)
+        elif len(index) and index.removal_generation != (rag_system.get_embedding_removals() or index.removal_generation):
+            logging.info("Embeddings were removed since the saved index was built, rebuilding it")
+            index = cls.from_config(config, dimension, rag_system.embedding_model)
+        if len(index):
+            # build parameters come from the file; the query-time parameter from config
+            index.nprobe = config.nprobe
+            index.load(rag_system)
+        else:
+            index.load(rag_system)
+            if config.index_path and index.is_trained:
+                index.save(config.index_path)
+        return index
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def min_train_rows(self) -> int:
+        # below this, centroids are poorly estimated and an exact scan is cheap anyway
+        return self.n_lists * IVF_MIN_ROWS_PER_LIST
+
+    def train(self, seed: int = 0):
+        '''Cluster the stored rows and rebuild the inverted lists'''
+        with self._lock:
+            if self._size == 0:
+                return
+            started = time.monotonic()
+            vectors = self._matrix[:self._size]
+            if self._size > self.train_sample_size:
+                sample = np.random.default_rng(seed).choice(self._size, self.train_sample_size, replace=False)
+                vectors = vectors[sample]
+            self.centroids = spherical_kmeans(vectors, self.n_lists, self.train_iterations, seed)
+            self._lists = [[] for _ in range(len(self.centroids))]
+            self._list_arrays = [None] * len(self.centroids)
+            self._assign(0, self._size)
+            logging.info(f"Trained IVF index: {len(self.centroids)} lists over {self._size} rows in {(time.monotonic() - started) * 1000:.0f} ms")
+
+    def _assign(self, start: int, end: int):
+        # caller holds self._lock; put rows [start, end) in the list of their nearest centroid
+        assignments = _nearest_centroids(self._matrix[start:end], self.centroids)
+        for position, list_id in zip(range(start, end), assignments):
+            self._lists[list_id].append(position)
+            self._list_arrays[list_id] = None
+
+    def add(self, rows: List[Dict]):
+        '''Add rows; once trained, new rows go straight into their nearest list'''
+        with self._lock:
+            start = self._size
+            super().add(rows)
+            if self.is_trained:
+                self._assign(start, self._size)
+            elif self._size >= self.min_train_rows:
+                self.train()
+
+    def _list_array(self, list_id: int) -> np.ndarray:
+        array = self._list_arrays[list_id]
+        if array is None:
+            array = self._list_arrays[list_id] = np.array(self._lists[list_id], dtype=np.int64)
+        return array
+
+    def search(self, query_embedding, limit: int = 5, content_type: str = None, product_filter: str = None,
+               similarity_threshold: float = 0.8, group_by_bug: bool = False, aggregation: str = "max",
+               weights: Optional[Dict[str, float]] = None, nprobe: Optional[int] = None) -> List[Dict]:
+        '''Approximate top `limit` rows (distinct bugs with group_by_bug), scanning the nprobe lists closest to the query'''
+        with self._lock:
+            if not self.is_trained:
+                return super().search(query_embedding, limit, content_type, product_filter, similarity_threshold,
+                                      group_by_bug, aggregation, weights)
+            if self._size == 0 or limit <= 0:
+                return []
+            query = normalize_query(query_embedding)
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            centroid_scores = self.centroids @ query
+            probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+            positions = np.concatenate([self._list_array(int(list_id)) for list_id in probe])
+            if positions.size == 0:
+                return []
+            scores = self._matrix[positions] @ query
+            if group_by_bug:
+                return self._top_k_grouped(scores, limit, content_type, product_filter, similarity_threshold,
+                                           aggregation, weights, positions=positions)
+            return self._top_k(scores, limit, content_type, product_filter, similarity_threshold, positions=positions)
+
+    def search_many(self, query_embeddings: List, searches: List[Dict]) -> List[List[Dict]]:
+        '''Approximate searches; each query probes its own lists, so they are run one by one'''
+        with self._lock:
+            if not self.is_trained:
+                return super().search_many(query_embeddings, searches)
+            return [self.search(query, **search) for query, search in zip(query_embeddings, searches)]
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = super()._state()
+        if self.is_trained:
+            state["centroids"] = self.centroids
+            assignments = np.empty(self._size, dtype=np.int32)
+            for list_id, positions in enumerate(self._lists):
+                assignments[positions] = list_id
+            state["assignments"] = assignments
+        return state
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        super()._restore(state)
+        if "centroids" in state:
+            self.n_lists = len(state["centroids"])
+            self.centroids = state["centroids"].astype(np.float32)
+            self._lists = [[] for _ in range(len(self.centroids))]
+            self._list_arrays = [None] * len(self.centroids)
+            for position, list_id in enumerate(state["assignments"]):
+                self._lists[list_id].append(position)
+
+
+if __name__ == "__main__":
+    # rebuild the saved index from bug_embeddings: python ann_index.py
+    from config import get_env_vars
+    from rag_service import get_rag_system
+
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        level=logging.INFO
+    )
+    config = IVFConfig.from_env(get_env_vars())
+    rag_system = get_rag_system()
+    index = IVFIndex.from_config(config, rag_system.embedding_dimension, rag_system.embedding_model)
+    index.load(rag_system)
+    index.train()
+    index.save(config.index_path)
@@ -1,13 +1,17 @@
-from flask import Flask,request,jsonify
+from flask import Flask,request,jsonify,Response,stream_with_context
 from flask_cors import CORS
 from flask import Flask
 import os
+import re
+import uuid
 import logging
-import chardet
-import pandas as pd
 from werkzeug.utils import secure_filename
-from handler_ingest_data import ingest_data_from_dataframe
-from handler_search import search_bugs
+from handler_search import search_bugs, search_bugs_batch, BugSearchParams
+from handler_incidents import list_incidents, stream_incidents
+from handler_db_details import get_cache_stats
+from handler_generate_bot_response import send_bot_response, stream_bot_response
+from generation_registry import get_generation_registry
+from constants import SEARCH_BATCH_MAX_QUERIES, INCIDENT_PAGE_SIZE, INCIDENT_MAX_PAGE_SIZE, STREAM_RESPONSE, APP_PORT
 from config import read_env_file
 from handler_tool_manager import tool_handler
 from tool_manager import Result
@@ -38,52 +42,6 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def detect_file_encoding(file_path):
-    try:
-        with open(file_path,'rb') as f:
-            logging.info(f"Trying to detect file encoding")
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding=result['encoding']
-            confidence = result['confidence']
-            logging.info(f"File encoding detected as {encoding} with confidence {confidence}")
-            return encoding
-    except Exception as e:
-        logging.error(f"Error detecting file encoding: {e}")
-        return 'utf-8'
-
-def read_csv_with_encoding_detection(file_path):
-    encoding_to_try = [
-        'utf-8',
-        'utf-8-sig',
-        'windows-1252',
-        'iso-8859-1',
-        'cp1252',
-        'ascii'
-
-    ]
-
-    detected_encoding = detect_file_encoding(file_path)
-    if detected_encoding:
-        encoding_to_try.insert(0, detected_encoding)
-
-    #remove duplicates while preserving order
-    encoding_to_try = list(dict.fromkeys(encoding_to_try))
-
-    for encoding in encoding_to_try:
-        try:
-            logging.info(f"Trying to read file with encoding {encoding}")
-            df = pd.read_csv(file_path, encoding=encoding)
-            print(df.columns)
-            logging.info(f"Successfully read file with encoding {encoding}")
-            return df
-        except Exception as e:
-            logging.error(f"Error reading file with encoding {encoding}: {str(e)}")
-
-            continue
-    raise ValueError(f"Could not read file with any of the following encodings: {', '.join(encoding_to_try)}")
-    
-
 @app.route('/')
 def index():
     return 'hello world'
@@ -92,6 +50,10 @@ def index():
 @app.route('/api/ingest',methods=['POST'])
 def ingest_bug_data():
     #ingest data into system from uploaded csv file
+    #the ingestion stack (pandas, chardet) is imported on first use, workers that only search never load it
+    from handler_ingest_data import ingest_data_from_dataframe, ingest_data_from_chunks
+    from csv_reader import read_csv_with_encoding_detection, sniff_encoding, iter_csv_chunks
+    from ingest_jobs import get_job_manager
     try:
         if 'file' not in request.files:
             return jsonify({
@@ -110,17 +72,34 @@ def ingest_bug_data():
 
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
+            if request.form.get('async', 'true').lower() != 'false':
+                #queue a background job and return its id straight away
+                job = get_job_manager().submit(filename, file.save)
+                return jsonify({
+                    'error':False,
+                    'message':'Ingestion job queued',
+                    'job_id':job.job_id,
+                    'status_url':f"/api/ingest/{job.job_id}"
+                }),202
+
             file_path = os.path.join(UPLOAD_FOLDER, filename)
             logging.info(f"Saving file to {file_path}")
             file.save(file_path)
             logging.info("File saved successfully")
-            #read csv file into dataframe with encoding detection
-            df = read_csv_with_encoding_detection(file_path)
-            logging.info("File read successfully")
-            result= ingest_data_from_dataframe(df)
-            logging.info("Data ingested successfully")
-            #clean up the uploaded file
-            os.remove(file_path)
+            try:
+                if request.form.get('stream', 'true').lower() != 'false':
+                    #stream the csv in chunks so memory stays flat for large exports
+                    encoding = sniff_encoding(file_path)
+                    result = ingest_data_from_chunks(iter_csv_chunks(file_path, encoding))
+                else:
+                    #read csv file into dataframe with encoding detection
+                    df = read_csv_with_encoding_detection(file_path)
+                    logging.info("File read successfully")
+                    result= ingest_data_from_dataframe(df)
+                logging.info("Data ingested successfully")
+            finally:
+                #clean up the uploaded file
+                os.remove(file_path)
 
             return jsonify({
                 'error':False,
@@ -136,6 +115,28 @@ def ingest_bug_data():
             'error':True,
             'message': 'Error processing request'}), 500
 
+@app.route('/api/ingest/<job_id>', methods=['GET'])
+def get_ingest_job_status(job_id):
+    #progress of a background ingestion job
+    from ingest_jobs import get_job_manager
+    try:
+        status = get_job_manager().get_status(secure_filename(job_id))
+        if status is None:
+            return jsonify({
+                'error':True,
+                'message': f'Ingestion job {job_id} not found'
+                }), 404
+        return jsonify({
+            'error':False,
+            'message': 'Request processed successfully',
+            **status
+            }), 200
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return jsonify({
+            'error':True,
+            'message': 'Error processing request'}), 500
+
 #search DB for specific query 
 @app.route('/api/search', methods=['POST'])
 def search_database():
@@ -149,13 +150,23 @@ def search_database():
     content_type = request.json.get('content_type',None)
     product_filter = request.json.get('product_filter',None)
     similarity_threshold = request.json.get('similarity_threshold',0.5)
+    #one row per distinct bug, scored by max or weighted similarity across content types
+    group_by_bug = request.json.get('group_by_bug',False)
+    aggregation = request.json.get('aggregation','max')
+    if aggregation not in ('max', 'weighted'):
+        return jsonify({
+            'error':True,
+            'message': 'aggregation must be max or weighted'
+            }), 400
 
     results = search_bugs(
         query=query,
         limit=limit,
         content_type=content_type,
         product_filter=product_filter,
-        similarity_threshold=similarity_threshold
+        similarity_threshold=similarity_threshold,
+        group_by_bug=group_by_bug,
+        aggregation=aggregation
     )
 
     return jsonify({
@@ -164,6 +175,100 @@ def search_database():
         'results': results
         }), 200
 
+#search DB for many queries at once
+@app.route('/api/search/batch', methods=['POST'])
+def search_database_batch():
+    #queries is a list of strings or of objects with query and optional per-query filters;
+    #top level limit/content_type/product_filter/similarity_threshold/group_by_bug/aggregation apply to every query
+    try:
+        data = request.get_json()
+        queries = data.get('queries', [])
+        if not isinstance(queries, list) or not queries:
+            return jsonify({
+                'error':True,
+                'message': 'queries must be a non-empty list'
+                }), 400
+        if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({
+                'error':True,
+                'message': f'At most {SEARCH_BATCH_MAX_QUERIES} queries per request'
+                }), 400
+        logging.info(f"Batch search request received: {len(queries)} queries")
+
+        shared = {
+            'limit': data.get('limit',5),
+            'content_type': data.get('content_type',None),
+            'product_filter': data.get('product_filter',None),
+            'similarity_threshold': data.get('similarity_threshold',0.5),
+            'group_by_bug': data.get('group_by_bug',False),
+            'aggregation': data.get('aggregation','max'),
+        }
+        searches = []
+        for item in queries:
+            item = {'query': item} if isinstance(item, str) else item
+            searches.append(BugSearchParams(
+                query=item.get('query',''),
+                **{name: item.get(name, value) for name, value in shared.items()}
+            ))
+
+        if any(params.aggregation not in ('max', 'weighted') for params in searches):
+            return jsonify({
+                'error':True,
+                'message': 'aggregation must be max or weighted'
+                }), 400
+
+        results = search_bugs_batch(searches)
+        return jsonify({
+            'error':False,
+            'message': 'Request processed successfully',
+            'results': [
+                {'query': params.query, 'bugs': result.bugs, 'report': result.report}
+                for params, result in zip(searches, results)
+            ]
+            }), 200
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return jsonify({
+            'error':True,
+            'message': 'Error processing request'}), 500
+
+#list incidents created in the last N days, page by page or streamed as NDJSON
+@app.route('/api/incidents', methods=['GET'])
+def get_incidents():
+    #query parameters: days (default 7), columns (comma separated), page_size and cursor (from next_cursor);
+    #format=ndjson (or Accept: application/x-ndjson) streams the whole window instead of one page
+    try:
+        days = int(request.args.get('days', 7))
+        page_size = int(request.args.get('page_size', INCIDENT_PAGE_SIZE))
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()] or None
+        if days < 0 or not 1 <= page_size <= INCIDENT_MAX_PAGE_SIZE:
+            return jsonify({
+                'error':True,
+                'message': f'days must be >= 0 and page_size between 1 and {INCIDENT_MAX_PAGE_SIZE}'
+                }), 400
+        ndjson = (request.args.get('format') == 'ndjson'
+                  or request.accept_mimetypes.best == 'application/x-ndjson')
+        if ndjson:
+            chunks = stream_incidents(days, columns)
+            return Response(stream_with_context(chunks), mimetype='application/x-ndjson')
+
+        page = list_incidents(days, page_size, request.args.get('cursor') or None, columns)
+        return jsonify({
+            'error':False,
+            'message': 'Request processed successfully',
+            **page
+            }), 200
+    except ValueError as e:
+        return jsonify({
+            'error':True,
+            'message': str(e)
+            }), 400
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return jsonify({
+            'error':True,
+            'message': 'Error processing request'}), 500
+
 #get count of various database entities.
 
 # @app.route('/api/db/stats', methods=['GET'])
@@ -177,14 +282,99 @@ def search_database():
 #             'error':True,
 #             'message': 'Error processing request'}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    #cache statistics of the worker process that serves the request
+    try:
+        return jsonify({
+            'error':False,
+            'message': 'Request processed successfully',
+            'data': get_cache_stats()
+            }), 200
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return jsonify({
+            'error':True,
+            'message': 'Error processing request'}), 500
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    #answer the last message of the conversation; streamed as Server-Sent Events unless stream is false
+    #the request id (request_id field or X-Request-ID header, generated when absent) is what DELETE /api/chat cancels
+    try:
+        data = request.get_json()
+        if not data or not data.get('messages'):
+            return jsonify({
+                'error':True,
+                'message': 'messages is required'
+                }), 400
+        request_id = data.get('request_id') or request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        if not REQUEST_ID_PATTERN.match(request_id):
+            return jsonify({
+                'error':True,
+                'message': 'request_id must be 1-64 letters, digits, - or _'
+                }), 400
+
+        if not data.get('stream', STREAM_RESPONSE):
+            message = send_bot_response(data)
+            return jsonify({
+                'error':False,
+                'message': 'Request processed successfully',
+                'request_id': request_id,
+                'response': message
+                }), 200
+
+        try:
+            events = stream_bot_response(data, request_id)
+        except ValueError as e:
+            return jsonify({
+                'error':True,
+                'message': str(e)
+                }), 409
+        try:
+            response = Response(
+                stream_with_context(events),
+                mimetype='text/event-stream',
+                #no proxy buffering, or the first tokens would be held back
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Request-ID': request_id}
+            )
+            #releases the request id also when the stream is never iterated (client gone before the first chunk)
+            response.call_on_close(events.close)
+            return response
+        except Exception:
+            events.close()
+            raise
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return jsonify({
+            'error':True,
+            'message': 'Error processing request'}), 500
+
 @app.route('/api/chat', methods=['DELETE'])
 def stop_response_generation():
-    #stop the response generation
+    #stop the response generation of request_id (JSON body, query parameter or X-Request-ID header)
     try:
+        data = request.get_json(silent=True) or {}
+        request_id = data.get('request_id') or request.args.get('request_id') or request.headers.get('X-Request-ID')
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            return jsonify({
+                'error':True,
+                'message': 'request_id is required'
+                }), 400
+        if get_generation_registry().cancel(request_id):
+            return jsonify({
+                'error':False,
+                'message': 'Response generation stopped successfully',
+                'request_id': request_id
+                }), 200
+        #not running in this worker: the worker that runs it picks up the cancel marker
         return jsonify({
             'error':False,
-            'message': 'Response generation stopped successfully'
-            }), 200
+            'message': 'Response generation cancellation requested',
+            'request_id': request_id
+            }), 202
 
     except Exception as e:
         logging.error(f"Error processing request: {e}")
@@ -238,6 +428,11 @@ if __name__ == '__main__':
     if not os.path.exists(BUILD_DIR):
         print(f"warning:React build directory {BUILD_DIR} does not exist")
 
+    #pick up ingestion jobs interrupted by a crash or restart
+    from ingest_jobs import get_job_manager
+    get_job_manager()
+
+    #development server; gunicorn.conf.py is the production entry point
     env_cfg = read_env_file()
-    app_port = env_cfg.get("APP_PORT",5000)
+    app_port = env_cfg.get("APP_PORT",APP_PORT)
     app.run(host='0.0.0.0', port=app_port, debug=True)
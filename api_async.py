@@ -0,0 +1,542 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import re
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+from aiohttp import web
+from werkzeug.http import http_date
+
+from bug_rag_system import IncidentSummary, make_incident_summary, is_identifier_query, vector_literal
+from config import get_env_vars, get_db_config, read_env_file
+from constants import (
+    ASYNC_APP_PORT,
+    CONTEXT_CANDIDATES,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    STREAM_RESPONSE,
+)
+from context_builder import ContextResult
+from generation_registry import get_generation_registry
+from handler_db_details import get_cache_stats
+from handler_generate_bot_response import (
+    add_response_to_history,
+    add_system_prompt,
+    create_request_messages_from_payload,
+    sse_event,
+)
+from handler_search import BugSearchResults, generate_bug_report
+from handler_tool_manager import tool_handler
+from intent_parser import INCIDENTS_BY_DAYS_TOOL, parse_tool_call
+from llm_client import acreate_chat_completion, acreate_embeddings, create_async_client
+from local_search_index import parse_vector
+from rag_service import get_rag_system
+from result_data import Result
+from schema import INCIDENT_SUMMARY_QUERY, INCIDENT_NUMBERS_QUERY, INCIDENT_DETAILS_QUERY, search_settings_sql
+from schema import EXACT_INCIDENT_QUERY, EXACT_PHRASE_QUERY, SEARCH_FUNCTION_QUERY, GROUPED_SEARCH_FUNCTION_QUERY
+
+'''
+asyncio serving mode for /api/search, /api/chat, /api/toolcall_days and /api/cache/stats
+
+Same routes, request fields and JSON shapes as api.py, served by aiohttp on one
+event loop per process, with an asyncpg pool for Postgres and an AsyncOpenAI
+client for the model server, so a worker waiting on the database or the model
+keeps serving other requests instead of holding a thread.
+
+Within a search, the query embedding (embedding cache first), the exact-match
+lookup of identifier queries and the data generation read (for the result cache)
+run concurrently; /api/toolcall_days runs the summary, incident-number and detail
+queries in one read-only transaction, so they describe the same window.
+
+Work that is CPU bound or only has a synchronous client stays on the shared
+BugRagSystem and runs in the loop's thread pool: the in-process index backends
+(SEARCH_BACKEND local/ivf/quantized), the data generation / active model poll
+and the tool-calling LLM fallback for messages the intent parser cannot resolve.
+The result and embedding caches are the same objects the Flask handlers use.
+
+    python api_async.py                   # port ASYNC_APP_PORT (.env) or 5001
+    gunicorn 'api_async:create_app()' --worker-class aiohttp.GunicornWebWorker
+    python benchmark_concurrency.py       # compare with the Flask app
+'''
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-Request-ID',
+    'Access-Control-Expose-Headers': 'X-Request-ID',
+}
+
+
+def _json_default(value: Any):
+    # what Flask's jsonify does for the types in our responses
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_response(data: Any, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, dumps=partial(json.dumps, default=_json_default))
+
+
+_NAMED_PARAMETER = re.compile(r"%\((\w+)\)s")
+
+
+def _asyncpg_query(sql: str, params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    # the shared queries name their parameters %(name)s (psycopg2); asyncpg numbers them
+    names: List[str] = []
+
+    def number(match) -> str:
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    sql = _NAMED_PARAMETER.sub(number, sql)
+    return sql, [params[name] for name in names]
+
+
+class AsyncBugService:
+    '''Search, chat context and incident summaries over asyncpg and an async model client'''
+
+    def __init__(self, pool: asyncpg.Pool, llm, rag_system, env_vars: dict):
+        self.pool = pool
+        self.llm = llm
+        self.rag_system = rag_system
+        self.chat_model = env_vars.get("CHAT_MODEL_NAME")
+
+    async def _in_thread(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args, **kwargs))
+
+    async def generate_embedding(self, text: str) -> List[float]:
+        rag_system = self.rag_system
+        model = rag_system.embedding_model
+        if rag_system.embedding_cache is not None:
+            cached = rag_system.embedding_cache.get(model, text)
+            if cached is not None:
+                return cached
+        response = await acreate_embeddings(self.llm, model, text)
+        embedding = response.data[0].embedding
+        if rag_system.embedding_cache is not None:
+            rag_system.embedding_cache.put(model, text, embedding)
+        return embedding
+
+    async def find_exact_matches(self, identifier: str, limit: int = 5, product_filter: str = None) -> List[Dict]:
+        #same lookup as BugRagSystem.find_exact_matches
+        identifier = identifier.strip()
+        params = {"identifiers": list({identifier, identifier.upper()}), "identifier": identifier,
+                  "product_filter": product_filter, "limit": limit}
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(*_asyncpg_query(EXACT_INCIDENT_QUERY, params))
+            if not rows:
+                rows = await conn.fetch(*_asyncpg_query(EXACT_PHRASE_QUERY, params))
+        return [dict(row) for row in rows]
+
+    async def vector_search(self, query: str, embedding: List[float], limit: int, content_type: str, product_filter: str,
+                            similarity_threshold: float, group_by_bug: bool, aggregation: str) -> List[Dict]:
+        #search_similar_bugs(_grouped) in the database; the vector and weights go over as text
+        rag_system = self.rag_system
+        params = rag_system.search_function_params(query, vector_literal(embedding), limit, content_type, product_filter,
+                                                   similarity_threshold, aggregation)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(search_settings_sql(rag_system.vector_index_config))
+                rows = await conn.fetch(*_asyncpg_query(
+                    GROUPED_SEARCH_FUNCTION_QUERY if group_by_bug else SEARCH_FUNCTION_QUERY, params))
+        return [dict(row) for row in rows]
+
+    async def search(self, query: str, limit: int = 5, content_type: str = None, product_filter: str = None,
+                     similarity_threshold: float = 0.7, group_by_bug: bool = False, aggregation: str = "max") -> BugSearchResults:
+        '''handler_search.search_bugs, with the independent lookups in flight together'''
+        rag_system = self.rag_system
+        cache = rag_system.search_cache
+        in_process = rag_system.search_backend in ("local", "ivf", "quantized")
+        #read before searching, so a write during the search makes the cache entry stale
+        generation_task = asyncio.ensure_future(self._in_thread(rag_system.get_data_generation)) if cache is not None else None
+        embedding_task = exact_task = None
+        if not in_process:
+            embedding_task = asyncio.ensure_future(self.generate_embedding(query))
+            if rag_system.hybrid_search and is_identifier_query(query):
+                exact_task = asyncio.ensure_future(self.find_exact_matches(query, limit, product_filter))
+        try:
+            if cache is not None:
+                key = cache.make_key(query, limit, content_type, product_filter, similarity_threshold, rag_system.embedding_model, group_by_bug, aggregation)
+                generation = await generation_task
+                cached = cache.get(key, generation)
+                if cached is not None:
+                    logging.info(f"search cache hit, {len(cached.bugs)} similar bugs")
+                    return cached
+
+            started = time.monotonic()
+            search = dict(limit=limit, content_type=content_type, product_filter=product_filter,
+                          similarity_threshold=similarity_threshold, group_by_bug=group_by_bug, aggregation=aggregation)
+            try:
+                if in_process:
+                    results = await self._in_thread(rag_system.search_similar_bugs, query=query, **search)
+                else:
+                    results = await exact_task if exact_task is not None else []
+                    if results:
+                        logging.info(f"Exact match for {query!r}: {len(results)} bugs")
+                    else:
+                        results = await self.vector_search(query, await embedding_task, **search)
+            except Exception as e:
+                logging.error(f"Error in search: {e}")
+                results = []
+            search_results = BugSearchResults(bugs=results, report=generate_bug_report(results))
+            #empty results are not cached, as in search_bugs
+            if cache is not None and results:
+                cache.put(key, generation, search_results, time.monotonic() - started)
+            return search_results
+        finally:
+            #a cache hit or an exact match leaves the embedding request unused
+            for task in (embedding_task, exact_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def get_stored_embeddings(self, bug_ids: List[int], content_type: str = "resolution") -> Dict[int, Any]:
+        if not bug_ids:
+            return {}
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT bug_id, embedding::text
+                    FROM bug_embeddings
+                    WHERE bug_id = any($1::int[])
+                      AND content_type = $2
+                      AND (embedding_model = $3 OR embedding_model IS NULL)
+                """, list(bug_ids), content_type, self.rag_system.embedding_model)
+            return {row[0]: parse_vector(row[1]) for row in rows}
+        except Exception as e:
+            logging.error(f"Error reading stored embeddings: {e}")
+            return {}
+
+    async def prepare_request_messages(self, payload) -> Tuple[List[Dict[str, str]], BugSearchResults, ContextResult]:
+        #handler_generate_bot_response.prepare_request_messages
+        request_messages = create_request_messages_from_payload(payload['messages'])
+        query = request_messages[-1]['content'] if request_messages else ""
+        result = await self.search(query=query, limit=CONTEXT_CANDIDATES)
+        embeddings = await self.get_stored_embeddings([bug['bug_id'] for bug in result.bugs])
+        request_messages, context = add_system_prompt(request_messages, query, result, embeddings)
+        return request_messages, result, context
+
+    async def get_incidents_by_days(self, days: int, include_details: bool = False) -> IncidentSummary:
+        #BugRagSystem.get_incidents_by_days; one read-only snapshot, so every query sees the same
+        #rows and the same localtimestamp, and the count matches the incident numbers
+        params = {"days": days}
+        details = []
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                summary = await conn.fetch(*_asyncpg_query(INCIDENT_SUMMARY_QUERY, params))
+                numbers = await conn.fetch(*_asyncpg_query(INCIDENT_NUMBERS_QUERY, params))
+                if include_details:
+                    details = await conn.fetch(*_asyncpg_query(INCIDENT_DETAILS_QUERY, params))
+        count, users, priority_counts = summary[0]
+        return make_incident_summary(
+            count, users, json.loads(priority_counts),
+            [row[0] for row in numbers],
+            [dict(row) for row in details],
+        )
+
+    async def incidents_by_days_tool(self, days: int, include_details: bool = False) -> Result:
+        #tool_find_days.get_incidents_by_days_tool
+        try:
+            incidents = await self.get_incidents_by_days(days, include_details)
+            if not incidents.count > 0:
+                logging.warning("No incidents found for the given days")
+                return Result(error=True, message="No incidents found for the given days", result=None)
+            return Result(error=False, message="Incidents retrieved for last days", result=incidents)
+        except Exception as e:
+            logging.error(f"Error processing request: {e}")
+            return Result(error=True, message=f"Error processing request: {str(e)}", result=None)
+
+
+class _TaskStream:
+    # what Generation.attach expects of a model stream: close() cancels the task relaying it
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.loop = asyncio.get_running_loop()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+
+
+SERVICE = web.AppKey("service", AsyncBugService)
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    #what flask_cors does for api.py
+    response = web.Response() if request.method == 'OPTIONS' else await handler(request)
+    if not response.prepared:
+        response.headers.update(CORS_HEADERS)
+    return response
+
+
+async def search_database(request: web.Request) -> web.Response:
+    #POST /api/search, as in api.py
+    try:
+        data = await request.json()
+        query = data.get('query','')
+        logging.info(f"Search query: {query}")
+        aggregation = data.get('aggregation','max')
+        if aggregation not in ('max', 'weighted'):
+            return json_response({
+                'error':True,
+                'message': 'aggregation must be max or weighted'
+                }, 400)
+        results = await request.app[SERVICE].search(
+            query=query,
+            limit=data.get('limit',5),
+            content_type=data.get('content_type',None),
+            product_filter=data.get('product_filter',None),
+            similarity_threshold=data.get('similarity_threshold',0.5),
+            group_by_bug=data.get('group_by_bug',False),
+            aggregation=aggregation
+        )
+        return json_response({
+            'error':False,
+            'message': 'Request processed successfully',
+            'results': results
+            }, 200)
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return json_response({
+            'error':True,
+            'message': 'Error processing request'}, 500)
+
+
+async def chat(request: web.Request) -> web.StreamResponse:
+    #POST /api/chat, as in api.py: Server-Sent Events unless stream is false
+    try:
+        data = await request.json()
+        if not data or not data.get('messages'):
+            return json_response({
+                'error':True,
+                'message': 'messages is required'
+                }, 400)
+        request_id = data.get('request_id') or request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        if not REQUEST_ID_PATTERN.match(request_id):
+            return json_response({
+                'error':True,
+                'message': 'request_id must be 1-64 letters, digits, - or _'
+                }, 400)
+        service = request.app[SERVICE]
+
+        if not data.get('stream', STREAM_RESPONSE):
+            request_messages, result, _ = await service.prepare_request_messages(data)
+            response = await acreate_chat_completion(service.llm, model=service.chat_model, messages=request_messages, stream=False)
+            bot_response = response.choices[0].message.content if response.choices else None
+            message = add_response_to_history(data['messages'], f"{bot_response}\n\nSimilar incidents:\n {result.report}")
+            return json_response({
+                'error':False,
+                'message': 'Request processed successfully',
+                'request_id': request_id,
+                'response': message
+                }, 200)
+
+        try:
+            generation = get_generation_registry().register(request_id)
+        except ValueError as e:
+            return json_response({
+                'error':True,
+                'message': str(e)
+                }, 409)
+        try:
+            return await stream_bot_response(request, data, request_id, generation)
+        finally:
+            #stream_bot_response releases it too, but not when preparing the response fails
+            generation.close()
+            get_generation_registry().finish(request_id, generation)
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return json_response({
+            'error':True,
+            'message': 'Error processing request'}, 500)
+
+
+async def stream_bot_response(request: web.Request, payload, request_id: str, generation) -> web.StreamResponse:
+    #the events of handler_generate_bot_response.stream_bot_response; cancelling the generation cancels the relay task
+    service = request.app[SERVICE]
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        #no proxy buffering, or the first tokens would be held back
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Request-ID': request_id,
+        **CORS_HEADERS,
+    })
+    await response.prepare(request)
+    started = time.monotonic()
+    parts: List[str] = []
+    context: Optional[ContextResult] = None
+
+    async def send(event: str, data: Dict[str, Any]):
+        await response.write(sse_event(event, data).encode())
+
+    async def relay() -> str:
+        nonlocal context
+        request_messages, result, context = await service.prepare_request_messages(payload)
+        upstream = await acreate_chat_completion(service.llm, model=service.chat_model, messages=request_messages, stream=True)
+        #leaving the block (also on cancel) closes the connection, so the model stops generating
+        async with upstream:
+            async for chunk in upstream:
+                if generation.is_cancelled():
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not parts:
+                    logging.info(f"First token of {request_id} after {(time.monotonic() - started) * 1000:.0f} ms")
+                parts.append(delta)
+                await send("token", {"delta": delta})
+        return result.report
+
+    try:
+        #sent before the similar-bug search, so the client sees the response start immediately
+        await send("start", {"request_id": request_id})
+        task = asyncio.ensure_future(relay())
+        generation.attach(_TaskStream(task))
+        try:
+            report = await task
+        except asyncio.CancelledError:
+            if not generation.cancelled.is_set():
+                raise
+            report = None
+        if generation.is_cancelled():
+            await send("cancelled", {"request_id": request_id, "partial": "".join(parts)})
+            return response
+        message = add_response_to_history(payload['messages'], f"{''.join(parts)}\n\nSimilar incidents:\n {report}")
+        logging.info(f"Generation {request_id} finished in {(time.monotonic() - started) * 1000:.0f} ms")
+        await send("done", {"request_id": request_id, "message": message, "context": context.report()})
+    except ConnectionResetError:
+        logging.info(f"Client of {request_id} disconnected")
+    except Exception as e:
+        logging.error(f"Error streaming response {request_id}: {e}")
+        try:
+            await send("error", {"request_id": request_id, "message": "Error generating response"})
+        except ConnectionResetError:
+            pass
+    finally:
+        generation.close()
+        get_generation_registry().finish(request_id, generation)
+    return response
+
+
+async def stop_response_generation(request: web.Request) -> web.Response:
+    #DELETE /api/chat, as in api.py
+    try:
+        try:
+            data = await request.json() if request.can_read_body else {}
+        except ValueError:
+            data = {}
+        request_id = (data or {}).get('request_id') or request.query.get('request_id') or request.headers.get('X-Request-ID')
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            return json_response({
+                'error':True,
+                'message': 'request_id is required'
+                }, 400)
+        if get_generation_registry().cancel(request_id):
+            return json_response({
+                'error':False,
+                'message': 'Response generation stopped successfully',
+                'request_id': request_id
+                }, 200)
+        #not running in this worker: the worker that runs it picks up the cancel marker
+        return json_response({
+            'error':False,
+            'message': 'Response generation cancellation requested',
+            'request_id': request_id
+            }, 202)
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return json_response({
+            'error':True,
+            'message': 'Error processing request'}, 500)
+
+
+async def get_days_toolcall(request: web.Request) -> web.Response:
+    #POST /api/toolcall_days, as in api.py
+    try:
+        data = await request.json()
+        user_message = data['message'] if 'message' in data else None
+        logging.info(f"User message: {user_message}")
+
+        fast_path = parse_tool_call(user_message) if user_message else None
+        if fast_path is not None and fast_path[0] == INCIDENTS_BY_DAYS_TOOL:
+            logging.info(f"Intent parsed without the model: {fast_path[0]}({fast_path[1]})")
+            result = await request.app[SERVICE].incidents_by_days_tool(**fast_path[1])
+        else:
+            #the tool-calling model has a synchronous client
+            result = await asyncio.get_running_loop().run_in_executor(None, tool_handler, user_message)
+        return json_response(result, 500 if result.error else 200)
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        result = Result(error=True, message=f"Error processing request: {str(e)}", result=None)
+        return json_response(result, 500)
+
+
+async def cache_stats(request: web.Request) -> web.Response:
+    #GET /api/cache/stats, as in api.py
+    try:
+        return json_response({
+            'error':False,
+            'message': 'Request processed successfully',
+            'data': get_cache_stats()
+            }, 200)
+    except Exception as e:
+        logging.error(f"Error processing request: {e}")
+        return json_response({
+            'error':True,
+            'message': 'Error processing request'}, 500)
+
+
+async def _resources(app: web.Application):
+    #database pool, model client and shared BugRagSystem for the life of the app
+    env_vars = get_env_vars()
+    db_config = get_db_config(env_vars)
+    pool = await asyncpg.create_pool(
+        host=db_config["host"],
+        database=db_config["database"],
+        user=db_config["user"],
+        password=db_config["password"],
+        port=int(db_config["port"]) if db_config["port"] else None,
+        min_size=int(env_vars.get("DB_POOL_MIN_SIZE", DB_POOL_MIN_SIZE)),
+        max_size=int(env_vars.get("DB_POOL_MAX_SIZE", DB_POOL_MAX_SIZE)),
+    )
+    llm = create_async_client(env_vars.get("LLM_API_URL"))
+    app[SERVICE] = AsyncBugService(pool, llm, get_rag_system(), env_vars)
+    logging.info("Async service ready")
+    yield
+    await llm.close()
+    await pool.close()
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[cors_middleware])
+    app.cleanup_ctx.append(_resources)
+    app.router.add_post('/api/search', search_database)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_delete('/api/chat', stop_response_generation)
+    app.router.add_post('/api/toolcall_days', get_days_toolcall)
+    app.router.add_get('/api/cache/stats', cache_stats)
+    return app
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        level=logging.INFO
+    )
+    env_cfg = read_env_file()
+    web.run_app(create_app(), host='0.0.0.0', port=int(env_cfg.get("ASYNC_APP_PORT", ASYNC_APP_PORT)))
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List
+
+import aiohttp
+import numpy as np
+
+'''
+Throughput and latency of the Flask app (api.py) and the asyncio app
+(api_async.py) under concurrent load
+
+Fires the same requests at both servers at each concurrency level and reports
+requests per second, p50/p95/p99 latency and errors. Start both first, against
+the same database and model server, e.g.
+
+    gunicorn -w 2 --threads 8 -b :5000 api:app
+    python api_async.py
+
+    python benchmark_concurrency.py                                  # /api/search
+    python benchmark_concurrency.py --endpoint toolcall_days --query "incidents of the last 2 weeks"
+    python benchmark_concurrency.py --endpoint chat --requests 50 --concurrency 1 4 16
+    python benchmark_concurrency.py --output concurrency_report.md
+
+Chat requests are sent with stream false, so the latency is the whole answer.
+'''
+
+ENDPOINTS = {
+    "search": "/api/search",
+    "chat": "/api/chat",
+    "toolcall_days": "/api/toolcall_days",
+}
+
+
+def make_payload(endpoint: str, query: str) -> Dict:
+    if endpoint == "search":
+        return {"query": query, "limit": 5}
+    if endpoint == "chat":
+        return {
+            "messages": [{"id": 1, "conversation": [{"role": "user", "content": query}]}],
+            "stream": False,
+            "request_id": uuid.uuid4().hex,
+        }
+    return {"message": query}
+
+
+async def run_level(session: aiohttp.ClientSession, url: str, endpoint: str, queries: List[str],
+                    requests: int, concurrency: int) -> Dict:
+    # requests spread over concurrency workers; queries are cycled
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                async with session.post(url + ENDPOINTS[endpoint], json=make_payload(endpoint, queries[i % len(queries)])) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+            except Exception as e:
+                logging.warning(f"Request to {url} failed: {e}")
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latency = np.array(latencies)
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": np.percentile(latency, 50),
+        "p95": np.percentile(latency, 95),
+        "p99": np.percentile(latency, 99),
+        "errors": errors,
+    }
+
+
+async def run(args) -> List[str]:
+    servers = {"flask": args.flask_url.rstrip("/"), "asyncio": args.async_url.rstrip("/")}
+    queries = args.query
+    lines = [
+        "# Concurrency: Flask vs asyncio",
+        "",
+        f"POST {ENDPOINTS[args.endpoint]}, {args.requests} requests per level, {len(queries)} distinct queries",
+        "",
+        "| server | concurrency | req/s | p50 ms | p95 ms | p99 ms | errors |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    # no client-side connection limit, so the servers see the full concurrency
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        for concurrency in args.concurrency:
+            for name, url in servers.items():
+                # warm up connections and caches, so both servers start equal
+                await run_level(session, url, args.endpoint, queries, min(concurrency, args.requests), concurrency)
+                stats = await run_level(session, url, args.endpoint, queries, args.requests, concurrency)
+                lines.append(
+                    f"| {name} | {concurrency} | {stats['rps']:.1f} | {stats['p50']:.1f} | {stats['p95']:.1f} "
+                    f"| {stats['p99']:.1f} | {stats['errors']} |"
+                )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load on the Flask and asyncio apps")
+    parser.add_argument("--flask-url", default="http://localhost:5000")
+    parser.add_argument("--async-url", default="http://localhost:5001")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="search")
+    parser.add_argument("--query", nargs="+", default=["application crashes on login", "database connection timeout", "printer not responding"])
+    parser.add_argument("--requests", type=int, default=200, help="requests per server and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per request")
+    parser.add_argument("--output", help="also write the report to this markdown file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = "\n".join(asyncio.run(run(args)))
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
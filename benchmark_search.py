@@ -0,0 +1,176 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from ann_index import IVFIndex, IVFConfig
+from local_search_index import LocalVectorIndex
+from quantized_index import QUANTIZATION_MODES, QuantizationConfig, QuantizedVectorIndex
+
+'''
+Recall-vs-latency report for the in-process search backends
+
+Builds an exact LocalVectorIndex, an IVFIndex and a QuantizedVectorIndex per
+quantization mode over the same embeddings, runs the same queries through all of
+them and reports recall@k against the exact results, mean/p95 query latency and,
+for the quantized modes, process memory and memory-mapped (shared) bytes. The
+quantized indexes are saved to a temporary directory and mapped back, as the
+service workers use them.
+
+    python benchmark_search.py                     # embeddings from bug_embeddings
+    python benchmark_search.py --synthetic 300000  # clustered random vectors, no database
+    python benchmark_search.py --output search_report.md
+    python benchmark_search.py --quantization int8 pq --rerank-factor 4 8
+'''
+
+CONTENT_TYPES = ["description", "resolution", "combined"]
+
+
+def synthetic_rows(count: int, dimension: int, clusters: int = 500, seed: int = 0) -> List[Dict]:
+    '''Clustered unit vectors shaped like bug_embeddings rows (three content types per bug)'''
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 1.5 * rng.normal(size=(count, dimension)).astype(np.float32)
+    return [
+        {
+            "embedding_id": i + 1,
+            "bug_id": i // 3,
+            "content_type": CONTENT_TYPES[i % 3],
+            "embedding": vectors[i],
+            "incident_number": f"SYN-{i // 3}",
+            "product": "",
+            "description": "",
+            "closing_notes": "",
+        }
+        for i in range(count)
+    ]
+
+
+def make_queries(index: LocalVectorIndex, count: int, seed: int = 1) -> np.ndarray:
+    # perturbed copies of stored vectors, so queries land near real data
+    rng = np.random.default_rng(seed)
+    with index._lock:
+        picked = index._matrix[rng.choice(len(index), count, replace=False)]
+    return picked + 0.05 * rng.normal(size=picked.shape).astype(np.float32)
+
+
+def timed_search(index, queries: np.ndarray, limit: int, **kwargs):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows = index.search(query, limit=limit, similarity_threshold=-1.0, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([(row["bug_id"], row["content_type"]) for row in rows])
+    return results, np.array(latencies)
+
+
+def recall(truth: List[list], found: List[list]) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    total = sum(len(t) for t in truth)
+    return hits / total if total else 1.0
+
+
+def megabytes(value: int) -> str:
+    return f"{value / 2 ** 20:.1f}"
+
+
+def build_quantized(quantization: str, dimension: int, rows: List[Dict], rag_system, directory: str) -> QuantizedVectorIndex:
+    index = QuantizedVectorIndex.from_config(QuantizationConfig(quantization=quantization), dimension)
+    if rows:
+        index.add(rows)
+    else:
+        index.load(rag_system)
+    index.train()
+    path = os.path.join(directory, quantization)
+    index.save(path)
+    index.load_file(path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report for exact and IVF search")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of bug_embeddings")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATION_MODES, default=list(QUANTIZATION_MODES))
+    parser.add_argument("--rerank-factor", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--output", help="also write the report to this markdown file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    config = IVFConfig()
+    if args.n_lists:
+        config.n_lists = args.n_lists
+    exact = LocalVectorIndex(args.dimension)
+    ivf = IVFIndex.from_config(config, args.dimension)
+    rows, rag_system = [], None
+    if args.synthetic:
+        rows = synthetic_rows(args.synthetic, args.dimension)
+        exact.add(rows)
+        ivf.add(rows)
+        source = f"{args.synthetic} synthetic vectors"
+    else:
+        from rag_service import get_rag_system
+        rag_system = get_rag_system()
+        exact.load(rag_system)
+        ivf.load(rag_system)
+        source = f"{len(exact)} rows of bug_embeddings"
+    if not ivf.is_trained:
+        ivf.train()
+
+    queries = make_queries(exact, min(args.queries, len(exact)))
+    truth, exact_latency = timed_search(exact, queries, args.limit)
+    lines = [
+        f"# Search recall vs latency",
+        "",
+        f"{source}, dimension {args.dimension}, {len(queries)} queries, top {args.limit}, {len(ivf.centroids)} IVF lists",
+        "",
+        "| backend | nprobe | recall@k | mean ms | p95 ms |",
+        "|---|---|---|---|---|",
+        f"| exact | - | 1.000 | {exact_latency.mean():.3f} | {np.percentile(exact_latency, 95):.3f} |",
+    ]
+    for nprobe in args.nprobe:
+        if nprobe > len(ivf.centroids):
+            continue
+        found, latency = timed_search(ivf, queries, args.limit, nprobe=nprobe)
+        lines.append(
+            f"| ivf | {nprobe} | {recall(truth, found):.3f} | {latency.mean():.3f} | {np.percentile(latency, 95):.3f} |"
+        )
+
+    usage = exact.memory_usage()
+    lines += [
+        "",
+        "| quantization | rerank factor | recall@k | mean ms | p95 ms | process MB | mapped MB |",
+        "|---|---|---|---|---|---|---|",
+        f"| exact (in memory) | - | 1.000 | {exact_latency.mean():.3f} | {np.percentile(exact_latency, 95):.3f} "
+        f"| {megabytes(usage['resident_bytes'])} | {megabytes(usage['mapped_bytes'])} |",
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for quantization in args.quantization:
+            quantized = build_quantized(quantization, args.dimension, rows, rag_system, directory)
+            usage = quantized.memory_usage()
+            # without codes every row is scored exactly, the re-rank factor does not apply
+            factors = args.rerank_factor if quantized.codes_ready else [None]
+            for factor in factors:
+                quantized.rerank_factor = factor or quantized.rerank_factor
+                found, latency = timed_search(quantized, queries, args.limit)
+                lines.append(
+                    f"| {quantization} | {factor or '-'} | {recall(truth, found):.3f} | {latency.mean():.3f} "
+                    f"| {np.percentile(latency, 95):.3f} | {megabytes(usage['resident_bytes'])} | {megabytes(usage['mapped_bytes'])} |"
+                )
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
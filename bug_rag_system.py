@@ -1,9 +1,28 @@
+import base64
+import hashlib
+import io
+import json
+import re
+import uuid
+import threading
+import time
 import psycopg2
 import numpy as np
-from typing import Dict, List,Optional,Tuple
-from openai import OpenAI, api_key
-from constants import EMBEDDING_DIMENSION
+from typing import Dict, Iterator, List,Optional,Tuple,Set
+from llm_client import create_embeddings
+from constants import EMBEDDING_DIMENSION, EMBEDDING_BATCH_SIZE, DEDUPE_CHUNK_SIZE, BULK_COMMIT_SIZE, SEARCH_BACKEND, LOCAL_INDEX_REFRESH_INTERVAL, DATA_GENERATION_POLL_INTERVAL
+from constants import HYBRID_SEARCH, RRF_K, HYBRID_CANDIDATE_FACTOR, TEXT_SEARCH_CONFIG, EXACT_MATCH_MAX_LENGTH, GROUP_WEIGHTS, PRIORITY_LEVELS
+from constants import INCIDENT_PAGE_SIZE, INCIDENT_STREAM_BATCH_SIZE
+from db_pool import ConnectionPool
+from embedding_cache import EmbeddingCache
+from local_search_index import LocalVectorIndex, parse_vector
+from ann_index import IVFIndex, IVFConfig
+from quantized_index import QuantizedVectorIndex, QuantizationConfig
+from schema import VectorIndexConfig, apply_search_settings, INCIDENT_SUMMARY_QUERY, INCIDENT_NUMBERS_QUERY, INCIDENT_DETAILS_QUERY
+from schema import EXACT_INCIDENT_QUERY, EXACT_PHRASE_QUERY, SEARCH_FUNCTION_QUERY, GROUPED_SEARCH_FUNCTION_QUERY
+from search_cache import SearchResultCache
 import logging
+from contextlib import contextmanager
 from datetime import date
 from datetime import datetime
 from dataclasses import dataclass
@@ -29,149 +48,483 @@ class BugData:
     sys_created_by: str
     priority: int
 
+def _copy_value(value) -> str:
+    #format a value for COPY text format
+    if value is None:
+        return "\\N"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def _copy_line(values) -> str:
+    return "\t".join(_copy_value(value) for value in values) + "\n"
+
+def vector_literal(embedding) -> str:
+    #pgvector text representation, e.g. [0.1,0.2]
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+def content_hash(text: str) -> str:
+    #hash of the text an embedding was built from; equals encode(sha256(convert_to(text, 'UTF8')), 'hex') in SQL
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-./:#]*")
+
+
+def is_identifier_query(query: str) -> bool:
+    #a single token containing a digit: incident number, part number, error code
+    query = (query or "").strip()
+    return (0 < len(query) <= EXACT_MATCH_MAX_LENGTH
+            and _IDENTIFIER_PATTERN.fullmatch(query) is not None
+            and any(c.isdigit() for c in query))
+
+
+def _rrf_fuse(vector_rows: List[Dict], lexical_rows: List[Dict], rrf_k: int, limit: int) -> List[Dict]:
+    #reciprocal-rank fusion of two ranked result lists, one row per bug (its best vector row if any)
+    scores: Dict[int, float] = {}
+    best_rows: Dict[int, Dict] = {}
+    for ranking in (vector_rows, lexical_rows):
+        ranked = set()
+        for row in ranking:
+            bug_id = row["bug_id"]
+            if bug_id in ranked:
+                #rankings are ordered, so the first row of a bug is its best
+                continue
+            ranked.add(bug_id)
+            rank = len(ranked)
+            scores[bug_id] = scores.get(bug_id, 0.0) + 1.0 / (rrf_k + rank)
+            best_rows.setdefault(bug_id, row)
+    ordered = sorted(scores, key=lambda bug_id: (-scores[bug_id], -best_rows[bug_id]["similarity_score"]))
+    return [best_rows[bug_id] for bug_id in ordered[:limit]]
+
+
+# columns of incident listings (list_incidents / iter_incidents) and their SQL
+INCIDENT_COLUMNS = {
+    "id": "id",
+    "incident_number": "incident_number",
+    "product": "product",
+    "description": "description",
+    "closing_notes": "closing_notes",
+    "resolution_tier_1": "resolution_tier_1",
+    "resolution_tier_2": "resolution_tier_2",
+    "resolution_tier_3": "resolution_tier_3",
+    "problem_id": "problem_id",
+    "sys_created_on": "sys_created_on",
+    "sys_created_by": "sys_created_by",
+    "priority": "priority",
+    "priority_level": "CASE priority WHEN 4 THEN 'Critical' WHEN 3 THEN 'High' WHEN 2 THEN 'Medium' WHEN 1 THEN 'Low' ELSE 'Unknown' END",
+}
+
+
+def _incident_projection(columns: Optional[List[str]]) -> Tuple[List[str], str]:
+    # (column names, select list); the keyset columns are always selected as _page_created / _page_id
+    columns = list(columns or INCIDENT_COLUMNS)
+    unknown = [column for column in columns if column not in INCIDENT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown incident columns: {', '.join(unknown)}")
+    select = [f"{INCIDENT_COLUMNS[column]} AS {column}" for column in columns]
+    return columns, ", ".join(select + ["sys_created_on AS _page_created", "id AS _page_id"])
+
+
+def encode_page_cursor(since: datetime, created: datetime, bug_id: int) -> str:
+    '''Opaque cursor of the next page: the window start and the last (sys_created_on, id) returned'''
+    payload = json.dumps([since.isoformat(), created.isoformat(), bug_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_page_cursor(cursor: str) -> Tuple[datetime, datetime, int]:
+    try:
+        since, created, bug_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(since), datetime.fromisoformat(created), int(bug_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+
 @dataclass
 class IncidentSummary:
     count:int
     incident_numbers:List[str]
     created_by_users:List[str]
-    priority:List[int]
-    solutions:List[str]
-    incidents:List[Dict[str,Any]]
+    priority:List[int] # per incident, only with include_details
+    solutions:List[str] # only with include_details
+    incidents:List[Dict[str,Any]] # full rows, only with include_details
+    priority_counts:Dict[str,int] = None # incidents per priority level
+
+def make_incident_summary(count: int, users: List[str], priority_counts: Dict[str, int], incident_numbers: List[str],
+                          incidents: List[Dict[str, Any]]) -> IncidentSummary:
+    #IncidentSummary from the rows of INCIDENT_SUMMARY_QUERY, INCIDENT_NUMBERS_QUERY and (optionally) INCIDENT_DETAILS_QUERY
+    levels: Dict[str, int] = {}
+    for priority, incidents_count in priority_counts.items():
+        level = PRIORITY_LEVELS.get(int(priority), "Unknown")
+        levels[level] = levels.get(level, 0) + int(incidents_count)
+    return IncidentSummary(
+        count=int(count),
+        incident_numbers=incident_numbers,
+        created_by_users=list(users),
+        priority=[incident['priority'] for incident in incidents],
+        solutions=list(dict.fromkeys(incident['closing_notes'] for incident in incidents if incident['closing_notes'])),
+        incidents=incidents,
+        priority_counts=levels,
+    )
+
+
+class PartialWriteError(Exception):
+    '''write_bugs failed; bug_ids holds the ids of the bugs committed before the error, in order'''
+
+    def __init__(self, bug_ids: List[int], error: Exception):
+        super().__init__(f"{error} (after {len(bug_ids)} bugs were committed)")
+        self.bug_ids = bug_ids
+        self.error = error
 
 class BugRagSystem:
 
-    def __init__(self,db_config:Dict[str,str],llm_api_url:str="http://localhost:11434", embedding_model:str = "nomic-embed-text:latest"):
+    def __init__(self,db_config:Dict[str,str],llm_api_url:str="http://localhost:11434", embedding_model:str = "nomic-embed-text:latest", embedding_batch_size:int = EMBEDDING_BATCH_SIZE, bulk_commit_size:int = BULK_COMMIT_SIZE, db_pool:Optional[ConnectionPool] = None, embedding_cache:Optional[EmbeddingCache] = None, search_backend:str = SEARCH_BACKEND, local_index_refresh_interval:float = LOCAL_INDEX_REFRESH_INTERVAL, ivf_config:Optional[IVFConfig] = None, quantization_config:Optional[QuantizationConfig] = None, vector_index_config:Optional[VectorIndexConfig] = None, search_cache:Optional[SearchResultCache] = None, data_generation_poll_interval:float = DATA_GENERATION_POLL_INTERVAL, hybrid_search:bool = HYBRID_SEARCH, rrf_k:int = RRF_K, group_weights:Optional[Dict[str,float]] = None, local_index:Optional[LocalVectorIndex] = None):
         self.db_config = db_config
+        self.db_pool = db_pool
+        self.embedding_cache = embedding_cache
         self.llm_api_url = llm_api_url
         self.embedding_model = embedding_model
         self.embedding_dimension = EMBEDDING_DIMENSION
+        self.embedding_batch_size = embedding_batch_size
+        self.bulk_commit_size = bulk_commit_size
+        # "postgres": search_similar_bugs SQL function, "local": in-process LocalVectorIndex (exact),
+        # "ivf": in-process IVFIndex (approximate, tuned by ivf_config),
+        # "quantized": in-process QuantizedVectorIndex (compressed codes + re-rank, shared via mmap)
+        self.search_backend = search_backend
+        self.ivf_config = ivf_config or IVFConfig()
+        self.quantization_config = quantization_config or QuantizationConfig()
+        # pgvector index type and its query-time ef_search / probes for the "postgres" backend
+        self.vector_index_config = vector_index_config or VectorIndexConfig()
+        # fuse lexical (full-text) and vector rankings, with an exact-identifier fast path
+        self.hybrid_search = hybrid_search
+        self.rrf_k = rrf_k
+        # content type weights of aggregation="weighted" grouped searches
+        self.group_weights = dict(group_weights or GROUP_WEIGHTS)
+        self.local_index_refresh_interval = local_index_refresh_interval
+        # an index loaded before fork (rag_service.preload) is adopted, its pages shared copy-on-write
+        self._local_index: Optional[LocalVectorIndex] = local_index
+        self._local_index_lock = threading.Lock()
+        # search results, invalidated by the data generation (see get_data_generation)
+        self.search_cache = search_cache
+        self.data_generation_poll_interval = data_generation_poll_interval
+        self._generation_lock = threading.Lock()
+        self._db_generation: Optional[int] = None
+        self._local_generation = 0
+        self._generation_checked_at = float("-inf")
+        self._generation_error_logged = False
+        self._removals_error_logged = False
+        self._active_model_error_logged = False
 
+    @contextmanager
     def get_db_connection(self):
-        '''Get databse connection'''
-        return psycopg2.connect(**self.db_config)
+        '''
+        Get databse connection, borrowed from db_pool when there is one.
+        Commits when the with block succeeds, rolls back on error and then
+        returns the connection to the pool (or closes it).
+        '''
+        if self.db_pool is not None:
+            with self.db_pool.connection() as conn:
+                yield conn
+            return
 
-    def generate_embedding(self,text:str) -> List[float]:
-        # generate embedding for given text using OpenAI API
+        conn = psycopg2.connect(**self.db_config)
         try:
-            client = OpenAI(
-                base_url=f'{self.llm_api_url}/v1',
-                api_key='ollama'
-            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
 
-            response = client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            print(f"Embedding model: {self.embedding_model}")
+    def close(self):
+        '''Release pooled database connections'''
+        if self.db_pool is not None:
+            self.db_pool.close()
+
+    def generate_embedding(self,text:str) -> List[float]:
+        # generate embedding for given text using OpenAI API, reusing cached vectors
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            if cached is not None:
+                return cached
+        try:
+            response = create_embeddings(self.llm_api_url, self.embedding_model, text)
             logging.info(f"Generated embedding for text: {text}, of length: {len(response.data[0].embedding)}")
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(self.embedding_model, text, embedding)
+            return embedding
         except Exception as e:
             logging.error(f"Error in generating embedding:{e}")
             return None
 
+    def generate_embeddings(self, texts: List[str], model: Optional[str] = None) -> List[Optional[List[float]]]:
+        """Generate embeddings for many texts, sending up to embedding_batch_size inputs per request.
+
+        Texts found in the embedding cache are not sent, and repeated texts are sent once.
+        The result is aligned with texts; entries of a batch that failed are None.
+        model defaults to embedding_model (the re-index job passes a shadow model).
+        """
+        model = model or self.embedding_model
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if not texts:
+            return embeddings
+
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.get_many(model, texts)
+        missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if not missing_texts:
+            return embeddings
+
+        generated = dict(zip(missing_texts, self._request_embeddings(missing_texts, model)))
+        if self.embedding_cache is not None:
+            stored = [text for text in missing_texts if generated[text] is not None]
+            self.embedding_cache.put_many(model, stored, [generated[text] for text in stored])
+        return [embedding if embedding is not None else generated.get(text) for text, embedding in zip(texts, embeddings)]
+
+    def _request_embeddings(self, texts: List[str], model: Optional[str] = None) -> List[Optional[List[float]]]:
+        #call the embedding model, embedding_batch_size inputs per request
+        model = model or self.embedding_model
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        batch_size = max(1, self.embedding_batch_size)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            try:
+                response = create_embeddings(self.llm_api_url, model, batch)
+                # the API returns one item per input, tagged with its position in the batch
+                for item in response.data:
+                    embeddings[start + item.index] = item.embedding
+                logging.info(f"Generated {len(response.data)} embeddings in one request, model: {model}")
+            except Exception as e:
+                logging.error(f"Error in generating embeddings for batch starting at {start}: {e}")
+        return embeddings
+
 
     # Get incidents created in last week (with detailed records)
 
-    def get_incidents_by_days(self, days: int) -> IncidentSummary:
+    def get_incidents_by_days(self, days: int, include_details: bool = False) -> IncidentSummary:
+        """Summary of the incidents created in the last `days` days.
+
+        Counts, creators and the priority distribution are aggregated in SQL from
+        bug_daily_rollup, incident numbers come from an index-only scan. Full rows
+        (and the per-incident priorities and distinct solutions derived from them)
+        are fetched only with include_details.
+        """
         with self.get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                query = """
-                    SELECT incident_number, product, description, closing_notes,
-                            resolution_tier_1, resolution_tier_2, resolution_tier_3,
-                            problem_id, sys_created_on, sys_created_by,priority,
-                            CASE priority
-                                WHEN 4 THEN 'Critical'
-                                WHEN 3 THEN 'High'
-                                WHEN 2 THEN 'Medium'
-                                WHEN 1 THEN 'Low'
-                                ELSE 'Unknown'
-                            END AS priority_level
+            with conn.cursor() as cursor:
+                logging.info(f"Summarising incidents of the last {days} days")
+                cursor.execute(INCIDENT_SUMMARY_QUERY, {"days": days})
+                count, users, priority_counts = cursor.fetchone()
+                cursor.execute(INCIDENT_NUMBERS_QUERY, {"days": days})
+                incident_numbers = [row[0] for row in cursor.fetchall()]
+            incidents = []
+            if include_details:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    cursor.execute(INCIDENT_DETAILS_QUERY, {"days": days})
+                    incidents = cursor.fetchall()
+        return make_incident_summary(count, users, priority_counts, incident_numbers, incidents)
+
+    def list_incidents(self, days: int, page_size: int = INCIDENT_PAGE_SIZE, cursor: Optional[str] = None,
+                       columns: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of the incidents created in the last `days` days, newest first.
+
+        Keyset pagination on (sys_created_on, id): pass the returned cursor to get the
+        next page (None after the last one). The cursor pins the start of the window, so
+        pages stay consistent while time passes. columns limits the returned columns to
+        a subset of INCIDENT_COLUMNS.
+        """
+        names, projection = _incident_projection(columns)
+        with self.get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as db_cursor:
+                if cursor:
+                    since, after_created, after_id = decode_page_cursor(cursor)
+                    keyset = "AND (sys_created_on, id) < (%(after_created)s, %(after_id)s)"
+                else:
+                    db_cursor.execute("SELECT localtimestamp - make_interval(days => %s) AS since", (days,))
+                    since, after_created, after_id = db_cursor.fetchone()["since"], None, None
+                    keyset = ""
+                db_cursor.execute(f"""
+                    SELECT {projection}
                     FROM bugs
-                    WHERE sys_created_on >= NOW() - INTERVAL '%s days'
-                    AND sys_created_on <= NOW()
-                    ORDER BY sys_created_on DESC
-                """
-                logging.info(f"Executing query: {query}")
-                logging.info(f"Executing query with days: {days}")
-                cursor.execute(query, (days,))
-                incidents = cursor.fetchall()
-                cutoff = date.today() - timedelta(days=days)
-                filtered = []
-                users = set()
-                solutions = set()
-                priority_values = []
-                for incident in incidents:
-                    sys_created_on = incident['sys_created_on']
-                    priority = incident['priority']
-                    if hasattr(sys_created_on, 'year'):
-                        if date(sys_created_on.year, sys_created_on.month, sys_created_on.day) >= cutoff:
-                            filtered.append(incident)
-                            users.add(incident.get('sys_created_by'))
-                            solution = incident.get('closing_notes') or ''
-                            if solution:
-                                solutions.add(solution)
-                            priority_values.append(incident['priority'])
-
-                incident_numbers = [incident['incident_number'] for incident in filtered]
-                count = len(incident_numbers)
-                return IncidentSummary(
-                    count=count,
-                    incident_numbers=incident_numbers,
-                    created_by_users=list(users),
-                    priority=priority_values,
-                    solutions=list(solutions),
-                    incidents=filtered,
-                )
+                    WHERE sys_created_on >= %(since)s
+                    AND sys_created_on <= localtimestamp
+                    {keyset}
+                    ORDER BY sys_created_on DESC, id DESC
+                    LIMIT %(limit)s
+                """, {"since": since, "after_created": after_created, "after_id": after_id, "limit": page_size + 1})
+                rows = db_cursor.fetchall()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_page_cursor(since, rows[-1]["_page_created"], rows[-1]["_page_id"])
+        return [{name: row[name] for name in names} for row in rows], next_cursor
+
+    def iter_incidents(self, days: int, columns: Optional[List[str]] = None,
+                       batch_size: int = INCIDENT_STREAM_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """All incidents created in the last `days` days, newest first, read through a
+        server-side (named) cursor batch_size rows at a time, so memory stays constant
+        however large the window. The connection is held until the iterator is
+        exhausted or closed.
+        """
+        names, projection = _incident_projection(columns)
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            with self.get_db_connection() as conn:
+                with conn.cursor(name=f"incidents_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as db_cursor:
+                    db_cursor.itersize = batch_size
+                    db_cursor.execute(f"""
+                        SELECT {projection}
+                        FROM bugs
+                        WHERE sys_created_on >= localtimestamp - make_interval(days => %s)
+                        AND sys_created_on <= localtimestamp
+                        ORDER BY sys_created_on DESC, id DESC
+                    """, (days,))
+                    for row in db_cursor:
+                        yield {name: row[name] for name in names}
+
+        return rows()
 
     def store_bug(self, bug_data: BugData) -> int:
-        logging.info(f"Storing bug data: {bug_data}")
-        # Store bug data and embedding vectors
-        with self.get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                # Insert bug data
-                insert_bug_query = """
-                    INSERT INTO bugs(
-                        incident_number,
-                        product,
-                        description,
-                        closing_notes,
-                        resolution_tier_1,
-                        resolution_tier_2,
-                        resolution_tier_3,
-                        problem_id,
-                        sys_created_on,
-                        sys_created_by,
-                        priority
-                    )
-                    VALUES(
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    )
-                    RETURNING id
-                """
-                cursor.execute(insert_bug_query, (
-                    bug_data.incident_number,
-                    bug_data.product,
-                    bug_data.description,
-                    bug_data.closing_notes,
-                    bug_data.resolution_tier_1,
-                    bug_data.resolution_tier_2,
-                    bug_data.resolution_tier_3,
-                    bug_data.problem_id,
-                    bug_data.sys_created_on,
-                    bug_data.sys_created_by,
-                    bug_data.priority
-                ))
-                bug_id = cursor.fetchone()[0]
-                logging.info(f"Stored bug data with id: {bug_id}")
-                
-                # Generate and store embeddings
-                self._store_embeddings(cursor, bug_id, bug_data)
-                conn.commit()
-                return bug_id
+        # Store a single bug, see store_bugs
+        return self.store_bugs([bug_data])[0]
 
-    def _store_embeddings(self,cursor,bug_id:int,bug_data:BugData):
+    def store_bugs(self, bugs: List[BugData]) -> List[int]:
+        """Store bug data and embedding vectors for many bugs.
 
-        #generate and store different embeddings
+        Embeddings for every field of every bug are requested together (see embed_bugs),
+        so a batch of bugs costs len(bugs) * 3 / embedding_batch_size model round trips.
+        Returns the ids of the stored bugs, in the order of bugs.
+        """
+        if not bugs:
+            return []
+        bug_embeddings = self.embed_bugs(bugs)
+        return self.write_bugs(bugs, bug_embeddings)
+
+    def write_bugs(self, bugs: List[BugData], bug_embeddings: List[List[Tuple[str, str, List[float]]]]) -> List[int]:
+        """Bulk insert bugs and their precomputed embeddings using COPY.
+
+        bug_embeddings[i] holds the (content_type, text, embedding) entries of bugs[i].
+        Rows are written and committed in chunks of bulk_commit_size bugs: each chunk is
+        COPY'd into a temporary staging table, moved into bugs with one INSERT ... SELECT
+        that returns the new ids, and its embeddings are COPY'd into bug_embeddings.
+        Returns the ids of the stored bugs, in the order of bugs. Raises
+        PartialWriteError, carrying the ids of the chunks already committed,
+        when a chunk fails.
+        """
+        logging.info(f"Storing {len(bugs)} bugs")
+        bug_ids = []
+        chunk_size = max(1, self.bulk_commit_size)
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    for start in range(0, len(bugs), chunk_size):
+                        chunk_ids = self._copy_bugs(cursor, bugs[start:start + chunk_size])
+                        self._copy_embeddings(cursor, chunk_ids, bug_embeddings[start:start + chunk_size])
+                        conn.commit()
+                        bug_ids.extend(chunk_ids)
+                        logging.info(f"Committed {len(bug_ids)} of {len(bugs)} bugs")
+        except Exception as e:
+            raise PartialWriteError(bug_ids, e) from e
+        finally:
+            # committed chunks are visible even when a later one failed
+            if bug_ids:
+                self.bump_data_generation()
+                self._refresh_local_index()
+        return bug_ids
+
+    def _copy_bugs(self, cursor, bugs: List[BugData]) -> List[int]:
+        #COPY bug rows into a staging table, then insert-select them into bugs to obtain ids
+        cursor.execute("""
+            create temp table if not exists bugs_staging(
+                ord integer,
+                incident_number text,
+                product text,
+                description text,
+                closing_notes text,
+                resolution_tier_1 text,
+                resolution_tier_2 text,
+                resolution_tier_3 text,
+                problem_id text,
+                sys_created_on timestamp,
+                sys_created_by text,
+                priority integer
+            ) on commit delete rows
+        """)
+        buffer = io.StringIO()
+        for ord_, bug_data in enumerate(bugs):
+            buffer.write(_copy_line((
+                ord_,
+                bug_data.incident_number,
+                bug_data.product,
+                bug_data.description,
+                bug_data.closing_notes,
+                bug_data.resolution_tier_1,
+                bug_data.resolution_tier_2,
+                bug_data.resolution_tier_3,
+                bug_data.problem_id,
+                bug_data.sys_created_on,
+                bug_data.sys_created_by,
+                bug_data.priority
+            )))
+        buffer.seek(0)
+        cursor.copy_expert("copy bugs_staging from stdin", buffer)
+
+        cursor.execute("""
+            INSERT INTO bugs(
+                incident_number,
+                product,
+                description,
+                closing_notes,
+                resolution_tier_1,
+                resolution_tier_2,
+                resolution_tier_3,
+                problem_id,
+                sys_created_on,
+                sys_created_by,
+                priority
+            )
+            SELECT incident_number, product, description, closing_notes,
+                   resolution_tier_1, resolution_tier_2, resolution_tier_3,
+                   problem_id, sys_created_on, sys_created_by, priority
+            FROM bugs_staging
+            RETURNING id, incident_number
+        """)
+        # neither the order ids are drawn in nor the order RETURNING emits rows is
+        # guaranteed, so ids are mapped back by incident number (unique after dedupe;
+        # a repeated number gets its ids in ascending order)
+        ids_by_number: Dict[str, List[int]] = {}
+        for bug_id, incident_number in sorted(cursor.fetchall()):
+            ids_by_number.setdefault(incident_number, []).append(bug_id)
+        bug_ids = [ids_by_number[bug_data.incident_number].pop(0) for bug_data in bugs]
+        logging.info(f"Stored bug data with ids: {bug_ids}")
+        return bug_ids
+
+    def _copy_embeddings(self, cursor, bug_ids: List[int], bug_embeddings: List[List[Tuple[str, str, List[float]]]]):
+        # map the vectors back to (bug_id, content_type) and COPY them into bug_embeddings
+        self.write_embeddings(cursor, [
+            (bug_id, content_type, text, embedding)
+            for bug_id, entries in zip(bug_ids, bug_embeddings)
+            for content_type, text, embedding in entries
+        ])
+
+    def write_embeddings(self, cursor, rows: List[Tuple[int, str, str, List[float]]], table: str = "bug_embeddings", model: Optional[str] = None):
+        """COPY (bug_id, content_type, text, embedding) rows into table, tagged with model and the text's content hash."""
+        model = model or self.embedding_model
+        buffer = io.StringIO()
+        for bug_id, content_type, text, embedding in rows:
+            buffer.write(_copy_line((bug_id, content_type, text, vector_literal(embedding), model, content_hash(text))))
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"copy {table}(bug_id,content_type,content_text,embedding,embedding_model,content_hash) from stdin",
+            buffer
+        )
+
+    def embedding_texts(self, bug_data: BugData) -> List[Tuple[str, str]]:
+
+        #build the texts embedded for a bug, as (content_type, text)
         embedding_configs = [
             ("description",bug_data.description),
         ]
@@ -191,34 +544,217 @@ class BugRagSystem:
         if bug_data.closing_notes:
             combined_text += f"| Resolution:{bug_data.closing_notes}"
         embedding_configs.append(('combined',combined_text)) #product|description|resolution
+        return embedding_configs
 
-        #Generate and store embeddings
+    def embed_bugs(self, bugs: List[BugData]) -> List[List[Tuple[str, str, List[float]]]]:
+        """Generate the description/resolution/combined embeddings of many bugs in batched requests.
+
+        Returns one list of (content_type, text, embedding) per bug; content types whose
+        embedding could not be generated are left out, as before.
+        """
+        self._poll_database_state()
+        configs_per_bug = [self.embedding_texts(bug_data) for bug_data in bugs]
+        texts = [text for configs in configs_per_bug for _, text in configs]
+        embeddings = iter(self.generate_embeddings(texts))
+
+        results = []
+        for bug_data, configs in zip(bugs, configs_per_bug):
+            entries = []
+            for content_type, text in configs:
+                embedding = next(embeddings)
+                if not embedding or len(embedding) == 0:
+                    logging.error(f"Failed to generate embedding for {content_type} of {bug_data.incident_number}")
+                    continue
+                entries.append((content_type, text, embedding))
+            results.append(entries)
+        return results
 
-        for content_type,text in embedding_configs:
-            embedding = self.generate_embedding(text)
-            if not embedding or len(embedding) == 0:
-                logging.error(f"Failed to generate embedding for {content_type}")
-                continue
 
-            cursor.execute("""
-            insert into bug_embeddings(bug_id,content_type,content_text,embedding)
-            values(%s,%s,%s,%s::vector)
-            """,(bug_id,content_type,text,embedding))
 
+    def get_data_generation(self) -> Tuple[Optional[int], int]:
+        '''
+        Version of the stored data: (database generation, writes by this process).
+        The database counter (data_generation_seq, schema migration 10) is bumped
+        by triggers on bugs and bug_embeddings, so it also covers other processes
+        and import_state.
+        It is polled at most every data_generation_poll_interval seconds; writes
+        made through this instance are visible immediately.
+        '''
+        self._poll_database_state()
+        return (self._db_generation, self._local_generation)
 
+    def _poll_database_state(self):
+        #refresh the data generation and the active embedding model, at most every poll interval
+        if time.monotonic() - self._generation_checked_at >= self.data_generation_poll_interval:
+            with self._generation_lock:
+                if time.monotonic() - self._generation_checked_at >= self.data_generation_poll_interval:
+                    self._db_generation = self._read_db_generation()
+                    self._sync_active_model()
+                    self._drop_local_index_with_removals()
+                    self._generation_checked_at = time.monotonic()
 
-    def search_similar_bugs(self, query: str, limit: int = 5, content_type: str = None, product_filter: str = None, similarity_threshold: float = 0.8) -> List[Dict]:
-        """Search for similar bugs using vector similarity"""
+    def _sync_active_model(self):
+        # caller holds self._generation_lock. The model marked active in embedding_models
+        # (schema migration 7, switched by reindex.py) wins over the configured one, so every
+        # process moves to a new model together and never mixes vector spaces
         try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("select model, dimension from embedding_models where status = 'active'")
+                    row = cursor.fetchone()
+        except Exception as e:
+            if not self._active_model_error_logged:
+                logging.error(f"Error reading the active embedding model, using {self.embedding_model}: {e}")
+                self._active_model_error_logged = True
+            return
+        if row is None or row[0] == self.embedding_model:
+            return
+        logging.warning(f"Active embedding model is {row[0]} (dimension {row[1]}), was {self.embedding_model}")
+        self.embedding_model = row[0]
+        self.embedding_dimension = row[1]
+        self._local_generation += 1
+        with self._local_index_lock:
+            # vectors of the old model; rebuilt on next use
+            self._local_index = None
+
+    def _drop_local_index_with_removals(self):
+        # caller holds self._generation_lock. The in-process index only adds new rows, so
+        # embeddings deleted or rewritten since it was built (schema migration 12) are still
+        # in it; it is rebuilt on next use
+        index = self._local_index
+        if index is None:
+            return
+        removals = self.get_embedding_removals()
+        if removals is None or removals == index.removal_generation:
+            return
+        logging.info("Embeddings were removed since the local vector index was built, rebuilding it")
+        with self._local_index_lock:
+            if self._local_index is index:
+                self._local_index = None
+
+    def get_embedding_removals(self) -> Optional[int]:
+        '''Count of statements that updated or deleted bug_embeddings rows (embedding_removal_seq), None if unreadable'''
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("select last_value from embedding_removal_seq")
+                    row = cursor.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            if not self._removals_error_logged:
+                logging.error(f"Error reading embedding removals, in-process indexes are not rebuilt after deletes: {e}")
+                self._removals_error_logged = True
+            return None
+
+    def _read_db_generation(self) -> Optional[int]:
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("select last_value from data_generation_seq")
+                    row = cursor.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            if not self._generation_error_logged:
+                logging.error(f"Error reading data generation, only local writes invalidate caches: {e}")
+                self._generation_error_logged = True
+            return None
+
+    def bump_data_generation(self):
+        '''
+        Mark data changed by this process, invalidating cached search results.
+        Call after committing: the trigger bumps the database sequence when the
+        statement runs, before other processes can see the rows, so it is bumped
+        once more here for results they cached in between.
+        '''
+        with self._generation_lock:
+            self._local_generation += 1
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("select nextval('data_generation_seq')")
+        except Exception as e:
+            logging.error(f"Error bumping the data generation: {e}")
+
+    def get_local_index(self) -> LocalVectorIndex:
+        '''The in-process index, loaded from bug_embeddings on first use'''
+        if self._local_index is None:
+            with self._local_index_lock:
+                if self._local_index is None:
+                    if self.search_backend == "ivf":
+                        index = IVFIndex.open(self.ivf_config, self, self.embedding_dimension)
+                    elif self.search_backend == "quantized":
+                        index = QuantizedVectorIndex.open(self.quantization_config, self, self.embedding_dimension)
+                    else:
+                        index = LocalVectorIndex(self.embedding_dimension, embedding_model=self.embedding_model)
+                        index.load(self)
+                    self._local_index = index
+        elif time.monotonic() - self._local_index.loaded_at > self.local_index_refresh_interval:
+            # pick up rows stored by other processes
+            self._refresh_local_index()
+        return self._local_index
+
+    def _refresh_local_index(self):
+        #incrementally load embeddings stored since the last load, if the index is in use
+        if self._local_index is None:
+            return
+        try:
+            self._local_index.load(self)
+        except Exception as e:
+            logging.error(f"Error refreshing local vector index: {e}")
+
+    def search_similar_bugs(self, query: str, limit: int = 5, content_type: str = None, product_filter: str = None, similarity_threshold: float = 0.8, group_by_bug: bool = False, aggregation: str = "max") -> List[Dict]:
+        """Search for similar bugs using vector similarity.
+
+        With hybrid_search the vector ranking is fused with a lexical ranking over
+        description and closing_notes (RRF, one row per bug). Lexical hits are
+        held to the same content_type and similarity_threshold as vector hits.
+        Hybrid search is off by default (HYBRID_SEARCH); with the in-process
+        backends it costs a database round trip per search. A query that is a
+        single identifier (incident number, part number, error code) is first
+        looked up exactly; when that finds bugs they are returned without
+        calling the embedding model.
+
+        group_by_bug returns `limit` distinct bugs, each with its best-matching
+        content_type and the max (or, with aggregation="weighted", the
+        group_weights-weighted) similarity over its content types.
+        """
+        try:
+            self._poll_database_state()
+            if self.hybrid_search and is_identifier_query(query):
+                exact = self.find_exact_matches(query, limit, product_filter)
+                if exact:
+                    logging.info(f"Exact match for {query!r}: {len(exact)} bugs, embedding skipped")
+                    return exact
+
             # Generate embedding for the query
             query_embedding = self.generate_embedding(query)
-            query_embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
+            if self.search_backend in ("local", "ivf", "quantized"):
+                vector_rows = self.get_local_index().search(
+                    query_embedding,
+                    limit=limit * HYBRID_CANDIDATE_FACTOR if self.hybrid_search else limit,
+                    content_type=content_type,
+                    product_filter=product_filter,
+                    similarity_threshold=similarity_threshold,
+                    group_by_bug=group_by_bug,
+                    aggregation=aggregation,
+                    weights=self.group_weights
+                )
+                if not self.hybrid_search:
+                    return vector_rows
+                lexical_rows = self._lexical_search_batch([
+                    (query, query_embedding, content_type, product_filter, similarity_threshold, limit * HYBRID_CANDIDATE_FACTOR)
+                ])[0]
+                return _rrf_fuse(vector_rows, lexical_rows, self.rrf_k, limit)
+            query_embedding_str = vector_literal(query_embedding)
             
             with self.get_db_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT * FROM search_similar_bugs(%s::vector, %s, %s, %s, %s)
-                    """, (query_embedding_str, content_type, product_filter, similarity_threshold, limit))
+                    apply_search_settings(cursor, self.vector_index_config)
+                    cursor.execute(
+                        GROUPED_SEARCH_FUNCTION_QUERY if group_by_bug else SEARCH_FUNCTION_QUERY,
+                        self.search_function_params(query, query_embedding_str, limit, content_type, product_filter,
+                                                    similarity_threshold, aggregation)
+                    )
                     
                     # Get column names from cursor description
                     columns = [desc[0] for desc in cursor.description]
@@ -236,6 +772,197 @@ class BugRagSystem:
             logging.error(f"Error in search_similar_bugs: {e}")
             return []
 
+    def get_stored_embeddings(self, bug_ids: List[int], content_type: str = "resolution") -> Dict[int, np.ndarray]:
+        """Stored embedding of content_type for each of bug_ids that has one (current model only)."""
+        if not bug_ids:
+            return {}
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT bug_id, embedding::text
+                        FROM bug_embeddings
+                        WHERE bug_id = any(%s)
+                          AND content_type = %s
+                          AND (embedding_model = %s OR embedding_model IS NULL)
+                    """, (list(bug_ids), content_type, self.embedding_model))
+                    return {bug_id: parse_vector(vector) for bug_id, vector in cursor.fetchall()}
+        except Exception as e:
+            logging.error(f"Error reading stored embeddings: {e}")
+            return {}
+
+    def search_function_params(self, query: str, query_embedding_str: str, limit: int, content_type: Optional[str],
+                               product_filter: Optional[str], similarity_threshold: float, aggregation: str) -> Dict[str, Any]:
+        '''Parameters of SEARCH_FUNCTION_QUERY / GROUPED_SEARCH_FUNCTION_QUERY for one search'''
+        return {
+            "embedding": query_embedding_str,
+            "content_type": content_type,
+            "product_filter": product_filter,
+            "similarity_threshold": similarity_threshold,
+            "limit": limit,
+            "aggregation": aggregation,
+            "query_text": query if self.hybrid_search else None,
+            "rrf_k": self.rrf_k,
+            "weights": json.dumps(self.group_weights),
+        }
+
+    def find_exact_matches(self, identifier: str, limit: int = 5, product_filter: str = None) -> List[Dict]:
+        """Bugs whose incident_number is identifier, or else whose text contains it as a phrase.
+
+        Rows have the search_similar_bugs columns, with similarity_score 1.0.
+        """
+        identifier = identifier.strip()
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    params = {"identifiers": list({identifier, identifier.upper()}), "identifier": identifier,
+                              "product_filter": product_filter, "limit": limit}
+                    cursor.execute(EXACT_INCIDENT_QUERY, params)
+                    columns = [desc[0] for desc in cursor.description]
+                    rows = cursor.fetchall()
+                    if not rows:
+                        cursor.execute(EXACT_PHRASE_QUERY, params)
+                        rows = cursor.fetchall()
+                    return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            logging.error(f"Error in find_exact_matches: {e}")
+            return []
+
+    def _lexical_search_batch(self, searches: List[Tuple[str, List[float], Optional[str], Optional[str], float, int]]) -> List[List[Dict]]:
+        #full-text ranking of bugs for each (query text, query embedding, content type, product filter,
+        #similarity threshold, limit), in one statement; a bug is kept only when one of its embeddings of
+        #that content type reaches the threshold, and content_type/similarity_score are taken from the best one
+        results: List[List[Dict]] = [[] for _ in searches]
+        try:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                        SELECT q.ord - 1 AS search_index, l.*
+                        FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::float8[], %s::int[])
+                             WITH ORDINALITY AS q(query_text, embedding, content_type, product_filter, similarity_threshold, result_limit, ord)
+                        CROSS JOIN LATERAL (
+                            SELECT b.id AS bug_id, b.incident_number, b.product, b.description, b.closing_notes,
+                                   e.content_type, e.similarity_score,
+                                   row_number() OVER (ORDER BY ts_rank_cd(b.search_tsv, query) DESC) AS lexical_rank
+                            FROM bugs b
+                            CROSS JOIN websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', q.query_text) query
+                            CROSS JOIN LATERAL (
+                                SELECT be.content_type, (1 - (be.embedding <=> q.embedding::vector))::float AS similarity_score
+                                FROM bug_embeddings be
+                                WHERE be.bug_id = b.id
+                                  AND (q.content_type IS NULL OR be.content_type = q.content_type)
+                                  AND 1 - (be.embedding <=> q.embedding::vector) >= q.similarity_threshold
+                                ORDER BY be.embedding <=> q.embedding::vector
+                                LIMIT 1
+                            ) e
+                            WHERE b.search_tsv @@ query
+                              AND (q.product_filter IS NULL OR b.product = q.product_filter)
+                            ORDER BY ts_rank_cd(b.search_tsv, query) DESC
+                            LIMIT q.result_limit
+                        ) l
+                        ORDER BY q.ord, l.lexical_rank
+                    """, (
+                        [search[0] for search in searches],
+                        [vector_literal(search[1]) for search in searches],
+                        [search[2] for search in searches],
+                        [search[3] for search in searches],
+                        [search[4] for search in searches],
+                        [search[5] for search in searches],
+                    ))
+                    columns = [desc[0] for desc in cursor.description]
+                    for row in cursor.fetchall():
+                        row_dict = dict(zip(columns, row))
+                        row_dict.pop("lexical_rank")
+                        results[row_dict.pop("search_index")].append(row_dict)
+        except Exception as e:
+            # vector results alone are still useful
+            logging.error(f"Error in lexical search: {e}")
+        return results
+
+    def search_similar_bugs_batch(self, searches: List[Dict]) -> List[List[Dict]]:
+        """Run many searches with one embedding request and one vector lookup.
+
+        searches[i] holds the search_similar_bugs arguments (query, limit, content_type,
+        product_filter, similarity_threshold) of one search; the result is aligned with it.
+        With the postgres backend every search runs in one statement that joins the
+        unnested query vectors LATERAL into search_similar_bugs; local backends score
+        all queries in one matrix multiply. Hybrid search applies as in search_similar_bugs.
+        """
+        results: List[List[Dict]] = [[] for _ in searches]
+        if not searches:
+            return results
+        try:
+            self._poll_database_state()
+            embeddings = self.generate_embeddings([search["query"] for search in searches])
+            # a query whose embedding failed gets no results
+            positions = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+            if not positions:
+                return results
+            if self.search_backend in ("local", "ivf", "quantized"):
+                factor = HYBRID_CANDIDATE_FACTOR if self.hybrid_search else 1
+                found = self.get_local_index().search_many(
+                    [embeddings[i] for i in positions],
+                    [{**{key: value for key, value in searches[i].items() if key != "query"},
+                      "limit": searches[i].get("limit", 5) * factor, "weights": self.group_weights} for i in positions]
+                )
+                if self.hybrid_search:
+                    lexical = self._lexical_search_batch([
+                        (searches[i]["query"], embeddings[i], searches[i].get("content_type"), searches[i].get("product_filter"),
+                         searches[i].get("similarity_threshold", 0.8), searches[i].get("limit", 5) * factor)
+                        for i in positions
+                    ])
+                    found = [
+                        _rrf_fuse(vector_rows, lexical_rows, self.rrf_k, searches[i].get("limit", 5))
+                        for i, vector_rows, lexical_rows in zip(positions, found, lexical)
+                    ]
+                for i, rows in zip(positions, found):
+                    results[i] = rows
+                return results
+
+            with self.get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    apply_search_settings(cursor, self.vector_index_config)
+                    # grouped searches call search_similar_bugs_grouped; the other branch is skipped by its one-time filter
+                    cursor.execute("""
+                        SELECT q.ord - 1 AS search_index, r.*
+                        FROM unnest(%s::text[], %s::text[], %s::text[], %s::float8[], %s::int[], %s::text[], %s::text[])
+                             WITH ORDINALITY AS q(embedding, content_type, product_filter, similarity_threshold, result_limit, query_text, aggregation, ord)
+                        CROSS JOIN LATERAL (
+                            SELECT * FROM search_similar_bugs(
+                                q.embedding::vector, q.content_type, q.product_filter, q.similarity_threshold, q.result_limit,
+                                q.query_text, %s
+                            ) WITH ORDINALITY WHERE q.aggregation IS NULL
+                            UNION ALL
+                            SELECT * FROM search_similar_bugs_grouped(
+                                q.embedding::vector, q.content_type, q.product_filter, q.similarity_threshold, q.result_limit,
+                                q.aggregation, q.query_text, %s, %s::jsonb
+                            ) WITH ORDINALITY WHERE q.aggregation IS NOT NULL
+                        ) r
+                        ORDER BY q.ord, r.ordinality
+                    """, (
+                        [vector_literal(embeddings[i]) for i in positions],
+                        [searches[i].get("content_type") for i in positions],
+                        [searches[i].get("product_filter") for i in positions],
+                        [searches[i].get("similarity_threshold", 0.8) for i in positions],
+                        [searches[i].get("limit", 5) for i in positions],
+                        [searches[i]["query"] if self.hybrid_search else None for i in positions],
+                        [searches[i].get("aggregation", "max") if searches[i].get("group_by_bug") else None for i in positions],
+                        self.rrf_k,
+                        self.rrf_k,
+                        json.dumps(self.group_weights),
+                    ))
+                    columns = [desc[0] for desc in cursor.description]
+                    # rows of one search keep the function's order
+                    for row in cursor.fetchall():
+                        row_dict = dict(zip(columns, row))
+                        row_dict.pop("ordinality")
+                        results[positions[row_dict.pop("search_index")]].append(row_dict)
+            return results
+
+        except Exception as e:
+            logging.error(f"Error in search_similar_bugs_batch: {e}")
+            return [[] for _ in searches]
+
     # def search_similar_bugs(
     #     self,
     #     query: str,
@@ -287,12 +1014,33 @@ class BugRagSystem:
                 else:
                     return None
 
+    def find_existing_incident_numbers(self, incident_numbers: List[str]) -> Set[str]:
+        """Return the subset of incident_numbers already stored in bugs.
+
+        Uses a single connection and one array query per DEDUPE_CHUNK_SIZE numbers,
+        fetching only the incident_number column.
+        """
+        unique_numbers = list(dict.fromkeys(n for n in incident_numbers if n))
+        existing = set()
+        if not unique_numbers:
+            return existing
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(unique_numbers), DEDUPE_CHUNK_SIZE):
+                    chunk = unique_numbers[start:start + DEDUPE_CHUNK_SIZE]
+                    cursor.execute("""
+                        select incident_number from bugs where incident_number = any(%s)
+                    """, (chunk,))
+                    existing.update(row[0] for row in cursor.fetchall())
+        logging.info(f"{len(existing)} of {len(unique_numbers)} incident numbers already exist")
+        return existing
+
     def get_bug_count(self):
 
         # Get the count of bugs in the database.
         with self.get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cusrsor.execute("select count(*) from bugs")
+                cursor.execute("select count(*) from bugs")
                 return cursor.fetchone()[0]
 
     def get_embedding_count(self):
@@ -1,4 +1,5 @@
 from typing import Any
+from functools import lru_cache
 import psycopg2
 from constants import ENV_FILE_PATH
 
@@ -15,4 +16,22 @@ def read_env_file(file_path: str = ENV_FILE_PATH) -> dict:
         print(f"Error: File '{file_path}' not found.")
     except Exception as e:
         print(f"Error: {e}")
-    return env_vars
\ No newline at end of file
+    return env_vars
+
+@lru_cache(maxsize=1)
+def _cached_env_file(file_path: str) -> dict:
+    return read_env_file(file_path)
+
+def get_env_vars(file_path: str = ENV_FILE_PATH) -> dict:
+    #.env values, read once per process
+    return dict(_cached_env_file(file_path))
+
+def get_db_config(env_vars: dict) -> dict:
+    #psycopg2 connection parameters from .env values
+    return {
+        "host":env_vars.get("DB_HOST"),
+        "database":env_vars.get("DB_NAME"),
+        "user":env_vars.get("DB_USERNAME"),
+        "password":env_vars.get("DB_PASSWORD"),
+        "port":env_vars.get("DB_PORT")
+    }
@@ -3,4 +3,85 @@ LLM_CHAT_API = "/api/chat"
 LLM_EMBEDDING_API = "api/embedding"
 STREAM_RESPONSE = True
 EMBEDDING_MODEL = "text-embedding-ada-002"
-EMBEDDING_DIMENSION = 768
\ No newline at end of file
+EMBEDDING_DIMENSION = 768
+EMBEDDING_BATCH_SIZE = 64
+INGEST_BATCH_SIZE = 32
+INGEST_EMBED_WORKERS = 4
+INGEST_QUEUE_SIZE = 8
+INGEST_WRITE_BATCH_SIZE = 128
+INGEST_REPORT_INTERVAL = 5.0
+DEDUPE_CHUNK_SIZE = 1000
+BULK_COMMIT_SIZE = 500
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+DB_POOL_HEALTH_CHECK_INTERVAL = 30.0
+EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_READ_TIMEOUT = 120.0
+LLM_MAX_RETRIES = 3
+LLM_POOL_SIZE = 16
+CSV_SNIFF_BYTES = 1024 * 1024
+CSV_CHUNK_SIZE = 5000
+INGEST_JOBS_DIR = "ingest_jobs"
+INGEST_JOB_WORKERS = 1
+INGEST_JOB_SAVE_INTERVAL = 1.0
+SEARCH_BACKEND = "postgres"
+LOCAL_INDEX_LOAD_BATCH_SIZE = 5000
+LOCAL_INDEX_REFRESH_INTERVAL = 30.0
+LOCAL_INDEX_RESCAN_WINDOW = 10000 # ids below the highest loaded one checked again on refresh
+IVF_N_LISTS = 256
+IVF_NPROBE = 16
+IVF_TRAIN_ITERATIONS = 10
+IVF_TRAIN_SAMPLE_SIZE = 100000
+IVF_MIN_ROWS_PER_LIST = 39
+IVF_INDEX_PATH = "search_index/ivf_index.npz"
+VECTOR_INDEX_TYPE = "hnsw"
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+HNSW_EF_SEARCH = 100
+IVFFLAT_LISTS = 100
+IVFFLAT_PROBES = 10
+SEARCH_CACHE_MAX_ENTRIES = 1024
+SEARCH_CACHE_TTL = 300.0
+DATA_GENERATION_POLL_INTERVAL = 2.0
+SEARCH_BATCH_MAX_QUERIES = 100
+HYBRID_SEARCH = False
+TEXT_SEARCH_CONFIG = "simple"
+RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 4
+EXACT_MATCH_MAX_LENGTH = 40
+GROUP_CANDIDATE_FACTOR = 6
+GROUP_WEIGHTS = {"description": 0.3, "resolution": 0.2, "combined": 0.5}
+REINDEX_BATCH_SIZE = 200
+REINDEX_MAX_ROWS_PER_SECOND = 0
+LOCAL_INDEX_QUANTIZATION = "int8" # "none", "int8" or "pq", for SEARCH_BACKEND=quantized
+QUANTIZATION_RERANK_FACTOR = 8
+PQ_SUBSPACES = 0 # 0: one per PQ_SUBVECTOR_DIMENSION dimensions; snapped to a divisor of the dimension
+PQ_SUBVECTOR_DIMENSION = 8
+PQ_CENTROIDS = 256
+PQ_TRAIN_ITERATIONS = 10
+PQ_TRAIN_SAMPLE_SIZE = 50000
+PQ_MIN_TRAIN_ROWS = 10000
+QUANTIZED_INDEX_PATH = "search_index/quantized"
+PRIORITY_LEVELS = {4: "Critical", 3: "High", 2: "Medium", 1: "Low"} # bugs.priority -> level, others "Unknown"
+INCIDENT_PAGE_SIZE = 100
+INCIDENT_MAX_PAGE_SIZE = 1000
+INCIDENT_STREAM_BATCH_SIZE = 500 # rows per server-side cursor fetch and NDJSON chunk
+CHAT_CANCEL_DIR = "chat_cancel" # cancel markers for generations running in other worker processes
+CHAT_CANCEL_POLL_INTERVAL = 0.25
+CHAT_CANCEL_MARKER_TTL = 600.0
+CONTEXT_TOKEN_BUDGET = 1024 # tokens of similar-bug context in chat prompts
+CONTEXT_NOTE_MAX_TOKENS = 200
+CONTEXT_DESCRIPTION_MAX_TOKENS = 40
+CONTEXT_MIN_ENTRY_TOKENS = 32
+CONTEXT_MMR_LAMBDA = 0.7 # 1.0: relevance only, lower: more diverse resolutions
+CONTEXT_DUPLICATE_SIMILARITY = 0.95
+CONTEXT_CHARS_PER_TOKEN = 4
+CONTEXT_CANDIDATES = 10 # similar bugs retrieved for the context
+ASYNC_APP_PORT = 5001 # api_async.py
+APP_PORT = 5000
+APP_WORKERS = 2 # gunicorn worker processes
+APP_THREADS = 8 # threads per worker; a streamed chat answer holds one for its whole length
+APP_TIMEOUT = 120 # seconds a request may run before the worker is restarted
+APP_WARM_UP = True # open connections and load the embedding model before a worker accepts requests
+WARM_UP_TEXT = "warm up"
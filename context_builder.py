@@ -0,0 +1,152 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from constants import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_NOTE_MAX_TOKENS,
+    CONTEXT_DESCRIPTION_MAX_TOKENS,
+    CONTEXT_MIN_ENTRY_TOKENS,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_DUPLICATE_SIMILARITY,
+    CONTEXT_CHARS_PER_TOKEN,
+)
+from local_search_index import normalize_rows
+
+'''
+Retrieval context for chat prompts
+
+build_context turns the similar bugs found for a question into the CONTEXT block
+of the system prompt, within a token budget:
+
+- one entry per bug (the best-scoring row), bugs without closing notes skipped
+- entries picked by maximal marginal relevance (MMR): relevance is the search
+  similarity, redundancy the cosine similarity of the stored resolution
+  embeddings to the entries already picked, so near-duplicate closing notes do
+  not crowd out different resolutions; a note more similar than
+  CONTEXT_DUPLICATE_SIMILARITY to one already picked is left out
+- long descriptions and notes cut at a sentence boundary; the last entry is cut
+  to whatever budget is left
+
+Token counts are estimated at CONTEXT_CHARS_PER_TOKEN characters per token
+(there is no tokenizer for the served model here), and reported with the context.
+'''
+
+
+@dataclass
+class ContextResult:
+    text: str
+    tokens: int # estimated tokens of text
+    budget: int
+    incident_numbers: List[str] = field(default_factory=list) # entries included, in order
+    candidates: int = 0 # distinct bugs with closing notes considered
+    truncated: int = 0 # entries shortened to fit
+    dropped: int = 0 # candidates left out (budget or redundancy)
+
+    def report(self) -> Dict:
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "entries": len(self.incident_numbers),
+            "candidates": self.candidates,
+            "truncated": self.truncated,
+            "dropped": self.dropped,
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text or "") // CONTEXT_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    '''text cut to about max_tokens, preferably at the end of a sentence'''
+    if max_tokens <= 0:
+        return ""
+    text = re.sub(r"\s+", " ", (text or "").strip())
+    max_chars = max_tokens * CONTEXT_CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 2]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= len(cut) // 2:
+        return cut[:sentence_end + 1]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut) + " …"
+
+
+def format_entry(bug: Dict, note_tokens: int = CONTEXT_NOTE_MAX_TOKENS,
+                 description_tokens: int = CONTEXT_DESCRIPTION_MAX_TOKENS) -> str:
+    return (
+        f"Incident Number: {bug['incident_number']} (similarity:{bug['similarity_score']*100:.1f})\n"
+        f"Problem: {truncate_to_tokens(bug.get('description') or '', description_tokens)}\n"
+        f"Resolution: {truncate_to_tokens(bug['closing_notes'], note_tokens)}\n"
+    )
+
+
+def _mmr_order(bugs: List[Dict], embeddings: Dict[int, np.ndarray], mmr_lambda: float) -> List[Tuple[int, float]]:
+    # (index of bug, max similarity to the bugs before it) in MMR order:
+    # argmax of lambda * relevance - (1 - lambda) * max similarity to picked
+    relevance = np.array([bug["similarity_score"] for bug in bugs], dtype=np.float32)
+    known = [i for i, bug in enumerate(bugs) if bug["bug_id"] in embeddings]
+    similarity = np.zeros((len(bugs), len(bugs)), dtype=np.float32)
+    if len(known) > 1:
+        vectors = normalize_rows(np.vstack([embeddings[bugs[i]["bug_id"]] for i in known]))
+        similarity[np.ix_(known, known)] = vectors @ vectors.T
+    redundancy = np.full(len(bugs), -np.inf, dtype=np.float32)
+    remaining = list(range(len(bugs)))
+    order = []
+    while remaining:
+        penalty = np.where(np.isfinite(redundancy[remaining]), redundancy[remaining], 0.0)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * penalty
+        picked = remaining.pop(int(np.argmax(scores)))
+        order.append((picked, float(redundancy[picked])))
+        redundancy = np.maximum(redundancy, similarity[picked])
+    return order
+
+
+def build_context(bugs: List[Dict], embeddings: Optional[Dict[int, np.ndarray]] = None,
+                  budget: int = CONTEXT_TOKEN_BUDGET, mmr_lambda: float = CONTEXT_MMR_LAMBDA) -> ContextResult:
+    '''
+    Context block from search results (search_similar_bugs rows) within budget
+    tokens. embeddings maps bug_id to its stored resolution embedding; bugs
+    without one are ranked by relevance only.
+    '''
+    best: Dict[int, Dict] = {}
+    for bug in bugs:
+        if not bug.get("closing_notes"):
+            continue
+        current = best.get(bug["bug_id"])
+        if current is None or bug["similarity_score"] > current["similarity_score"]:
+            best[bug["bug_id"]] = bug
+    candidates = list(best.values())
+    result = ContextResult(text="", tokens=0, budget=budget, candidates=len(candidates))
+    if not candidates:
+        return result
+
+    entries = []
+    for i, redundancy in _mmr_order(candidates, embeddings or {}, mmr_lambda):
+        if redundancy > CONTEXT_DUPLICATE_SIMILARITY:
+            continue
+        bug = candidates[i]
+        remaining = budget - result.tokens
+        entry = format_entry(bug)
+        if estimate_tokens(entry) > remaining:
+            # squeeze the resolution into what is left, unless too little would remain of it
+            overhead = estimate_tokens(format_entry(bug, note_tokens=0))
+            if remaining - overhead < CONTEXT_MIN_ENTRY_TOKENS:
+                continue
+            entry = format_entry(bug, note_tokens=remaining - overhead)
+            if estimate_tokens(entry) > remaining:
+                continue
+        entries.append(entry)
+        result.tokens += estimate_tokens(entry)
+        result.incident_numbers.append(bug["incident_number"])
+        if entry != format_entry(bug, note_tokens=10 ** 6, description_tokens=10 ** 6):
+            result.truncated += 1
+    result.text = "".join(entries)
+    result.tokens = estimate_tokens(result.text)
+    result.dropped = result.candidates - len(entries)
+    logging.info(f"Context: {len(entries)} of {result.candidates} resolutions, ~{result.tokens}/{budget} tokens, {result.truncated} truncated")
+    return result
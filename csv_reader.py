@@ -0,0 +1,93 @@
+import codecs
+import logging
+from typing import Iterator, List
+
+import chardet
+import pandas as pd
+from constants import CSV_SNIFF_BYTES, CSV_CHUNK_SIZE
+
+ENCODINGS_TO_TRY = [
+    'utf-8',
+    'utf-8-sig',
+    'windows-1252',
+    'iso-8859-1',
+    'cp1252',
+    'ascii'
+
+]
+
+
+def detect_file_encoding(file_path, sample_bytes: int = None):
+    #detect encoding with chardet, from the first sample_bytes bytes when given
+    try:
+        with open(file_path,'rb') as f:
+            logging.info(f"Trying to detect file encoding")
+            raw_data = f.read(sample_bytes) if sample_bytes else f.read()
+            result = chardet.detect(raw_data)
+            encoding=result['encoding']
+            confidence = result['confidence']
+            logging.info(f"File encoding detected as {encoding} with confidence {confidence}")
+            return encoding
+    except Exception as e:
+        logging.error(f"Error detecting file encoding: {e}")
+        return 'utf-8'
+
+
+def _candidate_encodings(detected_encoding) -> List[str]:
+    encoding_to_try = list(ENCODINGS_TO_TRY)
+    if detected_encoding:
+        encoding_to_try.insert(0, detected_encoding)
+    #remove duplicates while preserving order
+    return list(dict.fromkeys(encoding_to_try))
+
+
+def read_csv_with_encoding_detection(file_path):
+    #read the whole file into one DataFrame, trying encodings until one parses
+    encoding_to_try = _candidate_encodings(detect_file_encoding(file_path))
+
+    for encoding in encoding_to_try:
+        try:
+            logging.info(f"Trying to read file with encoding {encoding}")
+            df = pd.read_csv(file_path, encoding=encoding)
+            logging.info(f"Successfully read file with encoding {encoding}")
+            return df
+        except Exception as e:
+            logging.error(f"Error reading file with encoding {encoding}: {str(e)}")
+
+            continue
+    raise ValueError(f"Could not read file with any of the following encodings: {', '.join(encoding_to_try)}")
+
+
+def sniff_encoding(file_path, sample_bytes: int = CSV_SNIFF_BYTES) -> str:
+    '''
+    Pick an encoding from a bounded prefix of the file.
+    chardet only sees the first sample_bytes bytes, and each candidate encoding is
+    checked by decoding that same prefix instead of re-parsing the whole file.
+    '''
+    with open(file_path, 'rb') as f:
+        prefix = f.read(sample_bytes)
+    encoding_to_try = _candidate_encodings(detect_file_encoding(file_path, sample_bytes))
+
+    for encoding in encoding_to_try:
+        try:
+            # incremental decode tolerates a multi-byte character cut off at the end of the prefix
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+            logging.info(f"Using encoding {encoding} (checked on first {len(prefix)} bytes)")
+            return encoding
+        except (UnicodeDecodeError, LookupError) as e:
+            logging.error(f"Prefix does not decode with encoding {encoding}: {str(e)}")
+    raise ValueError(f"Could not read file with any of the following encodings: {', '.join(encoding_to_try)}")
+
+
+def iter_csv_chunks(file_path, encoding: str = None, chunksize: int = CSV_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    '''
+    Yield the csv file as DataFrames of at most chunksize rows, so only one chunk
+    is parsed and held at a time. Bytes that do not decode with the sniffed
+    encoding further into the file are replaced rather than failing the upload.
+    '''
+    encoding = encoding or sniff_encoding(file_path)
+    reader = pd.read_csv(file_path, encoding=encoding, encoding_errors='replace', chunksize=chunksize)
+    with reader:
+        for chunk_number, chunk in enumerate(reader, start=1):
+            logging.info(f"Read chunk {chunk_number} ({len(chunk)} rows) from {file_path}")
+            yield chunk
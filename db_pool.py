@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import psycopg2
+from psycopg2 import pool
+from constants import DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_HEALTH_CHECK_INTERVAL
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool.
+
+    Wraps psycopg2's ThreadedConnectionPool so that checkout blocks while all
+    maxconn connections are in use instead of raising, and connections that
+    have been idle longer than health_check_interval seconds are pinged before
+    being handed out (broken ones are discarded and replaced).
+    """
+
+    def __init__(self, db_config: Dict[str, str], minconn: int = DB_POOL_MIN_SIZE, maxconn: int = DB_POOL_MAX_SIZE,
+                 health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **db_config)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {} # id(connection) -> time it was returned to the pool
+        self._closed = False
+        logging.info(f"Created database connection pool (min={minconn}, max={maxconn})")
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("select 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def getconn(self):
+        '''Check out a healthy connection, waiting for a free slot if the pool is exhausted'''
+        if self._closed:
+            raise pool.PoolError("connection pool is closed")
+        self._slots.acquire()
+        try:
+            while True:
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        '''Return a connection to the pool'''
+        try:
+            if self._closed:
+                conn.close()
+                return
+            close = close or conn.closed
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        '''
+        Borrow a connection for the duration of a with block.
+        The transaction is committed on success and rolled back on error,
+        like psycopg2's own connection context manager.
+        '''
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def close(self):
+        '''Close every connection; further checkouts fail'''
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.closeall()
+        self._last_used.clear()
+        logging.info("Closed database connection pool")
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from constants import EMBEDDING_CACHE_MAX_BYTES
+
+'''
+Content-addressed embedding cache
+
+Vectors are keyed by (embedding_model, sha256(text)), so the same text embedded
+with the same model is only sent to the model once. Two tiers:
+    - memory: LRU, evicts least recently used vectors once max_bytes is exceeded
+    - disk (optional): SQLite file that survives restarts and is shared by
+      every process pointing at the same path
+'''
+
+CacheKey = Tuple[str, str]
+
+
+class EmbeddingCache:
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, db_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self._entries: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local() # one sqlite connection per thread
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._disk() as conn:
+                conn.execute("""
+                    create table if not exists embedding_cache(
+                        model text not null,
+                        text_hash text not null,
+                        vector blob not null,
+                        primary key(model, text_hash)
+                    )
+                """)
+            logging.info(f"Embedding cache disk tier at {db_path}")
+
+    @staticmethod
+    def make_key(model: str, text: str) -> CacheKey:
+        return (model, hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    def _disk(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("pragma journal_mode=wal")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key: CacheKey, vector: np.ndarray):
+        # caller holds self._lock
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size_bytes -= previous.nbytes
+        self._entries[key] = vector
+        self._size_bytes += vector.nbytes
+        while self._size_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size_bytes -= evicted.nbytes
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        '''Look up texts; the result is aligned with texts, None for misses'''
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector.tolist()
+                else:
+                    missing.append(i)
+
+        if missing and self.db_path:
+            found = self._load_from_disk(model, [keys[i][1] for i in missing])
+            still_missing = []
+            with self._lock:
+                for i in missing:
+                    vector = found.get(keys[i][1])
+                    if vector is None:
+                        still_missing.append(i)
+                        continue
+                    self.disk_hits += 1
+                    self._remember(keys[i], vector)
+                    results[i] = vector.tolist()
+            missing = still_missing
+
+        with self._lock:
+            self.misses += len(missing)
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                if not embedding:
+                    continue
+                key = self.make_key(model, text)
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((model, key[1], vector.tobytes()))
+        if rows and self.db_path:
+            try:
+                with self._disk() as conn:
+                    conn.executemany(
+                        "insert or replace into embedding_cache(model, text_hash, vector) values(?, ?, ?)",
+                        rows
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"Error writing embeddings to disk cache: {e}")
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        self.put_many(model, [text], [embedding])
+
+    def _load_from_disk(self, model: str, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        try:
+            conn = self._disk()
+            # stay well below sqlite's bound-parameter limit
+            for start in range(0, len(text_hashes), 500):
+                chunk = text_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(
+                    f"select text_hash, vector from embedding_cache where model = ? and text_hash in ({placeholders})",
+                    [model, *chunk]
+                )
+                for text_hash, blob in cursor:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).copy()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading embeddings from disk cache: {e}")
+        return found
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from constants import CHAT_CANCEL_DIR, CHAT_CANCEL_POLL_INTERVAL, CHAT_CANCEL_MARKER_TTL
+
+'''
+Registry of in-flight chat generations
+
+Every streamed /api/chat generation is registered under its request id with the
+upstream model stream. cancel() sets the generation's cancelled flag and closes
+the upstream stream, which drops the HTTP connection to the model server so it
+stops generating and frees the slot.
+
+The registry is per process. A DELETE /api/chat served by another worker
+process leaves a marker file named after the request id in CHAT_CANCEL_DIR; the
+generating process checks for it every CHAT_CANCEL_POLL_INTERVAL seconds while
+streaming.
+'''
+
+
+@dataclass
+class Generation:
+    request_id: str
+    started_at: float = field(default_factory=time.monotonic)
+    upstream: Any = None # the model stream, closed on cancel
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    _checked_marker_at: float = 0.0
+
+    def attach(self, upstream: Any):
+        self.upstream = upstream
+        if self.cancelled.is_set():
+            # cancelled before the model answered
+            _close(upstream)
+
+    def close(self):
+        '''Drop the model stream (a no-op once it is closed)'''
+        _close(self.upstream)
+
+    def is_cancelled(self) -> bool:
+        if self.cancelled.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._checked_marker_at >= CHAT_CANCEL_POLL_INTERVAL:
+            self._checked_marker_at = now
+            if os.path.exists(_marker_path(self.request_id)):
+                self.cancelled.set()
+                self.close()
+        return self.cancelled.is_set()
+
+
+def _marker_path(request_id: str) -> str:
+    # request ids are client supplied; keep the file name inside CHAT_CANCEL_DIR
+    safe_id = "".join(c for c in request_id if c.isalnum() or c in "-_")
+    return os.path.join(CHAT_CANCEL_DIR, safe_id)
+
+
+def _close(upstream: Any):
+    if upstream is None:
+        return
+    try:
+        upstream.close()
+    except Exception as e:
+        logging.warning(f"Error closing model stream: {e}")
+
+
+class GenerationRegistry:
+
+    def __init__(self):
+        self._generations: Dict[str, Generation] = {}
+        self._lock = threading.Lock()
+
+    def register(self, request_id: str) -> Generation:
+        '''Track a new generation; raises ValueError when request_id is already generating'''
+        with self._lock:
+            if request_id in self._generations:
+                raise ValueError(f"Request {request_id} is already generating")
+            generation = self._generations[request_id] = Generation(request_id)
+        return generation
+
+    def finish(self, request_id: str, generation: Optional[Generation] = None):
+        '''Stop tracking request_id; with generation, only if that generation is the one registered'''
+        with self._lock:
+            if generation is not None and self._generations.get(request_id) is not generation:
+                # already finished, possibly re-registered by a retry since
+                return
+            self._generations.pop(request_id, None)
+        try:
+            os.remove(_marker_path(request_id))
+        except FileNotFoundError:
+            pass
+
+    def cancel(self, request_id: str) -> bool:
+        '''
+        Abort the generation of request_id. Returns True when it was running in
+        this process; otherwise leaves a marker for the process that runs it.
+        '''
+        with self._lock:
+            generation = self._generations.get(request_id)
+        if generation is not None:
+            generation.cancelled.set()
+            generation.close()
+            logging.info(f"Cancelled generation {request_id} after {time.monotonic() - generation.started_at:.1f} s")
+            return True
+        os.makedirs(CHAT_CANCEL_DIR, exist_ok=True)
+        self._remove_stale_markers()
+        with open(_marker_path(request_id), "w"):
+            pass
+        logging.info(f"Generation {request_id} is not running in this process, left a cancel marker")
+        return False
+
+    def active(self) -> Dict[str, float]:
+        '''request id -> seconds generating, for this process'''
+        now = time.monotonic()
+        with self._lock:
+            return {request_id: round(now - g.started_at, 1) for request_id, g in self._generations.items()}
+
+    @staticmethod
+    def _remove_stale_markers():
+        # markers of generations that had finished or never existed
+        cutoff = time.time() - CHAT_CANCEL_MARKER_TTL
+        for name in os.listdir(CHAT_CANCEL_DIR):
+            path = os.path.join(CHAT_CANCEL_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_registry: Optional[GenerationRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_generation_registry() -> GenerationRegistry:
+    '''The process-wide registry'''
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GenerationRegistry()
+        return _registry
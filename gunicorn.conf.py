@@ -0,0 +1,55 @@
+import logging
+
+from config import get_env_vars
+from constants import APP_PORT, APP_WORKERS, APP_THREADS, APP_TIMEOUT, APP_WARM_UP
+
+'''
+Production entry point for api.py
+
+    gunicorn -c gunicorn.conf.py
+
+Threaded workers (gthread), APP_WORKERS processes of APP_THREADS threads each,
+sized from .env. The app is imported once in the master (preload_app) and the
+in-process search index is loaded there before fork (rag_service.preload), so
+workers share it instead of each loading its own copy. Each worker then opens
+its own connections and model client (rag_service.warm_up) before it accepts
+requests. Setting APP_WARM_UP=false skips the warm-up.
+
+Every worker starts its ingestion job manager, which resumes jobs interrupted
+by a restart; the per-job file lock lets only one worker run each of them.
+'''
+
+env_vars = get_env_vars()
+
+wsgi_app = "api:app"
+bind = f"0.0.0.0:{env_vars.get('APP_PORT', APP_PORT)}"
+worker_class = "gthread"
+workers = int(env_vars.get("APP_WORKERS", APP_WORKERS))
+threads = int(env_vars.get("APP_THREADS", APP_THREADS))
+timeout = int(env_vars.get("APP_TIMEOUT", APP_TIMEOUT))
+preload_app = True
+accesslog = "-"
+
+
+def when_ready(server):
+    #master, after the app is imported and before the workers are forked
+    if server.cfg.preload_app:
+        from rag_service import preload
+        try:
+            preload()
+        except Exception as e:
+            # workers load the index themselves on first use
+            logging.error(f"Preload failed: {e}")
+
+
+def post_worker_init(worker):
+    #worker, before it accepts requests
+    if str(env_vars.get("APP_WARM_UP", APP_WARM_UP)).lower() == "true":
+        from rag_service import warm_up
+        warm_up()
+    from ingest_jobs import get_job_manager
+    try:
+        get_job_manager()
+    except Exception as e:
+        # jobs are resumed by the first /api/ingest request instead
+        logging.error(f"Resuming ingestion jobs failed: {e}")
@@ -1,36 +1,36 @@
+from typing import Dict
 from flask import jsonify
-from bug_rag_system import BugRagSystem
-from config import read_env_file
+from rag_service import get_rag_system
 import logging
 
 
+def get_cache_stats() -> Dict:
+    #hits and size of this process' embedding cache, hit ratio and saved latency of its
+    #search result cache (None when disabled)
+    bug_rag_system = get_rag_system()
+    return {
+        'embedding_cache':bug_rag_system.embedding_cache.stats() if bug_rag_system.embedding_cache else None,
+        'search_cache':bug_rag_system.search_cache.stats() if bug_rag_system.search_cache else None
+    }
+
+
 def get_database_counts():
     #get counts of various databse entities
 
     try:
-        env_vars = read_env_file()
-        #initalize RAG system
-
-        bug_rag_system = BugRagSystem({
-            "host":env_vars.get("DB_HOST"),
-            "database":env_vars.get("DB_NAME"),
-            "user":env_vars.get("DB_USERNAME"),
-            "password":env_vars.get("DB_PASSWORD"),
-            "port":env_vars.get("DB_PORT")
-        },
-        llm_api_url=env_vars.get("LLM_API_URL"),
-        embedding_model = env_vars.get("EMBEDDING_MODEL")
-        )
+        #shared RAG system (pooled connections)
+        bug_rag_system = get_rag_system()
         #get bug counts from Database
         bug_count = bug_rag_system.get_bug_count()
-        bug_embedding_count = bug_rag_system.get_bug_embedding_count()
+        bug_embedding_count = bug_rag_system.get_embedding_count()
         
 
         return jsonify({
             'error':False,
             'data': {
                 'bug_count':bug_count,
-                'bug_embedding_count':bug_embedding_count
+                'bug_embedding_count':bug_embedding_count,
+                **get_cache_stats()
             }
             }), 200
 
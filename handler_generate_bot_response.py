@@ -1,8 +1,15 @@
+import json
 import logging
-from config import read_env_file
-from constants import STREAM_RESPONSE
-from openai import OpenAI, api_key
-from handler_search import search_bugs                                                                                                                                                                                                         
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+from config import get_env_vars
+from llm_client import create_chat_completion
+from handler_search import search_bugs, BugSearchResults
+from generation_registry import get_generation_registry
+from context_builder import build_context, estimate_tokens, ContextResult
+from rag_service import get_rag_system
+from constants import CONTEXT_CANDIDATES
 
 def create_request_messages_from_payload(user_messages):
     #create request messages from payload
@@ -29,66 +36,157 @@ def add_response_to_history(messages, bot_response):
     return response_message
 
 
-def generate_bot_response_openai(messages, env_var):
+def generate_bot_response_openai(messages, env_vars):
     "Generate a response from the OpenAI API"
 
-    client=OpenAI(
-        base_url=f"{env_vars["LLM_API_URL"]}/v1",
-        api_key="ollama"
-    )
-    response = client.chat.completions.create(
+    #shared client: keep-alive connections, timeouts and retries
+    response = create_chat_completion(
+        env_vars["LLM_API_URL"],
         model=env_vars["CHAT_MODEL_NAME"],
         messages=messages,
-        stream = STREAM_RESPONSE
+        stream = False
     )
     if response.choices:
         return response.choices[0].message.content
 
-def generate_closing_notes(similar_bugs_details:list) -> str:
+def prepare_request_messages(payload) -> Tuple[List[Dict[str, str]], BugSearchResults, ContextResult]:
+    #conversation from the payload with a system prompt built from similar bugs
+    request_messages = create_request_messages_from_payload(payload['messages'])
 
-    #generate closing notes based on similar bugs
-    closing_notes = ""
-    processed_incident = {}
-    if similar_bugs_details:
-        for bug in similar_bugs_details:
-            if bug['incident_number'] in processed_incident:
-                continue
-            processed_incident[bug['incident_number']] = True
-            closing_notes = f"Incident Number: {bug['incident_number']}:{bug['description'][:100]}... (similarity:{bug['similarity_score']*100:.3f})\n"
-    return closing_notes
+    query = request_messages[-1]['content'] if request_messages else ""
+    logging.info(f"search query: {query}")
 
+    #search for similar bugs; more candidates than the context holds, so it can pick diverse ones
+    result = search_bugs(query=query, limit=CONTEXT_CANDIDATES)
+    logging.info(f"found {len(result.bugs)} similar bugs")
 
-def send_bot_response(payload):
-    """ Generate a bot response based on the user message and conversation history"""
-    request_received_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logging.info(f"Rquest received at:{request_received_time}")
-    
-    env_vars=read_env_file()
-    request_message = create_request_messages_from_payload(payload['messages'])
-    
-    query = request_messages[-1]['content'] if request_messages else ""
-    logging.info(f"search query: {query}") 
-    
-    #search for similar bugs
-    result = search_bugs(query=query)
-    logging.info(f"found similar bugs: {result.bugs}") 
-    
-    if result.bugs:
-        closing_notes = genearate_closing_notes(result.bugs)
-        logging.info(f"closing notes generated:{closing_notes}")
-        system.prompt = f"you are a helpful assistant. Use the following context that were resolutions provided for similar incidents, to answer the user query: {query} \n CONTEXT: {closing_notes}"
+    embeddings = get_rag_system().get_stored_embeddings([bug['bug_id'] for bug in result.bugs]) if result.bugs else {}
+    request_messages, context = add_system_prompt(request_messages, query, result, embeddings)
+    return request_messages, result, context
+
+
+def add_system_prompt(request_messages: List[Dict[str, str]], query: str, result: BugSearchResults,
+                      embeddings: Dict[int, Any]) -> Tuple[List[Dict[str, str]], ContextResult]:
+    #resolutions within the token budget, near-duplicates left out (see context_builder)
+    context = build_context(result.bugs, embeddings)
+    if context.text:
+        system_prompt = f"you are a helpful assistant. Use the following context that were resolutions provided for similar incidents, to answer the user query: {query} \n CONTEXT: {context.text}"
     else:
         system_prompt = f"you are a helpful assistant. Answer concisely the user query: {query}"
-        similar_bugs = "No similar bugs found"
-        
+
     #add system prompt to request messages
     request_messages.insert(0,{"role":"system","content":system_prompt})
-    
+    prompt_tokens = sum(estimate_tokens(message['content']) for message in request_messages)
+    logging.info(f"prompt ~{prompt_tokens} tokens, context {context.report()}")
+    return request_messages, context
+
+
+def send_bot_response(payload):
+    """ Generate a bot response based on the user message and conversation history"""
+    request_received_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    logging.info(f"Rquest received at:{request_received_time}")
+
+    env_vars=get_env_vars()
+    request_messages, result, context = prepare_request_messages(payload)
+
     bot_response = generate_bot_response_openai(request_messages, env_vars)
-    
+
     #add similar bugs to bot_response
     bot_response = f"{bot_response}\n\nSimilar incidents:\n {result.report}"
-    
+
     #add user message and bot response to converdation history
-    message = add_response_to_history(payload['messages'], bot_response)   
-    return message                                                                                                                                                      
\ No newline at end of file
+    message = add_response_to_history(payload['messages'], bot_response)
+    return message
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    #one Server-Sent Event
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class GenerationEvents:
+    '''
+    Iterator of the events of one streamed response. close() aborts the
+    generation and releases its request_id, also when iteration never started
+    (a generator that was not started skips its finally block when closed).
+    '''
+
+    def __init__(self, events: Iterator[str], release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        self._release()
+
+
+def stream_bot_response(payload, request_id: str) -> GenerationEvents:
+    """Like send_bot_response, but streams the answer as Server-Sent Events:
+    start, one token event per model delta, then done (with the conversation
+    entry and the context token report), cancelled or error. The generation is registered under request_id so
+    DELETE /api/chat can abort it; closing the iterator (client gone, response closed) aborts it too.
+    Raises ValueError when request_id is already generating.
+    """
+    registry = get_generation_registry()
+    generation = registry.register(request_id)
+    env_vars = get_env_vars()
+
+    def release():
+        #drop the model stream so the model stops generating; a no-op the second time
+        generation.close()
+        registry.finish(request_id, generation)
+
+    def events() -> Iterator[str]:
+        started = time.monotonic()
+        try:
+            #sent before the similar-bug search, so the client sees the response start immediately
+            yield sse_event("start", {"request_id": request_id})
+            request_messages, result, context = prepare_request_messages(payload)
+            if generation.is_cancelled():
+                yield sse_event("cancelled", {"request_id": request_id})
+                return
+
+            upstream = create_chat_completion(
+                env_vars["LLM_API_URL"],
+                model=env_vars["CHAT_MODEL_NAME"],
+                messages=request_messages,
+                stream=True
+            )
+            generation.attach(upstream)
+            parts = []
+            for chunk in upstream:
+                if generation.is_cancelled():
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not parts:
+                    logging.info(f"First token of {request_id} after {(time.monotonic() - started) * 1000:.0f} ms")
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+
+            if generation.is_cancelled():
+                yield sse_event("cancelled", {"request_id": request_id, "partial": "".join(parts)})
+                return
+            bot_response = f"{''.join(parts)}\n\nSimilar incidents:\n {result.report}"
+            message = add_response_to_history(payload['messages'], bot_response)
+            logging.info(f"Generation {request_id} finished in {(time.monotonic() - started) * 1000:.0f} ms")
+            yield sse_event("done", {"request_id": request_id, "message": message, "context": context.report()})
+        except Exception as e:
+            if generation.cancelled.is_set():
+                #closing the upstream stream interrupts the read in progress
+                yield sse_event("cancelled", {"request_id": request_id})
+            else:
+                logging.error(f"Error streaming response {request_id}: {e}")
+                yield sse_event("error", {"request_id": request_id, "message": "Error generating response"})
+        finally:
+            #also runs when the client disconnects
+            release()
+
+    return GenerationEvents(events(), release)
@@ -0,0 +1,61 @@
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+from rag_service import get_rag_system
+from constants import INCIDENT_STREAM_BATCH_SIZE
+
+'''
+Incident listings
+
+list_incidents returns one keyset-paginated page as a dict; stream_incidents
+yields the whole window as NDJSON text chunks (one line per incident, one chunk
+per server-side cursor batch) for a streamed Flask response.
+'''
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _json_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: _json_value(value) for column, value in row.items()}
+
+
+def list_incidents(days: int, page_size: int, cursor: Optional[str] = None, columns: Optional[List[str]] = None) -> Dict:
+    #raises ValueError for unknown columns or a bad cursor
+    rag_system = get_rag_system()
+    rows, next_cursor = rag_system.list_incidents(days, page_size=page_size, cursor=cursor, columns=columns)
+    logging.info(f"Listed {len(rows)} incidents of the last {days} days, more: {next_cursor is not None}")
+    return {
+        "incidents": [_json_row(row) for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def stream_incidents(days: int, columns: Optional[List[str]] = None, batch_size: int = INCIDENT_STREAM_BATCH_SIZE) -> Iterator[str]:
+    #raises ValueError for unknown columns before the first chunk; later errors end the stream with an error line
+    rows = get_rag_system().iter_incidents(days, columns=columns, batch_size=batch_size)
+
+    def chunks() -> Iterator[str]:
+        lines, count = [], 0
+        try:
+            for row in rows:
+                lines.append(json.dumps(_json_row(row), default=str))
+                count += 1
+                if len(lines) >= batch_size:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+            logging.info(f"Streamed {count} incidents of the last {days} days")
+        except Exception as e:
+            logging.error(f"Error streaming incidents after {count} rows: {e}")
+            yield json.dumps({"error": True, "message": "Error streaming incidents"}) + "\n"
+        finally:
+            #returns the connection when the client disconnects early
+            rows.close()
+
+    return chunks()
@@ -1,8 +1,8 @@
-from dataclasses import dataclass
-from config import read_env_file
-from bug_rag_system import BugRagSystem, BugData
-import pandas as pd
+from dataclasses import dataclass, asdict
+from typing import List
+from rag_service import get_rag_system
 import logging
+import time
 
 @dataclass
 class BugSearchParams:
@@ -11,6 +11,8 @@ class BugSearchParams:
     content_type:str = None
     product_filter: str = None
     similarity_threshold: float = 0.5
+    group_by_bug: bool = False #one row per distinct bug
+    aggregation: str = "max" #"max" or "weighted" similarity across content types, with group_by_bug
 
 @dataclass
 class BugSearchResults:
@@ -30,31 +32,65 @@ def generate_bug_report(bugs:list)->str:
         report += f"Incident Number: {bug['incident_number']}:{bug['description'][:100]}... (similarity:{bug['similarity_score']*100:.3f})\n"
     return report
 
-def search_bugs(query:str, limit:int = 5, content_type:str= None,product_filter:str = None,similarity_threshold:float=0.7) -> BugSearchResults:
-    env_vars = read_env_file()
-    #initalize RAG system
+def search_bugs(query:str, limit:int = 5, content_type:str= None,product_filter:str = None,similarity_threshold:float=0.7, group_by_bug:bool = False, aggregation:str = "max") -> BugSearchResults:
+    #shared RAG system (pooled connections)
+    rag_system = get_rag_system()
 
-    rag_system = BugRagSystem({
-
-            "host":env_vars.get("DB_HOST"),
-            "database":env_vars.get("DB_NAME"),
-            "user":env_vars.get("DB_USERNAME"),
-            "password":env_vars.get("DB_PASSWORD"),
-            "port":env_vars.get("DB_PORT")
-    },
-
-    llm_api_url = env_vars.get("LLM_API_URL"),
-    embedding_model = env_vars.get("EMBEDDING_MODEL_NAME")
-    )
+    #repeated searches are served from the result cache until the data changes
+    cache = rag_system.search_cache
+    if cache is not None:
+        key = cache.make_key(query, limit, content_type, product_filter, similarity_threshold, rag_system.embedding_model, group_by_bug, aggregation)
+        #read before searching, so a write during the search makes this entry stale
+        generation = rag_system.get_data_generation()
+        cached = cache.get(key, generation)
+        if cached is not None:
+            logging.info(f"search cache hit, {len(cached.bugs)} similar bugs")
+            return cached
 
+    started = time.monotonic()
     #search for similar bugs
     results = rag_system.search_similar_bugs(
         query=query,
         content_type=content_type,
         product_filter=product_filter,
         similarity_threshold=similarity_threshold,
-        limit=limit
+        limit=limit,
+        group_by_bug=group_by_bug,
+        aggregation=aggregation
     )
     report = generate_bug_report(results)
     logging.info(f"found {len(results)} similar bugs")
-    return BugSearchResults(bugs=results, report=report)
+    search_results = BugSearchResults(bugs=results, report=report)
+    #empty results are not cached: search_similar_bugs also returns [] when it fails
+    if cache is not None and results:
+        cache.put(key, generation, search_results, time.monotonic() - started)
+    return search_results
+
+
+def search_bugs_batch(searches:List[BugSearchParams]) -> List[BugSearchResults]:
+    #run many searches with one embedding request and one vector lookup; results are aligned with searches
+    rag_system = get_rag_system()
+    cache = rag_system.search_cache
+    results:List[BugSearchResults] = [None] * len(searches)
+    generation = rag_system.get_data_generation() if cache is not None else None
+    keys = [None] * len(searches)
+
+    #serve what the result cache already has, search the rest together
+    pending = []
+    for i, params in enumerate(searches):
+        if cache is not None:
+            keys[i] = cache.make_key(params.query, params.limit, params.content_type, params.product_filter, params.similarity_threshold, rag_system.embedding_model, params.group_by_bug, params.aggregation)
+            results[i] = cache.get(keys[i], generation)
+        if results[i] is None:
+            pending.append(i)
+    logging.info(f"batch search: {len(searches)} queries, {len(searches) - len(pending)} from cache")
+
+    if pending:
+        started = time.monotonic()
+        found = rag_system.search_similar_bugs_batch([asdict(searches[i]) for i in pending])
+        elapsed = (time.monotonic() - started) / len(pending)
+        for i, bugs in zip(pending, found):
+            results[i] = BugSearchResults(bugs=bugs, report=generate_bug_report(bugs))
+            if cache is not None and bugs:
+                cache.put(keys[i], generation, results[i], elapsed)
+    return results
@@ -1,11 +1,22 @@
 # handler_tool_manager.py
 from config import read_env_file
-from tool_manager import OllamaToolCaller, ToolManager, Result
+from intent_parser import parse_tool_call
+from tool_manager import get_tool_caller, ToolManager, Result
 import logging
 
+#executes tools resolved without the model
+_tool_manager = ToolManager()
+
 def tool_handler(user_message: str = "Get incidents created from last 7 days") -> Result:
+    #common time-window phrasings are parsed deterministically; the LLM only handles the rest
+    fast_path = parse_tool_call(user_message)
+    if fast_path is not None:
+        tool_name, arguments = fast_path
+        logging.info(f"Intent parsed without the model: {tool_name}({arguments})")
+        return _tool_manager.execute_tool(tool_name, arguments)
+
     try:
-        tool_caller = OllamaToolCaller("qwen3:0.6b")
+        tool_caller = get_tool_caller("qwen3:0.6b")
         responses = tool_caller.chat_with_tools(user_message)
         logging.info(f"Tool responses: {responses}")
 
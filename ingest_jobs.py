@@ -0,0 +1,248 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from typing import Dict, Optional
+
+from config import get_env_vars
+from constants import INGEST_JOBS_DIR, INGEST_JOB_WORKERS, INGEST_JOB_SAVE_INTERVAL
+from csv_reader import sniff_encoding, iter_csv_chunks
+from ingest_pipeline import IngestPipeline, IngestConfig
+from rag_service import get_rag_system
+
+'''
+Background ingestion jobs
+
+POST /api/ingest stores the upload under INGEST_JOBS_DIR and queues a job; the
+job's state is a JSON file next to it, so any worker process can answer
+GET /api/ingest/<job_id>. While running, the job checkpoints the last committed
+row (see ingest_pipeline.RowCheckpoint). A job found queued or running when a
+process starts (crash, restart) is resumed from its checkpoint; a lock file
+makes sure only one process runs a given job.
+'''
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    file_name: str
+    file_path: str
+    status: str = JOB_QUEUED
+    message: str = ""
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    estimated_rows: int = 0 # line count of the upload, an upper bound on rows; counted when the job starts
+    # counters covering rows up to last_committed_row, persisted together
+    last_committed_row: int = -1
+    checkpoint_processed_count: int = 0
+    checkpoint_skipped_count: int = 0
+    # live counters: checkpointed rows plus rows of the current run
+    processed_count: int = 0
+    skipped_count: int = 0
+    total_count: int = 0
+    rows_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    resumed_count: int = 0
+
+    def to_status(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "file_name": self.file_name,
+            "status": self.status,
+            "message": self.message,
+            "processed_records": self.processed_count,
+            "skipped_records": self.skipped_count,
+            "total_records": self.total_count,
+            "estimated_total_records": self.estimated_rows,
+            "last_committed_row": self.last_committed_row,
+            "rows_per_second": self.rows_per_second,
+            "eta_seconds": self.eta_seconds,
+            "resumed_count": self.resumed_count,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _count_lines(file_path: str) -> int:
+    count = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            count += block.count(b'\n')
+    return max(0, count - 1) # header
+
+
+class IngestJobManager:
+
+    def __init__(self, jobs_dir: str = INGEST_JOBS_DIR, max_workers: int = INGEST_JOB_WORKERS,
+                 save_interval: float = INGEST_JOB_SAVE_INTERVAL):
+        self.jobs_dir = jobs_dir
+        self.save_interval = save_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._lock = threading.Lock()
+        self._running: Dict[str, IngestJob] = {} # jobs owned by this process
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: IngestJob):
+        # write-then-rename so readers never see a partial file
+        path = self._state_path(job.job_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(job), f)
+        os.replace(tmp_path, path)
+
+    def _load(self, job_id: str) -> Optional[IngestJob]:
+        try:
+            with open(self._state_path(job_id)) as f:
+                return IngestJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def submit(self, file_name: str, save_upload) -> IngestJob:
+        '''
+        Create a job for an upload and queue it.
+        save_upload(path) must write the uploaded file to path.
+        '''
+        job_id = uuid.uuid4().hex
+        file_path = os.path.join(self.jobs_dir, f"{job_id}.csv")
+        save_upload(file_path)
+        # rows are counted by the job itself, a multi-GB upload would hold up the response
+        job = IngestJob(job_id=job_id, file_name=file_name, file_path=file_path)
+        self._save(job)
+        self._executor.submit(self._run, job.job_id)
+        logging.info(f"Queued ingestion job {job_id} for {file_name}")
+        return job
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._running.get(job_id)
+            if job is not None:
+                return job.to_status()
+        job = self._load(job_id)
+        return job.to_status() if job else None
+
+    def resume_incomplete(self):
+        '''Queue every job left queued or running by a previous process'''
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            job = self._load(name[:-len(".json")])
+            if job and job.status in (JOB_QUEUED, JOB_RUNNING):
+                logging.info(f"Resuming ingestion job {job.job_id} after row {job.last_committed_row}")
+                self._executor.submit(self._run, job.job_id)
+
+    def _run(self, job_id: str):
+        lock_file = open(os.path.join(self.jobs_dir, f"{job_id}.lock"), 'w')
+        try:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logging.info(f"Ingestion job {job_id} is being run by another process")
+                return
+            job = self._load(job_id)
+            if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                return
+            self._execute(job)
+        finally:
+            lock_file.close()
+
+    def _execute(self, job: IngestJob):
+        if job.status == JOB_RUNNING:
+            job.resumed_count += 1
+        job.status = JOB_RUNNING
+        job.started_at = job.started_at or time.time()
+        run_started = time.monotonic()
+        start_row = job.last_committed_row + 1
+        last_saved = 0.0
+        with self._lock:
+            self._running[job.job_id] = job
+        self._save(job)
+
+        def update_live(processed: int, skipped: int, total: int):
+            # counters of this run are on top of what the checkpoint already covers
+            job.processed_count = job.checkpoint_processed_count + processed
+            job.skipped_count = job.checkpoint_skipped_count + skipped
+            job.total_count = start_row + total
+            elapsed = time.monotonic() - run_started
+            done_this_run = processed + skipped
+            job.rows_per_second = round(done_this_run / elapsed, 2) if elapsed else 0.0
+            remaining = max(0, job.estimated_rows - (start_row + done_this_run))
+            job.eta_seconds = round(remaining / job.rows_per_second, 1) if job.rows_per_second else None
+
+        def on_progress(snapshot: Dict):
+            update_live(snapshot["processed_count"], snapshot["skipped_count"], snapshot["total_count"])
+
+        def on_checkpoint(checkpoint: Dict):
+            nonlocal last_saved
+            job.last_committed_row = checkpoint["last_committed_row"]
+            job.checkpoint_processed_count = base_processed + checkpoint["processed_count"]
+            job.checkpoint_skipped_count = base_skipped + checkpoint["skipped_count"]
+            if time.monotonic() - last_saved >= self.save_interval:
+                self._save(job)
+                last_saved = time.monotonic()
+
+        base_processed = job.checkpoint_processed_count
+        base_skipped = job.checkpoint_skipped_count
+        try:
+            if not job.estimated_rows:
+                job.estimated_rows = _count_lines(job.file_path)
+                logging.info(f"Ingestion job {job.job_id}: ~{job.estimated_rows} rows")
+            pipeline = IngestPipeline(
+                get_rag_system(),
+                IngestConfig.from_env(get_env_vars()),
+                progress_callback=on_progress,
+                checkpoint_callback=on_checkpoint,
+            )
+            encoding = sniff_encoding(job.file_path)
+            result = pipeline.run(iter_csv_chunks(job.file_path, encoding), start_row=start_row)
+            job.checkpoint_processed_count = base_processed
+            job.checkpoint_skipped_count = base_skipped
+            update_live(result["processed_count"], result["skipped_count"], result["total_count"])
+            job.status = JOB_COMPLETED
+            job.message = "Data ingested successfully"
+            job.eta_seconds = 0.0
+            os.remove(job.file_path)
+        except Exception as e:
+            # also a file that cannot be read to the end: the upload is kept, with the
+            # checkpoint of the rows stored before the error
+            logging.error(f"Ingestion job {job.job_id} failed after row {job.last_committed_row}: {e}")
+            job.status = JOB_FAILED
+            job.message = f"Error processing file: {str(e)}"
+        finally:
+            job.finished_at = time.time() if job.status != JOB_RUNNING else None
+            self._save(job)
+            with self._lock:
+                self._running.pop(job.job_id, None)
+            logging.info(f"Ingestion job {job.job_id} {job.status}: {job.processed_count} processed, {job.skipped_count} skipped, {job.total_count} total")
+
+
+_manager: Optional[IngestJobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> IngestJobManager:
+    '''Process-wide job manager; resumes interrupted jobs the first time it is created'''
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            env_vars = get_env_vars()
+            _manager = IngestJobManager(
+                jobs_dir=env_vars.get("INGEST_JOBS_DIR", INGEST_JOBS_DIR),
+                max_workers=int(env_vars.get("INGEST_JOB_WORKERS", INGEST_JOB_WORKERS)),
+            )
+            _manager.resume_incomplete()
+        return _manager
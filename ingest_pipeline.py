@@ -0,0 +1,410 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import psycopg2
+from bug_rag_system import BugRagSystem, BugData, PartialWriteError
+from constants import (
+    INGEST_BATCH_SIZE,
+    INGEST_EMBED_WORKERS,
+    INGEST_QUEUE_SIZE,
+    INGEST_WRITE_BATCH_SIZE,
+    INGEST_REPORT_INTERVAL,
+    DEDUPE_CHUNK_SIZE,
+)
+
+'''
+Staged ingestion pipeline
+
+parse -> dedupe -> embed (worker pool) -> write
+
+Each stage runs in its own thread(s) and hands batches of rows to the next stage
+through a bounded queue, so parsing, duplicate lookups, embedding requests and
+database writes overlap instead of running one row at a time. A full queue blocks
+the stage feeding it, which keeps memory bounded when one stage is slower.
+'''
+
+_END = object() # end-of-stream marker passed down the queues
+
+
+def bug_from_row(row, incident_number: str) -> BugData:
+    #build BugData from a csv row
+    return BugData(
+        incident_number = incident_number,
+        product = str(row["u_product_name_display_value"]) if pd.notna(row['u_product_name_display_value']) else "",
+        description = str(row["description"]) if pd.notna(row['description']) else "",
+        closing_notes = str(row["close_notes"]) if pd.notna(row['close_notes']) else None,
+        resolution_tier_1 = str(row["u_resolution_tier_1"]) if pd.notna(row['u_resolution_tier_1']) else None,
+        resolution_tier_2 = str(row["u_resolution_tier_2"]) if pd.notna(row['u_resolution_tier_2']) else None,
+        resolution_tier_3 = str(row["u_resolution_tier3"]) if pd.notna(row['u_resolution_tier3']) else None,
+        problem_id = "",
+        # sys_created_on=created_date,
+        sys_created_on = pd.to_datetime(row["sys_created_on"], format='%m/%d/%Y').date() if pd.notna(row['sys_created_on']) else None,
+        sys_created_by = str(row["sys_created_by"]).strip() if pd.notna(row['sys_created_by']) else None,
+        priority = int(row["priority"]) if pd.notna(row['priority']) else None
+    )
+
+
+@dataclass
+class IngestConfig:
+    batch_size: int = INGEST_BATCH_SIZE # rows per batch handed between stages
+    embed_workers: int = INGEST_EMBED_WORKERS # concurrent embedding requests
+    queue_size: int = INGEST_QUEUE_SIZE # batches buffered between two stages
+    write_batch_size: int = INGEST_WRITE_BATCH_SIZE # bugs per database transaction
+    report_interval: float = INGEST_REPORT_INTERVAL # seconds between progress logs
+    dedupe_chunk_size: int = DEDUPE_CHUNK_SIZE # rows checked for duplicates per lookup
+
+    @classmethod
+    def from_env(cls, env_vars: Dict[str, str]) -> "IngestConfig":
+        return cls(
+            batch_size=int(env_vars.get("INGEST_BATCH_SIZE", INGEST_BATCH_SIZE)),
+            embed_workers=int(env_vars.get("INGEST_EMBED_WORKERS", INGEST_EMBED_WORKERS)),
+            queue_size=int(env_vars.get("INGEST_QUEUE_SIZE", INGEST_QUEUE_SIZE)),
+            write_batch_size=int(env_vars.get("INGEST_WRITE_BATCH_SIZE", INGEST_WRITE_BATCH_SIZE)),
+            report_interval=float(env_vars.get("INGEST_REPORT_INTERVAL", INGEST_REPORT_INTERVAL)),
+            dedupe_chunk_size=int(env_vars.get("DEDUPE_CHUNK_SIZE", DEDUPE_CHUNK_SIZE)),
+        )
+
+
+class RowCheckpoint:
+    '''
+    Tracks the last committed row: the highest row number such that it and every
+    row before it has been either stored or skipped. Batches can finish out of
+    order (parallel embed workers), so rows are held in pending until the gap
+    before them closes. processed_count/skipped_count only cover rows up to the
+    checkpoint, so they can be persisted together with it.
+    '''
+
+    def __init__(self, start_row: int = 0, processed_count: int = 0, skipped_count: int = 0):
+        self.next_row = start_row
+        self.processed_count = processed_count
+        self.skipped_count = skipped_count
+        self._pending: Dict[int, bool] = {} # row number -> stored?
+
+    @property
+    def last_committed_row(self) -> int:
+        return self.next_row - 1
+
+    def mark(self, rows: Iterable[int], stored: bool):
+        for row in rows:
+            self._pending[row] = stored
+        while self.next_row in self._pending:
+            if self._pending.pop(self.next_row):
+                self.processed_count += 1
+            else:
+                self.skipped_count += 1
+            self.next_row += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "last_committed_row": self.last_committed_row,
+            "processed_count": self.processed_count,
+            "skipped_count": self.skipped_count,
+        }
+
+
+@dataclass
+class IngestStats:
+    processed_count: int = 0
+    skipped_count: int = 0
+    total_count: int = 0
+    elapsed_seconds: float = 0.0
+    max_queue_depths: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total_count / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "processed_count": self.processed_count,
+            "skipped_count": self.skipped_count,
+            "total_count": self.total_count,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 2),
+            "max_queue_depths": dict(self.max_queue_depths),
+        }
+
+
+class IngestPipeline:
+
+    def __init__(self, rag_system: BugRagSystem, config: IngestConfig = None,
+                 progress_callback: Optional[Callable[[Dict], None]] = None,
+                 checkpoint_callback: Optional[Callable[[Dict], None]] = None):
+        self.rag_system = rag_system
+        self.config = config or IngestConfig()
+        self.progress_callback = progress_callback # called with a stats snapshot after each input chunk
+        self.checkpoint_callback = checkpoint_callback # called with RowCheckpoint.to_dict() after each write
+        self.stats = IngestStats()
+        self.checkpoint = RowCheckpoint()
+        self._lock = threading.Lock()
+        self.queues = {
+            "parsed": queue.Queue(maxsize=self.config.queue_size),
+            "deduped": queue.Queue(maxsize=self.config.queue_size),
+            "embedded": queue.Queue(maxsize=self.config.queue_size),
+        }
+        self._done = threading.Event()
+        self._error: Optional[Exception] = None # what stopped the pipeline early (input or database), re-raised by run
+
+    def run(self, frames: Iterable[pd.DataFrame], start_row: int = 0) -> Dict:
+        '''
+        Ingest rows from one or more DataFrames. skips records where incident number already exists.
+        Rows are numbered from 0 across all frames; rows before start_row (already
+        committed by an earlier, interrupted run) are not processed or counted.
+        Returns :
+            dict: summary of Ingestion results
+        Raises the error that stopped reading the input (e.g. a malformed or
+        undecodable chunk) once the rows read before it are stored, so a
+        truncated ingest is not reported as complete. A database error other
+        than bad row data (connection lost, pool closed) stops the pipeline too:
+        the rows not yet stored stay ahead of the checkpoint, so a resumed run
+        writes them.
+        '''
+        self.stats = IngestStats(max_queue_depths={name: 0 for name in self.queues})
+        self.checkpoint = RowCheckpoint(start_row)
+        self._done.clear()
+        self._error = None
+        started = time.monotonic()
+
+        workers = max(1, self.config.embed_workers)
+        threads = [
+            threading.Thread(target=self._parse_stage, args=(frames, start_row), name="ingest-parse"),
+            threading.Thread(target=self._dedupe_stage, args=(workers,), name="ingest-dedupe"),
+            threading.Thread(target=self._write_stage, args=(workers,), name="ingest-write"),
+        ]
+        threads += [
+            threading.Thread(target=self._embed_stage, name=f"ingest-embed-{i}")
+            for i in range(workers)
+        ]
+        reporter = threading.Thread(target=self._report_progress, args=(started,), name="ingest-report", daemon=True)
+
+        for thread in threads:
+            thread.start()
+        reporter.start()
+        for thread in threads:
+            thread.join()
+        self._done.set()
+        reporter.join()
+
+        self.stats.elapsed_seconds = time.monotonic() - started
+        self._report_checkpoint()
+        if self._error is not None:
+            logging.error(f"Ingest stopped after {self.stats.total_count} rows: {self._error}")
+            raise self._error
+        result = self.stats.to_dict()
+        logging.info(f"Processed {self.stats.processed_count} rows out of {self.stats.total_count}")
+        logging.info(f"Skipped {self.stats.skipped_count} rows out of {self.stats.total_count}")
+        logging.info(f"Ingest throughput: {result['rows_per_second']} rows/sec, max queue depths: {result['max_queue_depths']}")
+        return result
+
+    def _fail(self, error: Exception):
+        #stop the pipeline; the first error is the one run() raises
+        with self._lock:
+            if self._error is None:
+                self._error = error
+
+    def _skip(self, rows: List[int]):
+        with self._lock:
+            self.stats.skipped_count += len(rows)
+            self.checkpoint.mark(rows, stored=False)
+
+    def _stored(self, rows: List[int]):
+        with self._lock:
+            self.stats.processed_count += len(rows)
+            self.checkpoint.mark(rows, stored=True)
+
+    # //parse csv rows into BugData
+    def _parse_stage(self, frames: Iterable[pd.DataFrame], start_row: int):
+        out = self.queues["parsed"]
+        batch: List[Tuple[int, BugData]] = [] # (row number, BugData)
+        index = -1
+        try:
+            for chunk_number, df in enumerate(frames, start=1):
+                if self._error is not None:
+                    break
+                for _, row in df.iterrows():
+                    index += 1
+                    if index < start_row:
+                        continue
+                    with self._lock:
+                        self.stats.total_count += 1
+                    incident_number = str(row["issue_key"]) if pd.notna(row['issue_key']) else None
+                    if not incident_number:
+                        logging.warning(f"Missing incident_number in row {index}")
+                        self._skip([index])
+                        continue
+                    try:
+                        batch.append((index, bug_from_row(row, incident_number)))
+                    except Exception as e:
+                        logging.error(f"Row {index}:Error processing incident {incident_number}:{str(e)}")
+                        self._skip([index])
+                        continue
+                    if len(batch) >= self.config.batch_size:
+                        out.put(batch)
+                        batch = []
+                if index >= start_row:
+                    self._report_chunk(chunk_number, len(df))
+        except Exception as e:
+            #the rows read before the error are still stored; run() raises it afterwards
+            logging.error(f"Error in parse stage: {e}")
+            self._fail(e)
+        finally:
+            if batch:
+                out.put(batch)
+            out.put(_END)
+
+    def _dedupe_stage(self, embed_workers: int):
+        source = self.queues["parsed"]
+        seen = set() # incident numbers already accepted from this upload
+        pending: List[Tuple[int, BugData]] = []
+        while True:
+            batch = source.get()
+            if batch is _END:
+                break
+            # parsed batches are collected into one lookup per dedupe_chunk_size rows
+            pending.extend(batch)
+            if len(pending) >= self.config.dedupe_chunk_size:
+                self._dedupe(pending, seen)
+                pending = []
+        self._dedupe(pending, seen)
+        for _ in range(embed_workers):
+            self.queues["deduped"].put(_END)
+
+    def _dedupe(self, rows: List[Tuple[int, BugData]], seen: set):
+        #drop rows whose incident number is stored or repeated, pass the rest on in batch_size batches
+        if not rows or self._error is not None:
+            return
+        try:
+            existing = self.rag_system.find_existing_incident_numbers(
+                [bug.incident_number for _, bug in rows]
+            )
+        except Exception as e:
+            # not a problem of these rows: stop, so a resume checks them again
+            logging.error(f"Rows {rows[0][0]}-{rows[-1][0]}:Error checking {len(rows)} incidents for duplicates:{str(e)}")
+            self._fail(e)
+            return
+        kept = []
+        for index, bug in rows:
+            if bug.incident_number in existing:
+                logging.warning(f"Duplicate incident number {bug.incident_number} in row {index}")
+                self._skip([index])
+                continue
+            if bug.incident_number in seen:
+                logging.warning(f"Duplicate incident number {bug.incident_number} in row {index} (repeated in uploaded file)")
+                self._skip([index])
+                continue
+            seen.add(bug.incident_number)
+            kept.append((index, bug))
+        for start in range(0, len(kept), self.config.batch_size):
+            self.queues["deduped"].put(kept[start:start + self.config.batch_size])
+
+    def _embed_stage(self):
+        source, out = self.queues["deduped"], self.queues["embedded"]
+        while True:
+            batch = source.get()
+            if batch is _END:
+                break
+            if self._error is not None:
+                continue
+            try:
+                embeddings = self.rag_system.embed_bugs([bug for _, bug in batch])
+                out.put((batch, embeddings))
+            except Exception as e:
+                logging.error(f"Rows {batch[0][0]}-{batch[-1][0]}:Error embedding batch of {len(batch)} incidents:{str(e)}")
+                self._skip([index for index, _ in batch])
+        out.put(_END)
+
+    def _write_stage(self, embed_workers: int):
+        source = self.queues["embedded"]
+        pending_rows: List[Tuple[int, BugData]] = []
+        pending_embeddings = []
+        finished_workers = 0
+        while finished_workers < embed_workers:
+            item = source.get()
+            if item is _END:
+                finished_workers += 1
+                continue
+            self._sample_queue_depths()
+            batch, embeddings = item
+            pending_rows.extend(batch)
+            pending_embeddings.extend(embeddings)
+            if len(pending_rows) >= self.config.write_batch_size:
+                self._write(pending_rows, pending_embeddings)
+                pending_rows, pending_embeddings = [], []
+        self._write(pending_rows, pending_embeddings)
+
+    def _write(self, rows: List[Tuple[int, BugData]], embeddings: List):
+        if not rows or self._error is not None:
+            return
+        try:
+            bug_ids = self.rag_system.write_bugs([bug for _, bug in rows], embeddings)
+        except PartialWriteError as e:
+            # the chunks committed before the error are stored
+            logging.error(f"Error storing batch of {len(rows)} incidents after {len(e.bug_ids)} were committed:{str(e.error)}")
+            bug_ids = e.bug_ids
+            if isinstance(e.error, (psycopg2.DataError, psycopg2.IntegrityError)):
+                # bad row data: skip the rest of the batch and go on
+                self._skip([index for index, _ in rows[len(bug_ids):]])
+            else:
+                # connection, pool or server trouble would fail every later batch the same way;
+                # stop with the rest of the batch unmarked, so the checkpoint stays before it
+                self._fail(e.error)
+        for (index, bug), bug_id in zip(rows, bug_ids):
+            logging.info(f"Stored incident number {bug.incident_number} in row {index} stored with ID:{bug_id}")
+        self._stored([index for index, _ in rows[:len(bug_ids)]])
+        self._report_checkpoint()
+
+    def _report_checkpoint(self):
+        if self.checkpoint_callback is None:
+            return
+        with self._lock:
+            checkpoint = self.checkpoint.to_dict()
+        try:
+            self.checkpoint_callback(checkpoint)
+        except Exception as e:
+            logging.error(f"Error in ingest checkpoint callback: {e}")
+
+    def _report_chunk(self, chunk_number: int, chunk_rows: int):
+        snapshot = self.snapshot()
+        logging.info(
+            f"Chunk {chunk_number}: parsed {chunk_rows} rows, {snapshot['total_count']} rows read, "
+            f"{snapshot['processed_count']} stored, {snapshot['skipped_count']} skipped so far"
+        )
+        if self.progress_callback is not None:
+            try:
+                self.progress_callback(snapshot)
+            except Exception as e:
+                logging.error(f"Error in ingest progress callback: {e}")
+        self._report_checkpoint()
+
+    def snapshot(self) -> Dict:
+        '''Current counters, safe to call while the pipeline is running'''
+        with self._lock:
+            return {
+                "processed_count": self.stats.processed_count,
+                "skipped_count": self.stats.skipped_count,
+                "total_count": self.stats.total_count,
+            }
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def _sample_queue_depths(self) -> Dict[str, int]:
+        depths = self.queue_depths()
+        with self._lock:
+            for name, depth in depths.items():
+                self.stats.max_queue_depths[name] = max(self.stats.max_queue_depths.get(name, 0), depth)
+        return depths
+
+    def _report_progress(self, started: float):
+        while not self._done.wait(self.config.report_interval):
+            depths = self._sample_queue_depths()
+            with self._lock:
+                done = self.stats.processed_count + self.stats.skipped_count
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0.0
+            logging.info(f"Ingest progress: {done} rows done, {rate:.1f} rows/sec, queue depths: {depths}")
@@ -0,0 +1,102 @@
+import re
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+'''
+Deterministic intent parser for tool calls
+
+Resolves the common ways of asking for a time window ("last 2 weeks", "past
+month", "3 days", "yesterday", "this month", "since monday", "48 hours") to a
+number of days without a model round trip. parse_days returns None when the text
+has no window, several conflicting ones or a fractional number ("1.5 weeks");
+the caller then falls back to the tool-calling LLM.
+'''
+
+INCIDENTS_BY_DAYS_TOOL = "number_of_incidents_created_in_days"
+
+UNIT_DAYS = {"day": 1, "week": 7, "fortnight": 14, "month": 30, "year": 365}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "couple of": 2,
+}
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# whole numbers only: not the digits of "1.5"
+_NUMBER = r"(?<![\d.])(\d+(?!\.\d)|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+_UNIT = r"(day|week|fortnight|month|year)s?"
+
+# "2 weeks", "two-weeks", "a month", "couple of days"
+_COUNT_PATTERN = re.compile(rf"\b{_NUMBER}[\s-]*{_UNIT}\b")
+# "48 hours"
+_HOURS_PATTERN = re.compile(r"(?<![\d.])\b(\d+)(?!\.\d)\s*(?:hours?|hrs?)\b")
+# "last week", "past month", "previous year"
+_LAST_UNIT_PATTERN = re.compile(rf"\b(?:last|past|previous)\s+{_UNIT}\b")
+# "this week", "this month", "this year"
+_THIS_UNIT_PATTERN = re.compile(r"\bthis\s+(week|month|year)\b")
+# "since monday", "since last friday"
+_SINCE_WEEKDAY_PATTERN = re.compile(rf"\bsince\s+(?:last\s+)?({'|'.join(WEEKDAYS)})\b")
+# "1.5 weeks", "2,5 days": left to the LLM rather than read as a whole number
+_DECIMAL_PATTERN = re.compile(r"\d[.,]\d")
+_DETAILS_PATTERN = re.compile(r"\b(details?|detailed|full records?|descriptions?|closing notes)\b")
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+
+def _this_unit_days(unit: str, today: date) -> int:
+    # calendar periods, counting today
+    if unit == "week":
+        return today.weekday() + 1
+    if unit == "month":
+        return today.day
+    return today.timetuple().tm_yday
+
+
+def _since_weekday_days(weekday: str, today: date) -> int:
+    # from the most recent such day (today if it is one), counting today, like "this week"
+    return (today.weekday() - WEEKDAYS.index(weekday)) % 7 + 1
+
+
+def parse_days(text: str, today: Optional[date] = None) -> Optional[int]:
+    '''Number of days of the time window in text, or None when there is none or it is ambiguous'''
+    if not text:
+        return None
+    text = re.sub(r"\s+", " ", text.lower())
+    if _DECIMAL_PATTERN.search(text):
+        return None
+    today = today or date.today()
+    windows = set()
+    for number, unit in _COUNT_PATTERN.findall(text):
+        windows.add(_number(number) * UNIT_DAYS[unit])
+    # one unit; "last 2 weeks" is matched by the count pattern, not this one
+    for unit in _LAST_UNIT_PATTERN.findall(text):
+        windows.add(UNIT_DAYS[unit])
+    for hours in _HOURS_PATTERN.findall(text):
+        windows.add(max(1, -(-int(hours) // 24)))
+    for unit in _THIS_UNIT_PATTERN.findall(text):
+        windows.add(_this_unit_days(unit, today))
+    for weekday in _SINCE_WEEKDAY_PATTERN.findall(text):
+        windows.add(_since_weekday_days(weekday, today))
+    if re.search(r"\btoday\b", text):
+        windows.add(1)
+    if re.search(r"\byesterday\b", text):
+        # the rolling window has to reach back to the start of yesterday
+        windows.add(2)
+    if len(windows) != 1:
+        return None
+    return windows.pop()
+
+
+def parse_tool_call(text: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    '''(tool name, arguments) when text can be answered without the LLM, else None'''
+    days = parse_days(text)
+    if days is None:
+        return None
+    return INCIDENTS_BY_DAYS_TOOL, {
+        "days": days,
+        "include_details": bool(_DETAILS_PATTERN.search(text.lower())),
+    }
@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Union
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from config import get_env_vars
+from constants import LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_MAX_RETRIES, LLM_POOL_SIZE
+
+'''
+Shared OpenAI-compatible client for the Ollama endpoint
+
+One client per (process, base url) keeps HTTP connections alive between calls
+instead of building a new OpenAI(...) client and connection for each request.
+Timeouts, retries and pool size come from .env:
+    LLM_CONNECT_TIMEOUT / LLM_READ_TIMEOUT  seconds
+    LLM_MAX_RETRIES  retries on connection errors, 408/409/429 and 5xx, with
+                     exponential backoff (handled by the openai client)
+    LLM_POOL_SIZE    max open/keep-alive connections, size it to worker concurrency
+
+The asyncio app (api_async.py) builds its own AsyncOpenAI client with the same
+settings through create_async_client, since an async client is bound to the
+event loop it runs on.
+'''
+
+_lock = threading.Lock()
+_clients: Dict[tuple, OpenAI] = {}
+_call_stats: Dict[str, Dict[str, float]] = {}
+
+
+def get_openai_client(llm_api_url: str) -> OpenAI:
+    '''Return the process-wide client for llm_api_url, creating it on first use'''
+    key = (os.getpid(), llm_api_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            timeout, limits, max_retries = _client_settings(get_env_vars())
+            client = OpenAI(
+                base_url=f'{llm_api_url}/v1',
+                api_key='ollama',
+                timeout=timeout,
+                max_retries=max_retries,
+                http_client=httpx.Client(timeout=timeout, limits=limits),
+            )
+            _clients[key] = client
+            logging.info(f"Created shared LLM client for {llm_api_url} (pool size {limits.max_connections})")
+        return client
+
+
+def _client_settings(env_vars: dict):
+    # (timeout, pool limits, max retries) from .env
+    pool_size = int(env_vars.get("LLM_POOL_SIZE", LLM_POOL_SIZE))
+    timeout = httpx.Timeout(
+        float(env_vars.get("LLM_READ_TIMEOUT", LLM_READ_TIMEOUT)),
+        connect=float(env_vars.get("LLM_CONNECT_TIMEOUT", LLM_CONNECT_TIMEOUT)),
+    )
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return timeout, limits, int(env_vars.get("LLM_MAX_RETRIES", LLM_MAX_RETRIES))
+
+
+def create_async_client(llm_api_url: str) -> AsyncOpenAI:
+    '''AsyncOpenAI client for llm_api_url; the caller owns it and closes it with its event loop'''
+    timeout, limits, max_retries = _client_settings(get_env_vars())
+    return AsyncOpenAI(
+        base_url=f'{llm_api_url}/v1',
+        api_key='ollama',
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=httpx.AsyncClient(timeout=timeout, limits=limits),
+    )
+
+
+def _record_call(name: str, started: float, error: Exception = None):
+    elapsed_ms = (time.monotonic() - started) * 1000
+    with _lock:
+        stats = _call_stats.setdefault(name, {"calls": 0, "errors": 0, "total_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        if error is not None:
+            stats["errors"] += 1
+        errors = stats["errors"]
+    if error is not None:
+        logging.error(f"{name} failed after {elapsed_ms:.1f} ms ({errors} errors so far): {error}")
+    else:
+        logging.info(f"{name} took {elapsed_ms:.1f} ms")
+
+
+def create_embeddings(llm_api_url: str, model: str, input: Union[str, List[str]]):
+    '''embeddings.create on the shared client, with latency and error logging'''
+    started = time.monotonic()
+    try:
+        response = get_openai_client(llm_api_url).embeddings.create(model=model, input=input)
+    except Exception as e:
+        _record_call(f"embeddings[{model}]", started, e)
+        raise
+    _record_call(f"embeddings[{model}]", started)
+    return response
+
+
+def create_chat_completion(llm_api_url: str, **kwargs):
+    '''chat.completions.create on the shared client, with latency and error logging'''
+    name = f"chat[{kwargs.get('model')}]"
+    started = time.monotonic()
+    try:
+        response = get_openai_client(llm_api_url).chat.completions.create(**kwargs)
+    except Exception as e:
+        _record_call(name, started, e)
+        raise
+    _record_call(name, started)
+    return response
+
+
+async def acreate_embeddings(client: AsyncOpenAI, model: str, input: Union[str, List[str]]):
+    '''embeddings.create on an async client, with latency and error logging'''
+    started = time.monotonic()
+    try:
+        response = await client.embeddings.create(model=model, input=input)
+    except Exception as e:
+        _record_call(f"embeddings[{model}]", started, e)
+        raise
+    _record_call(f"embeddings[{model}]", started)
+    return response
+
+
+async def acreate_chat_completion(client: AsyncOpenAI, **kwargs):
+    '''chat.completions.create on an async client, with latency and error logging'''
+    name = f"chat[{kwargs.get('model')}]"
+    started = time.monotonic()
+    try:
+        response = await client.chat.completions.create(**kwargs)
+    except Exception as e:
+        _record_call(name, started, e)
+        raise
+    _record_call(name, started)
+    return response
+
+
+def get_call_stats() -> Dict[str, Dict[str, float]]:
+    '''Per-call-type counts, error counts and mean latency'''
+    with _lock:
+        return {
+            name: {**stats, "mean_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0}
+            for name, stats in _call_stats.items()
+        }
@@ -0,0 +1,368 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from constants import EMBEDDING_DIMENSION, LOCAL_INDEX_LOAD_BATCH_SIZE, LOCAL_INDEX_RESCAN_WINDOW
+
+'''
+In-process vector search over bug_embeddings
+
+All embeddings are held in one contiguous float32 matrix with L2-normalised rows,
+so cosine similarity for every row is a single matrix-vector product. Filters
+use boolean masks precomputed per content_type and per product, and top-k uses
+argpartition instead of a full sort. Results have the same keys as rows of the
+search_similar_bugs SQL function.
+
+With group_by_bug, rows are aggregated per bug_id like the
+search_similar_bugs_grouped SQL function: the max similarity over the bug's
+content types, or their weighted sum divided by the total weight of the content
+types searched ("weighted"), reported with the best-matching content type.
+'''
+
+RESULT_COLUMNS = [
+    "bug_id", "incident_number", "product", "description", "closing_notes",
+    "content_type", "similarity_score",
+]
+
+
+def parse_vector(text: str) -> np.ndarray:
+    #pgvector text representation, e.g. [0.1,0.2]
+    return np.array(text.strip("[]").split(","), dtype=np.float32)
+
+
+def normalize_query(query_embedding) -> np.ndarray:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    return query / (np.linalg.norm(query) or 1.0)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, initial_capacity: int = 1024, embedding_model: str = ""):
+        self.dimension = dimension
+        self.initial_capacity = initial_capacity
+        self.embedding_model = embedding_model # model of the stored vectors, saved with the index
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock() # one (incremental) load at a time
+        self._reset()
+
+    def _reset(self):
+        capacity = self.initial_capacity
+        self._capacity = capacity
+        self._allocate_vectors(capacity)
+        self._size = 0
+        self._bug_ids = np.zeros(capacity, dtype=np.int64)
+        self._embedding_ids = np.zeros(capacity, dtype=np.int64) # bug_embeddings.id of each row
+        self._content_type_masks: Dict[str, np.ndarray] = {}
+        self._product_masks: Dict[str, np.ndarray] = {}
+        self._bugs: Dict[int, Dict] = {} # bug_id -> bug columns returned with results
+        self._content_types: List[str] = [] # content type of each row
+        self._products: List[str] = [] # product of each row
+        self.max_embedding_id = 0 # highest bug_embeddings.id loaded, for incremental refresh
+        self.removal_generation = 0 # embedding_removal_seq when the rows were loaded from scratch
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def _allocate_vectors(self, capacity: int):
+        # vector storage; overridden by indexes that store vectors differently
+        self._matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+
+    def _grow_vectors(self, capacity: int):
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def _store_vectors(self, start: int, vectors: np.ndarray):
+        # vectors are normalised rows for positions [start, start + len(vectors))
+        self._matrix[start:start + len(vectors)] = vectors
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        capacity = self._capacity
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._grow_vectors(capacity)
+        bug_ids = np.zeros(capacity, dtype=np.int64)
+        bug_ids[:self._size] = self._bug_ids[:self._size]
+        self._bug_ids = bug_ids
+        embedding_ids = np.zeros(capacity, dtype=np.int64)
+        embedding_ids[:self._size] = self._embedding_ids[:self._size]
+        self._embedding_ids = embedding_ids
+        self._capacity = capacity
+        for masks in (self._content_type_masks, self._product_masks):
+            for key, mask in masks.items():
+                grown = np.zeros(capacity, dtype=bool)
+                grown[:self._size] = mask[:self._size]
+                masks[key] = grown
+
+    def _mask_for(self, masks: Dict[str, np.ndarray], key: str) -> np.ndarray:
+        mask = masks.get(key)
+        if mask is None:
+            mask = masks[key] = np.zeros(self._capacity, dtype=bool)
+        return mask
+
+    def add(self, rows: List[Dict]):
+        '''
+        Add bug_embeddings rows. Each row has embedding_id, bug_id, content_type,
+        embedding (list/array or pgvector text) plus the bug columns in RESULT_COLUMNS.
+        '''
+        if not rows:
+            return
+        vectors = np.vstack([
+            parse_vector(row["embedding"]) if isinstance(row["embedding"], str) else np.asarray(row["embedding"], dtype=np.float32)
+            for row in rows
+        ])
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            self._ensure_capacity(len(rows))
+            start = self._size
+            self._store_vectors(start, vectors)
+            for offset, row in enumerate(rows):
+                position = start + offset
+                bug_id = row["bug_id"]
+                self._bug_ids[position] = bug_id
+                self._embedding_ids[position] = row.get("embedding_id") or 0
+                self._content_types.append(row["content_type"])
+                self._products.append(row.get("product") or "")
+                self._mask_for(self._content_type_masks, row["content_type"])[position] = True
+                self._mask_for(self._product_masks, row.get("product") or "")[position] = True
+                if bug_id not in self._bugs:
+                    self._bugs[bug_id] = {
+                        column: row.get(column)
+                        for column in RESULT_COLUMNS if column not in ("content_type", "similarity_score")
+                    }
+                self.max_embedding_id = max(self.max_embedding_id, row.get("embedding_id") or 0)
+            self._size += len(rows)
+
+    def load(self, rag_system, full: bool = False) -> int:
+        '''
+        Load bug_embeddings rows newer than max_embedding_id (all rows when full). Returns rows added.
+
+        Ids are assigned before commit, so a row can commit after higher ids were
+        loaded; the LOCAL_INDEX_RESCAN_WINDOW ids below max_embedding_id are checked
+        again and rows missing from the index are loaded too.
+        '''
+        with self._load_lock:
+            with self._lock:
+                if full:
+                    self._reset()
+                after_id = self.max_embedding_id
+            if after_id == 0:
+                # read before the rows, so a removal during the load triggers another rebuild
+                self.removal_generation = rag_system.get_embedding_removals() or 0
+            return self._load_after(rag_system, after_id)
+
+    def _missing_ids(self, cursor, after_id: int) -> List[int]:
+        # ids in the rescan window below after_id that are stored but not in the index
+        window_start = max(0, after_id - LOCAL_INDEX_RESCAN_WINDOW)
+        cursor.execute("select id from bug_embeddings where id > %s and id <= %s", (window_start, after_id))
+        stored = {row[0] for row in cursor.fetchall()}
+        if not stored:
+            return []
+        with self._lock:
+            embedding_ids = self._embedding_ids[:self._size]
+            loaded = set(embedding_ids[embedding_ids > window_start].tolist())
+        return sorted(stored - loaded)
+
+    def _load_after(self, rag_system, after_id: int) -> int:
+        added = 0
+        started = time.monotonic()
+        with rag_system.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                missing = self._missing_ids(cursor, after_id) if after_id else []
+                if missing:
+                    logging.info(f"Local vector index loading {len(missing)} embeddings committed out of id order")
+                cursor.execute("""
+                    select be.id, be.bug_id, be.content_type, be.embedding::text,
+                           b.incident_number, b.product, b.description, b.closing_notes
+                    from bug_embeddings be
+                    join bugs b on b.id = be.bug_id
+                    where be.id > %s or be.id = any(%s)
+                    order by be.id
+                """, (after_id, missing))
+                columns = ["embedding_id", "bug_id", "content_type", "embedding",
+                           "incident_number", "product", "description", "closing_notes"]
+                while True:
+                    rows = cursor.fetchmany(LOCAL_INDEX_LOAD_BATCH_SIZE)
+                    if not rows:
+                        break
+                    self.add([dict(zip(columns, row)) for row in rows])
+                    added += len(rows)
+        self.loaded_at = time.monotonic()
+        logging.info(f"Local vector index loaded {added} embeddings in {(self.loaded_at - started) * 1000:.1f} ms, {self._size} total")
+        return added
+
+    def _filter_mask(self, content_type: Optional[str], product_filter: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+        if content_type:
+            mask = self._content_type_masks.get(content_type, np.zeros(self._capacity, dtype=bool))
+        if product_filter:
+            product_mask = self._product_masks.get(product_filter, np.zeros(self._capacity, dtype=bool))
+            mask = product_mask if mask is None else mask & product_mask
+        return None if mask is None else mask[:self._size]
+
+    def search(self, query_embedding, limit: int = 5, content_type: str = None, product_filter: str = None,
+               similarity_threshold: float = 0.8, group_by_bug: bool = False, aggregation: str = "max",
+               weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+        '''Top `limit` rows (distinct bugs with group_by_bug) by cosine similarity, filtered like search_similar_bugs'''
+        with self._lock:
+            if self._size == 0 or limit <= 0:
+                return []
+            scores = self._matrix[:self._size] @ normalize_query(query_embedding)
+            if group_by_bug:
+                return self._top_k_grouped(scores, limit, content_type, product_filter, similarity_threshold, aggregation, weights)
+            return self._top_k(scores, limit, content_type, product_filter, similarity_threshold)
+
+    def search_many(self, query_embeddings: List, searches: List[Dict]) -> List[List[Dict]]:
+        '''
+        Run several searches with one matrix multiply. searches[i] holds the
+        search() keyword arguments (limit, content_type, product_filter,
+        similarity_threshold) for query_embeddings[i].
+        '''
+        with self._lock:
+            if self._size == 0 or not searches:
+                return [[] for _ in searches]
+            queries = normalize_rows(np.vstack([np.asarray(q, dtype=np.float32) for q in query_embeddings]))
+            scores = self._matrix[:self._size] @ queries.T
+            results = []
+            for i, search in enumerate(searches):
+                column = np.ascontiguousarray(scores[:, i])
+                limit = search.get("limit", 5)
+                filters = (search.get("content_type"), search.get("product_filter"), search.get("similarity_threshold", 0.8))
+                if limit <= 0:
+                    results.append([])
+                elif search.get("group_by_bug"):
+                    results.append(self._top_k_grouped(column, limit, *filters, search.get("aggregation", "max"), search.get("weights")))
+                else:
+                    results.append(self._top_k(column, limit, *filters))
+            return results
+
+    def _top_k(self, scores: np.ndarray, limit: int, content_type: Optional[str], product_filter: Optional[str],
+               similarity_threshold: float, positions: Optional[np.ndarray] = None) -> List[Dict]:
+        # caller holds self._lock; scores has one entry per stored row, or per row in positions when given
+        mask = self._filter_mask(content_type, product_filter)
+        eligible = scores >= similarity_threshold
+        if mask is not None:
+            eligible &= mask if positions is None else mask[positions]
+        selected = np.flatnonzero(eligible)
+        if selected.size == 0:
+            return []
+        if selected.size > limit:
+            top = np.argpartition(scores[selected], -limit)[-limit:]
+            selected = selected[top]
+        selected = selected[np.argsort(-scores[selected])]
+        rows = selected if positions is None else positions[selected]
+        return [self._result(int(row), float(scores[i])) for row, i in zip(rows, selected)]
+
+    def _top_k_grouped(self, scores: np.ndarray, limit: int, content_type: Optional[str], product_filter: Optional[str],
+                       similarity_threshold: float, aggregation: str = "max", weights: Optional[Dict[str, float]] = None,
+                       positions: Optional[np.ndarray] = None) -> List[Dict]:
+        # caller holds self._lock; like _top_k but one result per bug_id
+        mask = self._filter_mask(content_type, product_filter)
+        eligible = scores >= similarity_threshold
+        if mask is not None:
+            eligible &= mask if positions is None else mask[positions]
+        selected = np.flatnonzero(eligible)
+        if selected.size == 0:
+            return []
+        rows = selected if positions is None else positions[selected]
+        # best row of each bug: order by score, keep the first occurrence of every bug_id
+        order = np.argsort(-scores[selected], kind="stable")
+        bug_ids = self._bug_ids[rows[order]]
+        unique_bugs, first, inverse = np.unique(bug_ids, return_index=True, return_inverse=True)
+        best = order[first] # index into selected of each bug's best row
+        if aggregation == "weighted":
+            weights = weights or {}
+            row_weights = np.zeros(self._capacity, dtype=np.float32)
+            for name, weight in weights.items():
+                if name in self._content_type_masks:
+                    row_weights[self._content_type_masks[name]] = weight
+            total = sum(weight for name, weight in weights.items() if not content_type or name == content_type)
+            weighted = scores[selected][order] * row_weights[rows[order]]
+            bug_scores = np.bincount(inverse.ravel(), weights=weighted, minlength=len(unique_bugs)) / (total or 1.0)
+        else:
+            bug_scores = scores[selected][best]
+        top = np.argsort(-bug_scores, kind="stable")[:limit]
+        return [self._result(int(rows[best[b]]), float(bug_scores[b])) for b in top]
+
+    def memory_usage(self) -> Dict[str, int]:
+        '''Bytes held in process memory and bytes memory-mapped from a shared file'''
+        with self._lock:
+            masks = sum(mask.nbytes for masks in (self._content_type_masks, self._product_masks) for mask in masks.values())
+            matrix = self._matrix.nbytes if hasattr(self, "_matrix") else 0
+            return {"rows": self._size, "resident_bytes": matrix + self._bug_ids.nbytes + masks, "mapped_bytes": 0}
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        # caller holds self._lock; arrays written by save()
+        bugs = {str(bug_id): bug for bug_id, bug in self._bugs.items()}
+        return {
+            "matrix": self._matrix[:self._size],
+            "bug_ids": self._bug_ids[:self._size],
+            "embedding_ids": self._embedding_ids[:self._size],
+            "content_types": np.array(self._content_types, dtype=str),
+            "products": np.array(self._products, dtype=str),
+            "bugs": np.array(json.dumps(bugs, default=str)),
+            "max_embedding_id": np.array(self.max_embedding_id),
+            "removal_generation": np.array(self.removal_generation),
+            "embedding_model": np.array(self.embedding_model),
+        }
+
+    def _restore(self, state: Dict[str, np.ndarray]):
+        # caller holds self._lock; inverse of _state()
+        self.dimension = int(state["matrix"].shape[1])
+        self._reset()
+        size = len(state["bug_ids"])
+        self._ensure_capacity(size)
+        self._store_vectors(0, state["matrix"])
+        self._bug_ids[:size] = state["bug_ids"]
+        self._content_types = [str(value) for value in state["content_types"]]
+        self._products = [str(value) for value in state["products"]]
+        for position, (content_type, product) in enumerate(zip(self._content_types, self._products)):
+            self._mask_for(self._content_type_masks, content_type)[position] = True
+            self._mask_for(self._product_masks, product)[position] = True
+        self._bugs = {int(bug_id): bug for bug_id, bug in json.loads(str(state["bugs"])).items()}
+        self.max_embedding_id = int(state["max_embedding_id"])
+        self.removal_generation = int(state["removal_generation"]) if "removal_generation" in state else 0
+        if "embedding_ids" in state:
+            self._embedding_ids[:size] = state["embedding_ids"]
+        else:
+            # saved without them, missing rows cannot be told apart; 0 makes open() rebuild it
+            self.removal_generation = 0
+        self.embedding_model = str(state["embedding_model"]) if "embedding_model" in state else ""
+        self._size = size
+
+    def save(self, path: str):
+        '''Write the index to path (.npz); load it back with load_file'''
+        with self._lock:
+            state = self._state()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {type(self).__name__} with {len(state['bug_ids'])} embeddings to {path}")
+
+    def load_file(self, path: str):
+        '''Replace the contents of the index with a file written by save()'''
+        with np.load(path, allow_pickle=False) as data:
+            state = {name: data[name] for name in data.files}
+        with self._lock:
+            self._restore(state)
+            self.loaded_at = time.monotonic()
+        logging.info(f"Loaded {type(self).__name__} with {self._size} embeddings from {path}")
+
+    def _result(self, position: int, score: float) -> Dict:
+        bug = self._bugs[int(self._bug_ids[position])]
+        return {**bug, "content_type": self._content_types[position], "similarity_score": score}
@@ -0,0 +1,513 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from constants import (
+    EMBEDDING_DIMENSION,
+    LOCAL_INDEX_QUANTIZATION,
+    QUANTIZATION_RERANK_FACTOR,
+    PQ_SUBSPACES,
+    PQ_SUBVECTOR_DIMENSION,
+    PQ_CENTROIDS,
+    PQ_TRAIN_ITERATIONS,
+    PQ_TRAIN_SAMPLE_SIZE,
+    PQ_MIN_TRAIN_ROWS,
+    QUANTIZED_INDEX_PATH,
+)
+from local_search_index import LocalVectorIndex, normalize_query
+
+'''
+Compressed in-process vector search
+
+QuantizedVectorIndex scores every row with compact codes and re-ranks the best
+limit * rerank_factor candidates with the full-precision vectors:
+
+    "int8"  symmetric int8 codes with one scale per row (4x smaller than float32)
+    "pq"    product quantization: the vector is split into n_subspaces chunks and
+            each chunk stored as the id of its nearest of 256 trained centroids
+            (one byte per chunk, e.g. 96 bytes for 768 dimensions)
+    "none"  no codes, exact scan of the full-precision vectors
+
+save() writes the index as a directory of .npy files. load_file() memory-maps
+the full-precision matrix and the codes read-only, so every worker process on a
+host shares one copy through the page cache, and the re-rank only touches the
+pages of its candidates. Rows added after loading are kept in process memory.
+
+    python quantized_index.py   # rebuild the saved index from bug_embeddings
+'''
+
+QUANTIZATION_MODES = ("none", "int8", "pq")
+_SCORE_BLOCK_SIZE = 16384 # rows decoded / scored at a time, bounds temporary memory
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''Per-row symmetric int8 codes: vectors ~= codes * scales[:, None]'''
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin of squared L2 distance == argmax of x.c - |c|^2 / 2
+    bias = 0.5 * np.einsum("kd,kd->k", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _SCORE_BLOCK_SIZE):
+        block = vectors[start:start + _SCORE_BLOCK_SIZE]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T - bias, axis=1)
+    return assignments
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = PQ_TRAIN_ITERATIONS, seed: int = 0) -> np.ndarray:
+    '''Plain (Euclidean) k-means; returns the centroids'''
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty clusters with random points
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+    return centroids.astype(np.float32)
+
+
+def pq_subspaces_for(dimension: int, requested: int = PQ_SUBSPACES) -> int:
+    '''
+    Number of product quantization subspaces for vectors of dimension: the
+    largest divisor of dimension not above requested, where requested 0 means
+    one subspace per PQ_SUBVECTOR_DIMENSION dimensions
+    '''
+    target = requested if requested > 0 else max(1, dimension // PQ_SUBVECTOR_DIMENSION)
+    subspaces = next(n for n in range(min(target, dimension), 0, -1) if dimension % n == 0)
+    if requested > 0 and subspaces != requested:
+        logging.warning(f"Dimension {dimension} is not divisible by {requested} subspaces, using {subspaces}")
+    return subspaces
+
+
+@contextmanager
+def saved_index_lock(path: str):
+    '''Exclusive lock (flock on path.lock) for building and saving the index directory at path'''
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+class ProductQuantizer:
+
+    def __init__(self, dimension: int, n_subspaces: int = PQ_SUBSPACES, n_centroids: int = PQ_CENTROIDS):
+        n_subspaces = n_subspaces or pq_subspaces_for(dimension, 0)
+        if dimension % n_subspaces:
+            raise ValueError(f"dimension {dimension} is not divisible by {n_subspaces} subspaces")
+        if not 1 <= n_centroids <= 256:
+            raise ValueError("n_centroids must be between 1 and 256 (codes are one byte)")
+        self.dimension = dimension
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.sub_dimension = dimension // n_subspaces
+        self.centroids: Optional[np.ndarray] = None # (n_subspaces, n_centroids, sub_dimension)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _subvectors(self, vectors: np.ndarray, subspace: int) -> np.ndarray:
+        return vectors[:, subspace * self.sub_dimension:(subspace + 1) * self.sub_dimension]
+
+    def train(self, vectors: np.ndarray, iterations: int = PQ_TRAIN_ITERATIONS, seed: int = 0):
+        n_centroids = min(self.n_centroids, len(vectors))
+        centroids = np.zeros((self.n_subspaces, self.n_centroids, self.sub_dimension), dtype=np.float32)
+        for subspace in range(self.n_subspaces):
+            trained = kmeans(np.ascontiguousarray(self._subvectors(vectors, subspace)), n_centroids, iterations, seed + subspace)
+            centroids[subspace, :len(trained)] = trained
+            # unused slots (tiny training sets) repeat the first centroid, so they are never closer
+            centroids[subspace, len(trained):] = trained[0]
+        self.centroids = centroids
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.n_subspaces), dtype=np.uint8)
+        for subspace in range(self.n_subspaces):
+            codes[:, subspace] = _nearest(self._subvectors(vectors, subspace), self.centroids[subspace])
+        return codes
+
+    def lookup_table(self, query: np.ndarray) -> np.ndarray:
+        '''Inner product of every subspace centroid with the matching chunk of the query'''
+        return np.einsum("mkd,md->mk", self.centroids, query.reshape(self.n_subspaces, self.sub_dimension))
+
+    def score(self, codes: np.ndarray, table: np.ndarray) -> np.ndarray:
+        # approximate inner products: sum over subspaces of the table entry of each code
+        offsets = np.arange(self.n_subspaces, dtype=np.intp) * self.n_centroids
+        return table.ravel()[codes.astype(np.intp) + offsets].sum(axis=1)
+
+
+@dataclass
+class QuantizationConfig:
+    quantization: str = LOCAL_INDEX_QUANTIZATION # "none", "int8" or "pq" (build time)
+    rerank_factor: int = QUANTIZATION_RERANK_FACTOR # candidates re-ranked per result (query time)
+    pq_subspaces: int = PQ_SUBSPACES
+    pq_train_iterations: int = PQ_TRAIN_ITERATIONS
+    pq_train_sample_size: int = PQ_TRAIN_SAMPLE_SIZE
+    index_path: str = QUANTIZED_INDEX_PATH # saved index directory, memory-mapped by every worker; empty to disable
+
+    @classmethod
+    def from_env(cls, env_vars: Dict[str, str]) -> "QuantizationConfig":
+        return cls(
+            quantization=env_vars.get("LOCAL_INDEX_QUANTIZATION", LOCAL_INDEX_QUANTIZATION),
+            rerank_factor=int(env_vars.get("QUANTIZATION_RERANK_FACTOR", QUANTIZATION_RERANK_FACTOR)),
+            pq_subspaces=int(env_vars.get("PQ_SUBSPACES", PQ_SUBSPACES)),
+            pq_train_iterations=int(env_vars.get("PQ_TRAIN_ITERATIONS", PQ_TRAIN_ITERATIONS)),
+            pq_train_sample_size=int(env_vars.get("PQ_TRAIN_SAMPLE_SIZE", PQ_TRAIN_SAMPLE_SIZE)),
+            index_path=env_vars.get("QUANTIZED_INDEX_PATH", QUANTIZED_INDEX_PATH),
+        )
+
+
+class QuantizedVectorIndex(LocalVectorIndex):
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION, quantization: str = LOCAL_INDEX_QUANTIZATION,
+                 rerank_factor: int = QUANTIZATION_RERANK_FACTOR, pq_subspaces: int = PQ_SUBSPACES,
+                 pq_train_iterations: int = PQ_TRAIN_ITERATIONS, pq_train_sample_size: int = PQ_TRAIN_SAMPLE_SIZE,
+                 initial_capacity: int = 1024, embedding_model: str = ""):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {', '.join(QUANTIZATION_MODES)}")
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.pq_subspaces = pq_subspaces_for(dimension, pq_subspaces) if quantization == "pq" else pq_subspaces
+        self.pq_train_iterations = pq_train_iterations
+        self.pq_train_sample_size = pq_train_sample_size
+        super().__init__(dimension, initial_capacity, embedding_model)
+
+    def _reset(self):
+        # rows [0, _base_size) live in the (usually memory-mapped) base arrays, later rows in the tail arrays
+        self._base_size = 0
+        self._full_base: Optional[np.ndarray] = None
+        self._codes_base: Optional[np.ndarray] = None
+        self._scales_base: Optional[np.ndarray] = None
+        self.pq = ProductQuantizer(self.dimension, self.pq_subspaces) if self.quantization == "pq" else None
+        super()._reset()
+
+    @classmethod
+    def from_config(cls, config: QuantizationConfig, dimension: int = EMBEDDING_DIMENSION,
+                    embedding_model: str = "") -> "QuantizedVectorIndex":
+        return cls(dimension, quantization=config.quantization, rerank_factor=config.rerank_factor,
+                   pq_subspaces=config.pq_subspaces, pq_train_iterations=config.pq_train_iterations,
+                   pq_train_sample_size=config.pq_train_sample_size, embedding_model=embedding_model)
+
+    @classmethod
+    def open(cls, config: QuantizationConfig, rag_system, dimension: int = EMBEDDING_DIMENSION) -> "QuantizedVectorIndex":
+        '''
+        Memory-map the index saved at config.index_path and add rows stored since,
+        or build it from bug_embeddings, save it and map the saved copy when there
+        is no saved index, it was built for another model or quantization, or
+        embeddings were removed since it was built.
+        '''
+        if not config.index_path:
+            index = cls.from_config(config, dimension, rag_system.embedding_model)
+            index.load(rag_system)
+            return index
+        # one process builds and saves at a time; the others wait, then map the saved copy
+        with saved_index_lock(config.index_path):
+            return cls._open_saved(config, rag_system, dimension)
+
+    @classmethod
+    def _open_saved(cls, config: QuantizationConfig, rag_system, dimension: int) -> "QuantizedVectorIndex":
+        # caller holds saved_index_lock(config.index_path)
+        index = cls.from_config(config, dimension, rag_system.embedding_model)
+        if os.path.exists(os.path.join(config.index_path, "meta.json")):
+            index.load_file(config.index_path)
+        if (index.embedding_model != rag_system.embedding_model or index.dimension != dimension
+                or index.quantization != config.quantization):
+            logging.info(f"Saved index is {index.quantization} for {index.embedding_model or 'an unknown model'}, "
+                         f"rebuilding {config.quantization} for {rag_system.embedding_model}")
+            index = cls.from_config(config, dimension, rag_system.embedding_model)
+        elif len(index) and index.removal_generation != (rag_system.get_embedding_removals() or index.removal_generation):
+            logging.info("Embeddings were removed since the saved index was built, rebuilding it")
+            index = cls.from_config(config, dimension, rag_system.embedding_model)
+        if len(index):
+            # build parameters come from the file; the query-time parameter from config
+            index.rerank_factor = config.rerank_factor
+            index.load(rag_system)
+        else:
+            index.load(rag_system)
+            if index.codes_ready:
+                index.save(config.index_path)
+                # drop the private copy; map the saved one, shared with the other workers
+                index.load_file(config.index_path)
+        return index
+
+    @property
+    def codes_ready(self) -> bool:
+        return self.quantization == "int8" or (self.quantization == "pq" and self.pq.is_trained)
+
+    @property
+    def _code_shape(self) -> Tuple[int, type]:
+        if self.quantization == "int8":
+            return self.dimension, np.int8
+        if self.quantization == "pq":
+            return self.pq_subspaces, np.uint8
+        return 0, np.uint8
+
+    def _allocate_vectors(self, capacity: int):
+        # the tail is sized on its own (see _store_vectors); masks and bug ids follow capacity
+        width, dtype = self._code_shape
+        rows = self.initial_capacity
+        self._full_tail = np.zeros((rows, self.dimension), dtype=np.float32)
+        self._codes_tail = np.zeros((rows, width), dtype=dtype)
+        self._scales_tail = np.zeros(rows, dtype=np.float32)
+
+    def _grow_vectors(self, capacity: int):
+        pass
+
+    def _grow_tail(self, rows: int):
+        if rows <= len(self._full_tail):
+            return
+        capacity = max(len(self._full_tail), 1)
+        while capacity < rows:
+            capacity *= 2
+        used = self._size - self._base_size
+        for name in ("_full_tail", "_codes_tail", "_scales_tail"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:used] = array[:used]
+            setattr(self, name, grown)
+
+    def _store_vectors(self, start: int, vectors: np.ndarray):
+        offset = start - self._base_size
+        end = offset + len(vectors)
+        self._grow_tail(end)
+        self._full_tail[offset:end] = vectors
+        if self.quantization == "int8":
+            self._codes_tail[offset:end], self._scales_tail[offset:end] = quantize_int8(vectors)
+        elif self.quantization == "pq" and self.pq.is_trained:
+            self._codes_tail[offset:end] = self.pq.encode(vectors)
+
+    def _segments(self):
+        # (full, codes, scales, rows) of the base and the tail
+        if self._base_size:
+            yield self._full_base, self._codes_base, self._scales_base, self._base_size
+        yield self._full_tail, self._codes_tail, self._scales_tail, self._size - self._base_size
+
+    def _full_rows(self, positions: np.ndarray) -> np.ndarray:
+        if not self._base_size:
+            return self._full_tail[positions]
+        rows = np.empty((len(positions), self.dimension), dtype=np.float32)
+        in_base = positions < self._base_size
+        rows[in_base] = self._full_base[positions[in_base]]
+        rows[~in_base] = self._full_tail[positions[~in_base] - self._base_size]
+        return rows
+
+    def add(self, rows: List[Dict]):
+        '''Add rows; product quantization is trained once enough rows are stored'''
+        with self._lock:
+            super().add(rows)
+            if self.quantization == "pq" and not self.pq.is_trained and self._size >= PQ_MIN_TRAIN_ROWS:
+                self.train()
+
+    def train(self, seed: int = 0):
+        '''Train the product quantizer on the stored rows and encode all of them'''
+        if self.quantization != "pq":
+            return
+        with self._lock:
+            if self._size == 0:
+                return
+            started = time.monotonic()
+            sample = np.arange(self._size)
+            if self._size > self.pq_train_sample_size:
+                sample = np.sort(np.random.default_rng(seed).choice(self._size, self.pq_train_sample_size, replace=False))
+            self.pq.train(self._full_rows(sample), self.pq_train_iterations, seed)
+            if self._base_size:
+                self._codes_base = self.pq.encode(self._full_base)
+            used = self._size - self._base_size
+            self._codes_tail[:used] = self.pq.encode(self._full_tail[:used])
+            logging.info(f"Trained product quantizer: {self.pq_subspaces} subspaces over {self._size} rows in {(time.monotonic() - started) * 1000:.0f} ms")
+
+    def _scan(self, query: np.ndarray, exact: bool = False) -> np.ndarray:
+        # caller holds self._lock; score of every stored row, from the codes unless exact
+        table = self.pq.lookup_table(query) if self.quantization == "pq" and not exact else None
+        scores = np.empty(self._size, dtype=np.float32)
+        offset = 0
+        for full, codes, scales, rows in self._segments():
+            for start in range(0, rows, _SCORE_BLOCK_SIZE):
+                end = min(rows, start + _SCORE_BLOCK_SIZE)
+                if exact or self.quantization == "none":
+                    block = full[start:end] @ query
+                elif self.quantization == "int8":
+                    block = (codes[start:end].astype(np.float32) @ query) * scales[start:end]
+                else:
+                    block = self.pq.score(codes[start:end], table)
+                scores[offset + start:offset + end] = block
+            offset += rows
+        return scores
+
+    def search(self, query_embedding, limit: int = 5, content_type: str = None, product_filter: str = None,
+               similarity_threshold: float = 0.8, group_by_bug: bool = False, aggregation: str = "max",
+               weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+        '''Top `limit` rows (distinct bugs with group_by_bug): candidates from the codes, re-ranked at full precision'''
+        with self._lock:
+            if self._size == 0 or limit <= 0:
+                return []
+            query = normalize_query(query_embedding)
+            if not self.codes_ready:
+                scores = self._scan(query, exact=True)
+                if group_by_bug:
+                    return self._top_k_grouped(scores, limit, content_type, product_filter, similarity_threshold, aggregation, weights)
+                return self._top_k(scores, limit, content_type, product_filter, similarity_threshold)
+            approximate = self._scan(query)
+            mask = self._filter_mask(content_type, product_filter)
+            if mask is not None:
+                approximate[~mask] = -np.inf
+            # a grouped result can need one row per content type of each bug
+            candidates = limit * self.rerank_factor * (max(len(self._content_type_masks), 1) if group_by_bug else 1)
+            if candidates < self._size:
+                positions = np.argpartition(approximate, -candidates)[-candidates:]
+            else:
+                positions = np.arange(self._size)
+            positions = np.sort(positions[np.isfinite(approximate[positions])]) # sorted: sequential reads of the mapped file
+            if positions.size == 0:
+                return []
+            scores = self._full_rows(positions) @ query
+            if group_by_bug:
+                return self._top_k_grouped(scores, limit, content_type, product_filter, similarity_threshold,
+                                           aggregation, weights, positions=positions)
+            return self._top_k(scores, limit, content_type, product_filter, similarity_threshold, positions=positions)
+
+    def search_many(self, query_embeddings: List, searches: List[Dict]) -> List[List[Dict]]:
+        '''Each query scans the codes and re-ranks its own candidates, so they are run one by one'''
+        with self._lock:
+            return [self.search(query, **search) for query, search in zip(query_embeddings, searches)]
+
+    def memory_usage(self) -> Dict[str, int]:
+        with self._lock:
+            usage = super().memory_usage()
+            resident, mapped = usage["resident_bytes"], 0
+            for array in (self._full_base, self._codes_base, self._scales_base):
+                if array is None:
+                    continue
+                if isinstance(array, np.memmap):
+                    mapped += array.nbytes
+                else:
+                    resident += array.nbytes
+            resident += self._full_tail.nbytes + self._codes_tail.nbytes + self._scales_tail.nbytes
+            usage.update(resident_bytes=resident, mapped_bytes=mapped)
+            return usage
+
+    def _rows(self, name: str) -> np.ndarray:
+        # caller holds self._lock; base and tail of one array as a single array of self._size rows
+        base = getattr(self, f"_{name}_base")
+        tail = getattr(self, f"_{name}_tail")[:self._size - self._base_size]
+        return tail if not self._base_size else np.concatenate([base, tail])
+
+    def save(self, path: str):
+        '''
+        Write the index to the directory path (replacing it atomically); load it
+        back with load_file. Callers hold saved_index_lock(path), two concurrent
+        saves would fail to rename over each other's directory.
+        '''
+        with self._lock:
+            arrays = {"full": self._rows("full"), "bug_ids": self._bug_ids[:self._size],
+                      "embedding_ids": self._embedding_ids[:self._size]}
+            if self.codes_ready:
+                arrays["codes"] = self._rows("codes")
+            if self.quantization == "int8":
+                arrays["scales"] = self._rows("scales")
+            if self.quantization == "pq" and self.pq.is_trained:
+                arrays["pq_centroids"] = self.pq.centroids
+            meta = {
+                "quantization": self.quantization,
+                "pq_subspaces": self.pq_subspaces,
+                "embedding_model": self.embedding_model,
+                "max_embedding_id": self.max_embedding_id,
+                "removal_generation": self.removal_generation,
+                "content_types": self._content_types,
+                "products": self._products,
+                "bugs": {str(bug_id): bug for bug_id, bug in self._bugs.items()},
+            }
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path, old_path = f"{path}.tmp-{os.getpid()}", f"{path}.old-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f, default=str)
+        # processes that mapped the old files keep reading them until they reload
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logging.info(f"Saved {type(self).__name__} ({self.quantization}) with {len(arrays['bug_ids'])} embeddings to {path}")
+
+    def load_file(self, path: str):
+        '''Replace the contents of the index with a directory written by save(), memory-mapped read-only'''
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        def mapped(name: str) -> Optional[np.ndarray]:
+            file = os.path.join(path, f"{name}.npy")
+            return np.load(file, mmap_mode="r") if os.path.exists(file) else None
+
+        full = mapped("full")
+        with self._lock:
+            self.dimension = int(full.shape[1])
+            self.quantization = meta["quantization"]
+            self.pq_subspaces = int(meta["pq_subspaces"])
+            self._reset()
+            size = len(full)
+            self._ensure_capacity(size)
+            self._base_size = size
+            self._full_base = full
+            self._codes_base = mapped("codes")
+            self._scales_base = mapped("scales")
+            centroids = mapped("pq_centroids")
+            if centroids is not None:
+                self.pq.centroids = np.array(centroids)
+            self._bug_ids[:size] = np.load(os.path.join(path, "bug_ids.npy"))
+            self._content_types = meta["content_types"]
+            self._products = meta["products"]
+            for position, (content_type, product) in enumerate(zip(self._content_types, self._products)):
+                self._mask_for(self._content_type_masks, content_type)[position] = True
+                self._mask_for(self._product_masks, product)[position] = True
+            self._bugs = {int(bug_id): bug for bug_id, bug in meta["bugs"].items()}
+            self.max_embedding_id = int(meta["max_embedding_id"])
+            self.removal_generation = int(meta.get("removal_generation", 0))
+            if os.path.exists(os.path.join(path, "embedding_ids.npy")):
+                self._embedding_ids[:size] = np.load(os.path.join(path, "embedding_ids.npy"))
+            else:
+                # saved without them, missing rows cannot be told apart; 0 makes open() rebuild it
+                self.removal_generation = 0
+            self.embedding_model = meta["embedding_model"]
+            self._size = size
+            self.loaded_at = time.monotonic()
+        logging.info(f"Mapped {type(self).__name__} ({self.quantization}) with {self._size} embeddings from {path}")
+
+
+if __name__ == "__main__":
+    # rebuild the saved index from bug_embeddings: python quantized_index.py
+    from config import get_env_vars
+    from rag_service import get_rag_system
+
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        level=logging.INFO
+    )
+    config = QuantizationConfig.from_env(get_env_vars())
+    rag_system = get_rag_system()
+    index = QuantizedVectorIndex.from_config(config, rag_system.embedding_dimension, rag_system.embedding_model)
+    with saved_index_lock(config.index_path):
+        index.load(rag_system)
+        index.train()
+        index.save(config.index_path)
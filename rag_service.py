@@ -0,0 +1,150 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from ann_index import IVFConfig
+from bug_rag_system import BugRagSystem
+from config import get_env_vars, get_db_config
+from constants import (
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    EMBEDDING_CACHE_MAX_BYTES,
+    SEARCH_BACKEND,
+    LOCAL_INDEX_REFRESH_INTERVAL,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL,
+    DATA_GENERATION_POLL_INTERVAL,
+    HYBRID_SEARCH,
+    RRF_K,
+    WARM_UP_TEXT,
+)
+from db_pool import ConnectionPool
+from embedding_cache import EmbeddingCache
+from llm_client import create_embeddings
+from quantized_index import QuantizationConfig
+from schema import VectorIndexConfig
+from search_cache import SearchResultCache
+
+'''
+Process-wide BugRagSystem
+
+Handlers call get_rag_system() instead of building their own BugRagSystem, so
+.env is read once and every request shares one connection pool. The instance is
+created lazily on first use and re-created in a forked child (connections must
+not be shared across processes).
+
+Under gunicorn (gunicorn.conf.py) the master calls preload() before forking, so
+the in-process search index is loaded once and shared copy-on-write (the
+quantized index is a shared file mapping), and each worker calls warm_up()
+before it accepts requests.
+'''
+
+_lock = threading.Lock()
+_rag_system: Optional[BugRagSystem] = None
+_owner_pid: Optional[int] = None
+_preloaded_index = None
+
+
+def _create_rag_system() -> BugRagSystem:
+    env_vars = get_env_vars()
+    db_pool = ConnectionPool(
+        get_db_config(env_vars),
+        minconn=int(env_vars.get("DB_POOL_MIN_SIZE", DB_POOL_MIN_SIZE)),
+        maxconn=int(env_vars.get("DB_POOL_MAX_SIZE", DB_POOL_MAX_SIZE)),
+        health_check_interval=float(env_vars.get("DB_POOL_HEALTH_CHECK_INTERVAL", DB_POOL_HEALTH_CHECK_INTERVAL)),
+    )
+    # shared by ingest and search; EMBEDDING_CACHE_PATH enables the on-disk tier
+    embedding_cache = EmbeddingCache(
+        max_bytes=int(env_vars.get("EMBEDDING_CACHE_MAX_BYTES", EMBEDDING_CACHE_MAX_BYTES)),
+        db_path=env_vars.get("EMBEDDING_CACHE_PATH") or None,
+    )
+    search_cache = SearchResultCache(
+        max_entries=int(env_vars.get("SEARCH_CACHE_MAX_ENTRIES", SEARCH_CACHE_MAX_ENTRIES)),
+        ttl=float(env_vars.get("SEARCH_CACHE_TTL", SEARCH_CACHE_TTL)),
+    )
+    return BugRagSystem(
+        get_db_config(env_vars),
+        llm_api_url=env_vars.get("LLM_API_URL"),
+        embedding_model=env_vars.get("EMBEDDING_MODEL_NAME"),
+        db_pool=db_pool,
+        embedding_cache=embedding_cache,
+        search_backend=env_vars.get("SEARCH_BACKEND", SEARCH_BACKEND),
+        local_index_refresh_interval=float(env_vars.get("LOCAL_INDEX_REFRESH_INTERVAL", LOCAL_INDEX_REFRESH_INTERVAL)),
+        ivf_config=IVFConfig.from_env(env_vars),
+        quantization_config=QuantizationConfig.from_env(env_vars),
+        vector_index_config=VectorIndexConfig.from_env(env_vars),
+        search_cache=search_cache,
+        data_generation_poll_interval=float(env_vars.get("DATA_GENERATION_POLL_INTERVAL", DATA_GENERATION_POLL_INTERVAL)),
+        hybrid_search=str(env_vars.get("HYBRID_SEARCH", HYBRID_SEARCH)).lower() == "true",
+        rrf_k=int(env_vars.get("RRF_K", RRF_K)),
+        local_index=_preloaded_index,
+    )
+
+
+def get_rag_system() -> BugRagSystem:
+    '''Return this process's shared BugRagSystem, creating it on first use'''
+    global _rag_system, _owner_pid
+    if _rag_system is not None and _owner_pid == os.getpid():
+        return _rag_system
+    with _lock:
+        if _rag_system is None or _owner_pid != os.getpid():
+            # after a fork the inherited pool belongs to the parent; drop it without closing its sockets
+            _rag_system = _create_rag_system()
+            _owner_pid = os.getpid()
+            logging.info(f"Initialised shared BugRagSystem for process {_owner_pid}")
+        return _rag_system
+
+
+def shutdown_rag_system():
+    '''Close the shared instance's connection pool'''
+    global _rag_system, _owner_pid
+    with _lock:
+        if _rag_system is not None and _owner_pid == os.getpid():
+            _rag_system.close()
+        _rag_system = None
+        _owner_pid = None
+
+
+def preload():
+    '''
+    Before fork: read .env and load the in-process search index (SEARCH_BACKEND
+    local/ivf/quantized), then close the connections used for it. Instances
+    created afterwards, in the parent or a forked worker, adopt the index.
+    '''
+    global _preloaded_index
+    started = time.monotonic()
+    get_env_vars()
+    rag_system = get_rag_system()
+    if rag_system.search_backend in ("local", "ivf", "quantized"):
+        _preloaded_index = rag_system.get_local_index()
+        logging.info(f"Preloaded {rag_system.search_backend} index, {len(_preloaded_index)} rows")
+    shutdown_rag_system()
+    logging.info(f"Preloaded shared state in {(time.monotonic() - started) * 1000:.0f} ms")
+
+
+def warm_up():
+    '''
+    In a new worker: open the pool's connections, read the data generation and
+    active model, and create the model client with one embedding request (which
+    also gets the embedding model loaded), so the first request pays for none
+    of them. Failures are logged; the worker still starts.
+    '''
+    started = time.monotonic()
+    try:
+        rag_system = get_rag_system()
+        rag_system.get_data_generation()
+        if rag_system.search_backend in ("local", "ivf", "quantized"):
+            rag_system.get_local_index()
+        # not through generate_embedding: a cached vector would skip the client
+        create_embeddings(rag_system.llm_api_url, rag_system.embedding_model, WARM_UP_TEXT)
+    except Exception as e:
+        logging.error(f"Warm-up of process {os.getpid()} failed: {e}")
+        return
+    logging.info(f"Warmed up process {os.getpid()} in {(time.monotonic() - started) * 1000:.0f} ms")
+
+
+atexit.register(shutdown_rag_system)
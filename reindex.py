@@ -0,0 +1,350 @@
+import argparse
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from bug_rag_system import BugData, content_hash
+from constants import REINDEX_BATCH_SIZE, REINDEX_MAX_ROWS_PER_SECOND
+from schema import VectorIndexConfig, create_embedding_indexes, create_data_generation_trigger, create_embedding_removal_trigger
+
+'''
+Incremental re-embedding
+
+Every bug_embeddings row records the model that produced it and the hash of
+the text it was built from. The re-index job walks bugs in id order, rebuilds
+the texts each bug should be embedded from and only re-embeds rows that are
+missing, were built from other text or by another model; rows for texts a bug
+no longer has are deleted. Work is done in batches of bugs, each committed on
+its own, and throttled to a maximum number of embedded rows per second.
+
+Changing model without mixing vector spaces uses a shadow set:
+
+    python reindex.py shadow --model NEW   # backfill bug_embeddings_shadow with NEW; re-run to catch up
+    python reindex.py switch               # catch up, then swap the tables in one transaction
+    python reindex.py drop-old             # drop the previous table once the new model is verified
+
+The old model keeps serving from bug_embeddings during the backfill. The switch
+locks bugs and both embedding tables, embeds whatever changed since the last
+pass, renames the tables and marks NEW active in embedding_models. Running
+processes pick the new model up from embedding_models within
+DATA_GENERATION_POLL_INTERVAL (see BugRagSystem._sync_active_model).
+
+Other commands:
+
+    python reindex.py status    # models and row counts per table
+    python reindex.py adopt     # record the configured model as active and tag untagged rows with it
+    python reindex.py run       # in place: re-embed active rows whose text or model is stale
+'''
+
+ACTIVE_TABLE = "bug_embeddings"
+SHADOW_TABLE = "bug_embeddings_shadow"
+OLD_TABLE = "bug_embeddings_old"
+
+BUG_COLUMNS = [
+    "incident_number", "product", "description", "closing_notes",
+    "resolution_tier_1", "resolution_tier_2", "resolution_tier_3",
+    "problem_id", "sys_created_on", "sys_created_by", "priority",
+]
+
+
+@dataclass
+class ReindexStats:
+    bugs_scanned: int = 0
+    rows_current: int = 0 # already built from the same text by the same model
+    rows_embedded: int = 0
+    rows_deleted: int = 0
+    rows_failed: int = 0 # embedding failed; the old row (if any) is kept
+    elapsed_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class Reindexer:
+
+    def __init__(self, rag_system, model: str, table: str = ACTIVE_TABLE, batch_size: int = REINDEX_BATCH_SIZE,
+                 max_rows_per_second: float = REINDEX_MAX_ROWS_PER_SECOND):
+        self.rag_system = rag_system
+        self.model = model
+        self.table = table
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second # 0 for no limit
+        self.stats = ReindexStats()
+
+    def run(self, conn=None) -> ReindexStats:
+        '''
+        Bring every bug's rows in self.table up to date. Without conn each batch is
+        committed on its own connection; with conn everything runs in its transaction.
+        '''
+        started = time.monotonic()
+        after_id = 0
+        while True:
+            batch_started = time.monotonic()
+            if conn is None:
+                with self.rag_system.get_db_connection() as batch_conn:
+                    with batch_conn.cursor() as cursor:
+                        after_id, embedded = self._reindex_batch(cursor, after_id)
+            else:
+                with conn.cursor() as cursor:
+                    after_id, embedded = self._reindex_batch(cursor, after_id)
+            if after_id is None:
+                break
+            self._throttle(embedded, time.monotonic() - batch_started)
+        self.stats.elapsed_seconds = round(time.monotonic() - started, 2)
+        logging.info(f"Re-index of {self.table} with {self.model}: {self.stats.to_dict()}")
+        return self.stats
+
+    def _throttle(self, embedded: int, elapsed: float):
+        if self.max_rows_per_second > 0 and embedded:
+            delay = embedded / self.max_rows_per_second - elapsed
+            if delay > 0:
+                time.sleep(delay)
+
+    def _reindex_batch(self, cursor, after_id: int) -> Tuple[Optional[int], int]:
+        # one batch of bugs after after_id; returns (last bug id or None when done, rows embedded)
+        cursor.execute(f"""
+            select id, {", ".join(BUG_COLUMNS)}
+            from bugs
+            where id > %s
+            order by id
+            limit %s
+        """, (after_id, self.batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return None, 0
+        bug_ids = [row[0] for row in rows]
+        self.stats.bugs_scanned += len(rows)
+
+        expected: Dict[Tuple[int, str], str] = {}
+        for row in rows:
+            bug = BugData(**dict(zip(BUG_COLUMNS, row[1:])))
+            for content_type, text in self.rag_system.embedding_texts(bug):
+                expected[(row[0], content_type)] = text
+
+        cursor.execute(f"""
+            select id, bug_id, content_type, embedding_model, content_hash
+            from {self.table}
+            where bug_id = any(%s)
+        """, (bug_ids,))
+        existing: Dict[Tuple[int, str], List[Tuple[int, str, str]]] = {}
+        for row_id, bug_id, content_type, model, text_hash in cursor.fetchall():
+            existing.setdefault((bug_id, content_type), []).append((row_id, model, text_hash))
+
+        stale = []
+        for key, text in expected.items():
+            current = existing.get(key, [])
+            if len(current) == 1 and current[0][1] == self.model and current[0][2] == content_hash(text):
+                self.stats.rows_current += 1
+            else:
+                stale.append(key)
+        obsolete = [row[0] for key, current in existing.items() if key not in expected for row in current]
+
+        embeddings = self.rag_system.generate_embeddings([expected[key] for key in stale], model=self.model)
+        replace = [(key, embedding) for key, embedding in zip(stale, embeddings) if embedding]
+        self.stats.rows_failed += len(stale) - len(replace)
+        # rows that could not be embedded keep their old vector until the next run
+        obsolete += [row[0] for key, _ in replace for row in existing.get(key, [])]
+
+        if obsolete:
+            cursor.execute(f"delete from {self.table} where id = any(%s)", (obsolete,))
+        if replace:
+            self.rag_system.write_embeddings(
+                cursor,
+                [(bug_id, content_type, expected[(bug_id, content_type)], embedding) for (bug_id, content_type), embedding in replace],
+                table=self.table,
+                model=self.model,
+            )
+        self.stats.rows_deleted += len(obsolete)
+        self.stats.rows_embedded += len(replace)
+        return bug_ids[-1], len(replace)
+
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("select to_regclass(%s) is not null", (table,))
+    return cursor.fetchone()[0]
+
+
+def _model_with_status(cursor, status: str) -> Optional[Tuple[str, int]]:
+    cursor.execute("select model, dimension from embedding_models where status = %s", (status,))
+    return cursor.fetchone()
+
+
+def _probe_dimension(rag_system, model: str) -> int:
+    embedding = rag_system.generate_embeddings(["dimension probe"], model=model)[0]
+    if not embedding:
+        raise RuntimeError(f"Could not generate an embedding with {model}")
+    return len(embedding)
+
+
+def status(rag_system) -> Dict:
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("select model, status, dimension, created_at, activated_at from embedding_models order by created_at")
+            models = [dict(zip(["model", "status", "dimension", "created_at", "activated_at"], row)) for row in cursor.fetchall()]
+            tables = {}
+            for table in (ACTIVE_TABLE, SHADOW_TABLE, OLD_TABLE):
+                if _table_exists(cursor, table):
+                    cursor.execute(f"select embedding_model, count(*) from {table} group by embedding_model order by 1")
+                    tables[table] = {model or "(untagged)": count for model, count in cursor.fetchall()}
+    return {"models": models, "tables": tables}
+
+
+def adopt(rag_system) -> int:
+    '''Record the configured model as active (when none is) and tag untagged rows with it'''
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            active = _model_with_status(cursor, "active")
+            if active is None:
+                dimension = _probe_dimension(rag_system, rag_system.embedding_model)
+                cursor.execute(
+                    "insert into embedding_models(model, status, dimension, activated_at) values(%s, 'active', %s, now())",
+                    (rag_system.embedding_model, dimension)
+                )
+                active = (rag_system.embedding_model, dimension)
+            cursor.execute(f"update {ACTIVE_TABLE} set embedding_model = %s where embedding_model is null", (active[0],))
+            tagged = cursor.rowcount
+    logging.info(f"Active model {active[0]}; tagged {tagged} rows")
+    return tagged
+
+
+def run_in_place(rag_system, batch_size: int, max_rows_per_second: float) -> ReindexStats:
+    '''Re-embed rows of the active table whose text changed or that another model produced'''
+    return Reindexer(rag_system, rag_system.embedding_model, ACTIVE_TABLE, batch_size, max_rows_per_second).run()
+
+
+def build_shadow(rag_system, model: str, batch_size: int, max_rows_per_second: float,
+                 dimension: Optional[int] = None) -> ReindexStats:
+    '''Create the shadow set for model (if needed) and backfill it; safe to re-run'''
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            active = _model_with_status(cursor, "active")
+            if active is not None and active[0] == model:
+                raise RuntimeError(f"{model} is already the active model; use run to re-embed in place")
+            shadow = _model_with_status(cursor, "shadow")
+            if shadow is not None and shadow[0] != model:
+                raise RuntimeError(f"Shadow model {shadow[0]} is already being built; run drop-shadow first")
+            if shadow is None:
+                dimension = dimension or _probe_dimension(rag_system, model)
+                cursor.execute("""
+                    insert into embedding_models(model, status, dimension) values(%s, 'shadow', %s)
+                    on conflict (model) do update set status = 'shadow', dimension = excluded.dimension
+                """, (model, dimension))
+            else:
+                dimension = shadow[1]
+            cursor.execute(f"""
+                create table if not exists {SHADOW_TABLE}(
+                    id serial primary key,
+                    bug_id integer not null references bugs(id) on delete cascade,
+                    content_type text not null,
+                    content_text text,
+                    embedding vector({dimension}) not null,
+                    embedding_model text,
+                    content_hash text
+                )
+            """)
+            cursor.execute(f"create index if not exists {SHADOW_TABLE}_bug_id_idx on {SHADOW_TABLE}(bug_id)")
+            create_data_generation_trigger(cursor, SHADOW_TABLE)
+    logging.info(f"Backfilling {SHADOW_TABLE} with {model} (dimension {dimension})")
+    return Reindexer(rag_system, model, SHADOW_TABLE, batch_size, max_rows_per_second).run()
+
+
+def _rename_indexes(cursor, table: str, old_prefix: str, new_prefix: str):
+    cursor.execute("select indexname from pg_indexes where tablename = %s", (table,))
+    for (name,) in cursor.fetchall():
+        if name.startswith(old_prefix):
+            cursor.execute(f"alter index {name} rename to {new_prefix + name[len(old_prefix):]}")
+
+
+def switch(rag_system, config: VectorIndexConfig, batch_size: int, max_rows_per_second: float) -> ReindexStats:
+    '''Catch the shadow set up and make it the active bug_embeddings in one transaction'''
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            shadow = _model_with_status(cursor, "shadow")
+            if shadow is None or not _table_exists(cursor, SHADOW_TABLE):
+                raise RuntimeError("No shadow embedding set; run shadow --model first")
+            if _table_exists(cursor, OLD_TABLE):
+                raise RuntimeError(f"{OLD_TABLE} still exists; run drop-old first")
+    model = shadow[0]
+
+    # slow work outside the switch transaction: bulk catch-up and the vector index build
+    Reindexer(rag_system, model, SHADOW_TABLE, batch_size, max_rows_per_second).run()
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            logging.info(f"Building indexes on {SHADOW_TABLE}")
+            create_embedding_indexes(cursor, config, SHADOW_TABLE)
+
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # writers wait here; only rows changed since the catch-up are embedded under the lock
+            cursor.execute("lock table bugs in share row exclusive mode")
+            cursor.execute(f"lock table {ACTIVE_TABLE}, {SHADOW_TABLE} in access exclusive mode")
+            stats = Reindexer(rag_system, model, SHADOW_TABLE, batch_size).run(conn)
+            _rename_indexes(cursor, ACTIVE_TABLE, f"{ACTIVE_TABLE}_", f"{OLD_TABLE}_")
+            cursor.execute(f"alter table {ACTIVE_TABLE} rename to {OLD_TABLE}")
+            _rename_indexes(cursor, SHADOW_TABLE, f"{SHADOW_TABLE}_", f"{ACTIVE_TABLE}_")
+            cursor.execute(f"alter table {SHADOW_TABLE} rename to {ACTIVE_TABLE}")
+            # only now: deletes while the shadow was filled do not concern the in-process indexes
+            create_embedding_removal_trigger(cursor, ACTIVE_TABLE)
+            cursor.execute("update embedding_models set status = 'retired' where status = 'active'")
+            cursor.execute("update embedding_models set status = 'active', activated_at = now() where model = %s", (model,))
+    # after the switch has committed, see BugRagSystem.bump_data_generation
+    rag_system.bump_data_generation()
+    logging.info(f"Switched to {model}; previous embeddings kept in {OLD_TABLE}")
+    return stats
+
+
+def drop_old(rag_system):
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"drop table if exists {OLD_TABLE}")
+    logging.info(f"Dropped {OLD_TABLE}")
+
+
+def drop_shadow(rag_system):
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"drop table if exists {SHADOW_TABLE}")
+            cursor.execute("update embedding_models set status = 'retired' where status = 'shadow'")
+    logging.info(f"Dropped {SHADOW_TABLE}")
+
+
+def main():
+    from config import get_env_vars
+    from rag_service import get_rag_system
+
+    parser = argparse.ArgumentParser(description="Re-embed bugs whose text or embedding model changed")
+    parser.add_argument("command", choices=["status", "adopt", "run", "shadow", "switch", "drop-old", "drop-shadow"])
+    parser.add_argument("--model", help="embedding model of the shadow set")
+    parser.add_argument("--dimension", type=int, help="vector dimension of --model (probed when omitted)")
+    parser.add_argument("--batch-size", type=int, default=REINDEX_BATCH_SIZE, help="bugs per committed batch")
+    parser.add_argument("--max-rows-per-second", type=float, default=REINDEX_MAX_ROWS_PER_SECOND,
+                        help="embedding throttle, 0 for none")
+    args = parser.parse_args()
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        level=logging.INFO
+    )
+    rag_system = get_rag_system()
+
+    if args.command == "status":
+        print(status(rag_system))
+    elif args.command == "adopt":
+        adopt(rag_system)
+    elif args.command == "run":
+        print(run_in_place(rag_system, args.batch_size, args.max_rows_per_second).to_dict())
+    elif args.command == "shadow":
+        if not args.model:
+            parser.error("shadow requires --model")
+        print(build_shadow(rag_system, args.model, args.batch_size, args.max_rows_per_second, args.dimension).to_dict())
+    elif args.command == "switch":
+        config = VectorIndexConfig.from_env(get_env_vars())
+        print(switch(rag_system, config, args.batch_size, args.max_rows_per_second).to_dict())
+    elif args.command == "drop-old":
+        drop_old(rag_system)
+    else:
+        drop_shadow(rag_system)
+
+
+if __name__ == "__main__":
+    main()
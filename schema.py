@@ -0,0 +1,904 @@
+import argparse
+import json
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from constants import (
+    EMBEDDING_DIMENSION,
+    VECTOR_INDEX_TYPE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVFFLAT_LISTS,
+    IVFFLAT_PROBES,
+    TEXT_SEARCH_CONFIG,
+    HYBRID_CANDIDATE_FACTOR,
+    RRF_K,
+    GROUP_CANDIDATE_FACTOR,
+    GROUP_WEIGHTS,
+)
+
+'''
+Database schema and migrations
+
+Creates and migrates the objects the application depends on: the bugs and
+bug_embeddings tables, the search_similar_bugs function and their indexes.
+Applied migrations are recorded in schema_migrations, so running migrate again
+only applies new ones.
+
+    python schema.py migrate   # apply pending migrations
+    python schema.py status    # list applied / pending migrations
+    python schema.py explain   # EXPLAIN ANALYZE the hot queries
+    python schema.py rebuild-rollup  # recompute bug_daily_rollup from bugs
+
+Vector indexes are HNSW (default) or IVFFlat on bug_embeddings.embedding, one
+partial index per content_type plus one over all rows. Queries only use a
+partial index when they compare content_type with a literal, which is why
+search_similar_bugs builds its query with EXECUTE.
+
+bugs.search_tsv (description + closing_notes, GIN indexed) backs lexical search.
+Given the query text, search_similar_bugs fuses the vector and lexical rankings
+with reciprocal-rank fusion (RRF): score = sum of 1 / (rrf_k + rank) over the
+rankings a bug appears in, one row per bug.
+
+search_similar_bugs_grouped always returns one row per bug: the similarity of a
+bug is the max over its content types, or their weighted sum ("weighted",
+divided by the total weight of the content types searched), and content_type is
+its best-matching one. With query text the result is fused with the lexical
+ranking like search_similar_bugs.
+
+bug_daily_rollup holds incident counts per day, priority and creator, maintained
+by triggers on bugs; get_incidents_by_days reads whole days from it and only the
+two partial days at the ends of the range from bugs.
+'''
+
+CONTENT_TYPES = ("description", "resolution", "combined")
+
+
+@dataclass
+class VectorIndexConfig:
+    index_type: str = VECTOR_INDEX_TYPE # "hnsw" or "ivfflat"
+    hnsw_m: int = HNSW_M
+    hnsw_ef_construction: int = HNSW_EF_CONSTRUCTION
+    hnsw_ef_search: int = HNSW_EF_SEARCH # candidates examined per query (recall vs latency)
+    ivfflat_lists: int = IVFFLAT_LISTS
+    ivfflat_probes: int = IVFFLAT_PROBES # lists scanned per query (recall vs latency)
+
+    @classmethod
+    def from_env(cls, env_vars: Dict[str, str]) -> "VectorIndexConfig":
+        return cls(
+            index_type=env_vars.get("VECTOR_INDEX_TYPE", VECTOR_INDEX_TYPE),
+            hnsw_m=int(env_vars.get("HNSW_M", HNSW_M)),
+            hnsw_ef_construction=int(env_vars.get("HNSW_EF_CONSTRUCTION", HNSW_EF_CONSTRUCTION)),
+            hnsw_ef_search=int(env_vars.get("HNSW_EF_SEARCH", HNSW_EF_SEARCH)),
+            ivfflat_lists=int(env_vars.get("IVFFLAT_LISTS", IVFFLAT_LISTS)),
+            ivfflat_probes=int(env_vars.get("IVFFLAT_PROBES", IVFFLAT_PROBES)),
+        )
+
+
+def search_settings_sql(config: VectorIndexConfig) -> str:
+    '''Statement setting the vector index query-time parameters for the current transaction'''
+    if config.index_type == "ivfflat":
+        return f"set local ivfflat.probes = {int(config.ivfflat_probes)}"
+    return f"set local hnsw.ef_search = {int(config.hnsw_ef_search)}"
+
+
+def apply_search_settings(cursor, config: VectorIndexConfig):
+    '''Set the vector index query-time parameters for the current transaction'''
+    cursor.execute(search_settings_sql(config))
+
+
+# Body of search_similar_bugs. $1 query vector, $2 product filter, $3 similarity
+# threshold, $4 limit; {content_filter} is empty or "and be.content_type = '<literal>'".
+SEARCH_QUERY_TEMPLATE = """
+    select b.id as bug_id,
+           b.incident_number,
+           b.product,
+           b.description,
+           b.closing_notes,
+           be.content_type,
+           (1 - (be.embedding <=> $1))::float as similarity_score
+    from bug_embeddings be
+    join bugs b on b.id = be.bug_id
+    where ($2::text is null or b.product = $2)
+      {content_filter}
+      and 1 - (be.embedding <=> $1) >= $3
+    order by be.embedding <=> $1
+    limit $4
+"""
+
+# Hybrid body of search_similar_bugs: as above plus $5 query text, $6 rrf_k.
+# Each ranking contributes up to limit * HYBRID_CANDIDATE_FACTOR bugs.
+HYBRID_QUERY_TEMPLATE = """
+    with vector_candidates as (
+        select be.bug_id,
+               be.content_type,
+               (1 - (be.embedding <=> $1))::float as similarity_score
+        from bug_embeddings be
+        join bugs b on b.id = be.bug_id
+        where ($2::text is null or b.product = $2)
+          {content_filter}
+          and 1 - (be.embedding <=> $1) >= $3
+        order by be.embedding <=> $1
+        limit $4 * {candidate_factor}
+    ),
+    vector_hits as (
+        select bug_id, content_type, similarity_score,
+               row_number() over (order by similarity_score desc) as rank
+        from (
+            select distinct on (bug_id) *
+            from vector_candidates
+            order by bug_id, similarity_score desc
+        ) best
+    ),
+    lexical_hits as (
+        select b.id as bug_id,
+               row_number() over (order by ts_rank_cd(b.search_tsv, query) desc) as rank
+        from bugs b, websearch_to_tsquery('{text_search_config}', $5) query
+        where b.search_tsv @@ query
+          and ($2::text is null or b.product = $2)
+        order by ts_rank_cd(b.search_tsv, query) desc
+        limit $4 * {candidate_factor}
+    ),
+    fused as (
+        select coalesce(v.bug_id, l.bug_id) as bug_id,
+               v.content_type,
+               v.similarity_score,
+               coalesce(1.0 / ($6 + v.rank), 0) + coalesce(1.0 / ($6 + l.rank), 0) as fused_score
+        from vector_hits v
+        full join lexical_hits l on l.bug_id = v.bug_id
+    )
+    select b.id as bug_id,
+           b.incident_number,
+           b.product,
+           b.description,
+           b.closing_notes,
+           coalesce(f.content_type, l.content_type) as content_type,
+           coalesce(f.similarity_score, l.similarity_score)::float as similarity_score
+    from fused f
+    join bugs b on b.id = f.bug_id
+    -- a bug found only by the lexical ranking is scored by its best embedding of the
+    -- requested content type, and kept only if that passes the similarity threshold
+    left join lateral (
+        select be.content_type, (1 - (be.embedding <=> $1))::float as similarity_score
+        from bug_embeddings be
+        where f.similarity_score is null
+          and be.bug_id = f.bug_id
+          {content_filter}
+          and 1 - (be.embedding <=> $1) >= $3
+        order by be.embedding <=> $1
+        limit 1
+    ) l on true
+    where coalesce(f.similarity_score, l.similarity_score) is not null
+    order by f.fused_score desc, similarity_score desc
+    limit $4
+""".replace("{candidate_factor}", str(HYBRID_CANDIDATE_FACTOR)).replace("{text_search_config}", TEXT_SEARCH_CONFIG)
+
+# Body of search_similar_bugs_grouped: $1 query vector, $2 product filter, $3 similarity
+# threshold, $4 limit, $5 aggregation ('max' or 'weighted'), $6 query text (may be null),
+# $7 rrf_k, $8 content type weights (jsonb), $9 total weight of the searched content types.
+GROUPED_QUERY_TEMPLATE = """
+    with vector_candidates as (
+        select be.bug_id,
+               be.content_type,
+               (1 - (be.embedding <=> $1))::float as similarity_score
+        from bug_embeddings be
+        join bugs b on b.id = be.bug_id
+        where ($2::text is null or b.product = $2)
+          {content_filter}
+          and 1 - (be.embedding <=> $1) >= $3
+        order by be.embedding <=> $1
+        limit $4 * {candidate_factor}
+    ),
+    vector_groups as (
+        select bug_id,
+               (array_agg(content_type order by similarity_score desc))[1] as content_type,
+               case when $5 = 'weighted'
+                    then sum(similarity_score * coalesce(($8 ->> content_type)::float, 0)) / nullif($9, 0)
+                    else max(similarity_score)
+               end as similarity_score
+        from vector_candidates
+        group by bug_id
+    ),
+    vector_hits as (
+        select bug_id, content_type, similarity_score,
+               row_number() over (order by similarity_score desc) as rank
+        from vector_groups
+    ),
+    lexical_hits as (
+        select b.id as bug_id,
+               row_number() over (order by ts_rank_cd(b.search_tsv, query) desc) as rank
+        from bugs b, websearch_to_tsquery('{text_search_config}', $6) query
+        where coalesce(btrim($6), '') <> ''
+          and b.search_tsv @@ query
+          and ($2::text is null or b.product = $2)
+        order by ts_rank_cd(b.search_tsv, query) desc
+        limit $4 * {candidate_factor}
+    ),
+    fused as (
+        select coalesce(v.bug_id, l.bug_id) as bug_id,
+               v.content_type,
+               v.similarity_score,
+               coalesce(1.0 / ($7 + v.rank), 0) + coalesce(1.0 / ($7 + l.rank), 0) as fused_score
+        from vector_hits v
+        full join lexical_hits l on l.bug_id = v.bug_id
+    )
+    select b.id as bug_id,
+           b.incident_number,
+           b.product,
+           b.description,
+           b.closing_notes,
+           coalesce(f.content_type, l.content_type) as content_type,
+           coalesce(f.similarity_score, l.similarity_score)::float as similarity_score
+    from fused f
+    join bugs b on b.id = f.bug_id
+    -- a bug found only by the lexical ranking is aggregated like the vector hits, over
+    -- its embeddings of the requested content type that pass the similarity threshold
+    left join lateral (
+        select (array_agg(e.content_type order by e.similarity_score desc))[1] as content_type,
+               case when $5 = 'weighted'
+                    then sum(e.similarity_score * coalesce(($8 ->> e.content_type)::float, 0)) / nullif($9, 0)
+                    else max(e.similarity_score)
+               end as similarity_score
+        from (
+            select be.content_type, 1 - (be.embedding <=> $1) as similarity_score
+            from bug_embeddings be
+            where f.similarity_score is null
+              and be.bug_id = f.bug_id
+              {content_filter}
+              and 1 - (be.embedding <=> $1) >= $3
+        ) e
+    ) l on true
+    where coalesce(f.similarity_score, l.similarity_score) is not null
+    order by f.fused_score desc, similarity_score desc
+    limit $4
+""".replace("{candidate_factor}", str(GROUP_CANDIDATE_FACTOR)).replace("{text_search_config}", TEXT_SEARCH_CONFIG)
+
+
+# Summary of the incidents created in the last %(days)s days, up to now: whole days from
+# bug_daily_rollup, the partial first and last day from bugs. One row: incident count,
+# distinct creators, {priority: count} (jsonb).
+INCIDENT_SUMMARY_QUERY = """
+    with bounds as (
+        select localtimestamp - make_interval(days => %(days)s) as since, localtimestamp as until
+    ),
+    counts as (
+        select b.sys_created_on::date as day,
+               coalesce(b.priority, 0) as priority,
+               coalesce(b.sys_created_by, '') as sys_created_by,
+               count(*) as incident_count
+        from bugs b, bounds
+        where b.sys_created_on >= bounds.since and b.sys_created_on <= bounds.until
+          and (b.sys_created_on < bounds.since::date + 1 or b.sys_created_on >= bounds.until::date)
+        group by 1, 2, 3
+        union all
+        select r.day, r.priority, r.sys_created_by, r.incident_count
+        from bug_daily_rollup r, bounds
+        where r.day > bounds.since::date and r.day < bounds.until::date
+    ),
+    priorities as (
+        select priority, sum(incident_count) as incident_count
+        from counts
+        group by priority
+    )
+    select coalesce((select sum(incident_count) from counts), 0)::bigint as incident_count,
+           coalesce((select array_agg(distinct sys_created_by) from counts where sys_created_by <> ''), '{}') as created_by_users,
+           coalesce((select jsonb_object_agg(priority, incident_count) from priorities), '{}') as priority_counts
+"""
+
+# incident numbers of the same window, newest first (index-only scan of bugs_sys_created_on_incident_idx)
+INCIDENT_NUMBERS_QUERY = """
+    select incident_number
+    from bugs
+    where sys_created_on >= localtimestamp - make_interval(days => %(days)s)
+      and sys_created_on <= localtimestamp
+    order by sys_created_on desc
+"""
+
+# full rows of the same window, for get_incidents_by_days(include_details=True)
+INCIDENT_DETAILS_QUERY = """
+    select incident_number, product, description, closing_notes,
+           resolution_tier_1, resolution_tier_2, resolution_tier_3,
+           problem_id, sys_created_on, sys_created_by, priority,
+           case priority
+               when 4 then 'Critical'
+               when 3 then 'High'
+               when 2 then 'Medium'
+               when 1 then 'Low'
+               else 'Unknown'
+           end as priority_level
+    from bugs
+    where sys_created_on >= localtimestamp - make_interval(days => %(days)s)
+      and sys_created_on <= localtimestamp
+    order by sys_created_on desc
+"""
+
+# Exact lookup of an identifier query (find_exact_matches): bugs whose incident_number is one
+# of %(identifiers)s, else (EXACT_PHRASE_QUERY) bugs whose text contains %(identifier)s as a
+# phrase. Rows have the search_similar_bugs columns, with similarity_score 1.0.
+EXACT_INCIDENT_QUERY = """
+    select id as bug_id, incident_number, product, description, closing_notes,
+           'incident_number' as content_type, 1.0::float as similarity_score
+    from bugs
+    where incident_number = any(%(identifiers)s::text[])
+      and (%(product_filter)s::text is null or product = %(product_filter)s::text)
+    order by id
+    limit %(limit)s
+"""
+
+EXACT_PHRASE_QUERY = """
+    select b.id as bug_id, b.incident_number, b.product, b.description, b.closing_notes,
+           'exact_match' as content_type, 1.0::float as similarity_score
+    from bugs b, phraseto_tsquery('{text_search_config}', %(identifier)s::text) query
+    where b.search_tsv @@ query
+      and (%(product_filter)s::text is null or b.product = %(product_filter)s::text)
+    order by ts_rank_cd(b.search_tsv, query) desc, b.id
+    limit %(limit)s
+""".replace("{text_search_config}", TEXT_SEARCH_CONFIG)
+
+# Calls of the search functions; the query vector and the weights are passed as text
+SEARCH_FUNCTION_QUERY = """
+    select * from search_similar_bugs(%(embedding)s::text::vector, %(content_type)s, %(product_filter)s,
+                                      %(similarity_threshold)s, %(limit)s, %(query_text)s, %(rrf_k)s)
+"""
+
+GROUPED_SEARCH_FUNCTION_QUERY = """
+    select * from search_similar_bugs_grouped(%(embedding)s::text::vector, %(content_type)s, %(product_filter)s,
+                                              %(similarity_threshold)s, %(limit)s, %(aggregation)s, %(query_text)s,
+                                              %(rrf_k)s, %(weights)s::text::jsonb)
+"""
+
+
+def _create_tables(cursor, config: VectorIndexConfig):
+    cursor.execute("create extension if not exists vector")
+    cursor.execute("""
+        create table if not exists bugs(
+            id serial primary key,
+            incident_number text not null,
+            product text,
+            description text,
+            closing_notes text,
+            resolution_tier_1 text,
+            resolution_tier_2 text,
+            resolution_tier_3 text,
+            problem_id text,
+            sys_created_on timestamp,
+            sys_created_by text,
+            priority integer,
+            state text
+        )
+    """)
+    cursor.execute(f"""
+        create table if not exists bug_embeddings(
+            id serial primary key,
+            bug_id integer not null references bugs(id) on delete cascade,
+            content_type text not null,
+            content_text text,
+            embedding vector({EMBEDDING_DIMENSION}) not null
+        )
+    """)
+
+
+def _create_search_function(cursor, config: VectorIndexConfig):
+    # replaces any hand-made version, whose result columns may differ
+    cursor.execute("drop function if exists search_similar_bugs(vector, text, text, double precision, integer)")
+    query = SEARCH_QUERY_TEMPLATE.replace("'", "''")
+    cursor.execute(f"""
+        create function search_similar_bugs(
+            query_embedding vector({EMBEDDING_DIMENSION}),
+            p_content_type text default null,
+            p_product_filter text default null,
+            p_similarity_threshold double precision default 0.8,
+            p_limit integer default 5
+        )
+        returns table(
+            bug_id integer,
+            incident_number text,
+            product text,
+            description text,
+            closing_notes text,
+            content_type text,
+            similarity_score double precision
+        )
+        language plpgsql stable
+        as $fn$
+        declare
+            content_filter text := case
+                when p_content_type is null then ''
+                else format('and be.content_type = %L', p_content_type)
+            end;
+        begin
+            -- EXECUTE plans with the content_type literal, so the partial vector index applies
+            return query execute replace('{query}', '{{content_filter}}', content_filter)
+                using query_embedding, p_product_filter, p_similarity_threshold, p_limit;
+        end;
+        $fn$
+    """)
+
+
+def _vector_index_sql(config: VectorIndexConfig, table: str, name: str, where: str = "") -> str:
+    if config.index_type == "ivfflat":
+        method = f"ivfflat (embedding vector_cosine_ops) with (lists = {config.ivfflat_lists})"
+    else:
+        method = f"hnsw (embedding vector_cosine_ops) with (m = {config.hnsw_m}, ef_construction = {config.hnsw_ef_construction})"
+    return f"create index if not exists {name} on {table} using {method} {where}"
+
+
+def create_embedding_indexes(cursor, config: VectorIndexConfig, table: str = "bug_embeddings"):
+    '''bug_id and vector indexes of an embeddings table (bug_embeddings or the re-index shadow table)'''
+    cursor.execute(f"create index if not exists {table}_bug_id_idx on {table}(bug_id)")
+    suffix = config.index_type
+    cursor.execute(_vector_index_sql(config, table, f"{table}_embedding_{suffix}_idx"))
+    for content_type in CONTENT_TYPES:
+        cursor.execute(_vector_index_sql(
+            config,
+            table,
+            f"{table}_{content_type}_{suffix}_idx",
+            f"where content_type = '{content_type}'"
+        ))
+
+
+def _create_indexes(cursor, config: VectorIndexConfig):
+    cursor.execute("create index if not exists bugs_incident_number_idx on bugs(incident_number)")
+    cursor.execute("create index if not exists bugs_sys_created_on_idx on bugs(sys_created_on)")
+    cursor.execute("create index if not exists bugs_product_idx on bugs(product)")
+    create_embedding_indexes(cursor, config, "bug_embeddings")
+
+
+def create_data_generation_trigger(cursor, table: str):
+    cursor.execute(f"drop trigger if exists {table}_data_generation on {table}")
+    cursor.execute(f"""
+        create trigger {table}_data_generation
+        after insert or update or delete or truncate on {table}
+        for each statement execute function bump_data_generation()
+    """)
+
+
+def create_embedding_removal_trigger(cursor, table: str):
+    cursor.execute(f"drop trigger if exists {table}_embedding_removal on {table}")
+    cursor.execute(f"""
+        create trigger {table}_embedding_removal
+        after update or delete or truncate on {table}
+        for each statement execute function bump_embedding_removals()
+    """)
+
+
+def _create_data_generation(cursor, config: VectorIndexConfig):
+    # single-row counter bumped by every statement that changes bugs or bug_embeddings
+    # (ingest, import_state, manual fixes); caches compare it to detect stale entries
+    cursor.execute("""
+        create table if not exists data_generation(
+            id integer primary key check (id = 1),
+            generation bigint not null default 0,
+            updated_at timestamptz not null default now()
+        )
+    """)
+    cursor.execute("insert into data_generation(id) values(1) on conflict do nothing")
+    cursor.execute("""
+        create or replace function bump_data_generation() returns trigger
+        language plpgsql
+        as $fn$
+        begin
+            update data_generation set generation = generation + 1, updated_at = now() where id = 1;
+            return null;
+        end;
+        $fn$
+    """)
+    for table in ("bugs", "bug_embeddings"):
+        create_data_generation_trigger(cursor, table)
+
+
+def _create_hybrid_search(cursor, config: VectorIndexConfig):
+    cursor.execute(f"""
+        alter table bugs add column if not exists search_tsv tsvector
+        generated always as (
+            to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(description, '') || ' ' || coalesce(closing_notes, ''))
+        ) stored
+    """)
+    cursor.execute("create index if not exists bugs_search_tsv_idx on bugs using gin(search_tsv)")
+    # same first five parameters, so existing callers are unchanged
+    cursor.execute("drop function if exists search_similar_bugs(vector, text, text, double precision, integer)")
+    cursor.execute("drop function if exists search_similar_bugs(vector, text, text, double precision, integer, text, integer)")
+    vector_query = SEARCH_QUERY_TEMPLATE.replace("'", "''")
+    hybrid_query = HYBRID_QUERY_TEMPLATE.replace("'", "''")
+    cursor.execute(f"""
+        create function search_similar_bugs(
+            query_embedding vector({EMBEDDING_DIMENSION}),
+            p_content_type text default null,
+            p_product_filter text default null,
+            p_similarity_threshold double precision default 0.8,
+            p_limit integer default 5,
+            p_query_text text default null,
+            p_rrf_k integer default {RRF_K}
+        )
+        returns table(
+            bug_id integer,
+            incident_number text,
+            product text,
+            description text,
+            closing_notes text,
+            content_type text,
+            similarity_score double precision
+        )
+        language plpgsql stable
+        as $fn$
+        declare
+            content_filter text := case
+                when p_content_type is null then ''
+                else format('and be.content_type = %L', p_content_type)
+            end;
+        begin
+            -- EXECUTE plans with the content_type literal, so the partial vector index applies
+            if coalesce(btrim(p_query_text), '') = '' then
+                return query execute replace('{vector_query}', '{{content_filter}}', content_filter)
+                    using query_embedding, p_product_filter, p_similarity_threshold, p_limit;
+            else
+                return query execute replace('{hybrid_query}', '{{content_filter}}', content_filter)
+                    using query_embedding, p_product_filter, p_similarity_threshold, p_limit, p_query_text, p_rrf_k;
+            end if;
+        end;
+        $fn$
+    """)
+
+
+def _create_grouped_search(cursor, config: VectorIndexConfig):
+    grouped_query = GROUPED_QUERY_TEMPLATE.replace("'", "''")
+    default_weights = json.dumps(GROUP_WEIGHTS)
+    cursor.execute(f"""
+        create or replace function search_similar_bugs_grouped(
+            query_embedding vector({EMBEDDING_DIMENSION}),
+            p_content_type text default null,
+            p_product_filter text default null,
+            p_similarity_threshold double precision default 0.8,
+            p_limit integer default 5,
+            p_aggregation text default 'max',
+            p_query_text text default null,
+            p_rrf_k integer default {RRF_K},
+            p_weights jsonb default '{default_weights}'
+        )
+        returns table(
+            bug_id integer,
+            incident_number text,
+            product text,
+            description text,
+            closing_notes text,
+            content_type text,
+            similarity_score double precision
+        )
+        language plpgsql stable
+        as $fn$
+        declare
+            content_filter text := case
+                when p_content_type is null then ''
+                else format('and be.content_type = %L', p_content_type)
+            end;
+            weight_total double precision;
+        begin
+            select sum(value::float) into weight_total
+            from jsonb_each_text(p_weights)
+            where p_content_type is null or key = p_content_type;
+            return query execute replace('{grouped_query}', '{{content_filter}}', content_filter)
+                using query_embedding, p_product_filter, p_similarity_threshold, p_limit,
+                      p_aggregation, p_query_text, p_rrf_k, p_weights, weight_total;
+        end;
+        $fn$
+    """)
+
+
+def _create_embedding_versioning(cursor, config: VectorIndexConfig):
+    # which model produced each vector and from which text, so re-indexing only redoes stale rows
+    cursor.execute("alter table bug_embeddings add column if not exists embedding_model text")
+    cursor.execute("alter table bug_embeddings add column if not exists content_hash text")
+    cursor.execute("""
+        update bug_embeddings
+        set content_hash = encode(sha256(convert_to(coalesce(content_text, ''), 'UTF8')), 'hex')
+        where content_hash is null
+    """)
+    # at most one active (serving) and one shadow (being backfilled) model, see reindex.py
+    cursor.execute("""
+        create table if not exists embedding_models(
+            model text primary key,
+            status text not null check (status in ('active', 'shadow', 'retired')),
+            dimension integer not null,
+            created_at timestamptz not null default now(),
+            activated_at timestamptz
+        )
+    """)
+    cursor.execute("create unique index if not exists embedding_models_active_idx on embedding_models(status) where status = 'active'")
+    cursor.execute("create unique index if not exists embedding_models_shadow_idx on embedding_models(status) where status = 'shadow'")
+
+
+def rebuild_daily_rollup(cursor):
+    '''Recompute bug_daily_rollup from bugs (the triggers keep it current afterwards)'''
+    # blocks writes to bugs so no change lands between the rebuild and the triggers
+    cursor.execute("lock table bugs in share row exclusive mode")
+    cursor.execute("delete from bug_daily_rollup")
+    cursor.execute("""
+        insert into bug_daily_rollup(day, priority, sys_created_by, incident_count)
+        select sys_created_on::date, coalesce(priority, 0), coalesce(sys_created_by, ''), count(*)
+        from bugs
+        where sys_created_on is not null
+        group by 1, 2, 3
+    """)
+
+
+def _create_daily_rollup(cursor, config: VectorIndexConfig):
+    # per day / priority / creator incident counts for get_incidents_by_days; kept current by
+    # statement triggers that apply the inserted, updated and deleted rows as deltas
+    cursor.execute("""
+        create table if not exists bug_daily_rollup(
+            day date not null,
+            priority integer not null, -- 0 when the bug has no priority
+            sys_created_by text not null, -- '' when the bug has no creator
+            incident_count integer not null,
+            primary key (day, priority, sys_created_by)
+        )
+    """)
+    delta_sql = """
+        insert into bug_daily_rollup(day, priority, sys_created_by, incident_count)
+        select sys_created_on::date, coalesce(priority, 0), coalesce(sys_created_by, ''), {sign} count(*)
+        from {rows}
+        where sys_created_on is not null
+        group by 1, 2, 3
+        on conflict (day, priority, sys_created_by)
+        do update set incident_count = bug_daily_rollup.incident_count + excluded.incident_count;
+    """
+    cursor.execute(f"""
+        create or replace function bug_daily_rollup_apply() returns trigger
+        language plpgsql
+        as $fn$
+        begin
+            if tg_op in ('UPDATE', 'DELETE') then
+                {delta_sql.format(sign="-", rows="old_rows")}
+                delete from bug_daily_rollup r
+                using (select distinct sys_created_on::date as day from old_rows) d
+                where r.day = d.day and r.incident_count = 0;
+            end if;
+            if tg_op in ('INSERT', 'UPDATE') then
+                {delta_sql.format(sign="", rows="new_rows")}
+            end if;
+            return null;
+        end;
+        $fn$
+    """)
+    cursor.execute("""
+        create or replace function bug_daily_rollup_truncate() returns trigger
+        language plpgsql
+        as $fn$
+        begin
+            delete from bug_daily_rollup;
+            return null;
+        end;
+        $fn$
+    """)
+    rebuild_daily_rollup(cursor)
+    for operation, referencing in (
+        ("insert", "new table as new_rows"),
+        ("update", "old table as old_rows new table as new_rows"),
+        ("delete", "old table as old_rows"),
+    ):
+        cursor.execute(f"drop trigger if exists bugs_daily_rollup_{operation} on bugs")
+        cursor.execute(f"""
+            create trigger bugs_daily_rollup_{operation}
+            after {operation} on bugs
+            referencing {referencing}
+            for each statement execute function bug_daily_rollup_apply()
+        """)
+    cursor.execute("drop trigger if exists bugs_daily_rollup_truncate on bugs")
+    cursor.execute("""
+        create trigger bugs_daily_rollup_truncate
+        after truncate on bugs
+        for each statement execute function bug_daily_rollup_truncate()
+    """)
+    # incident numbers of a date range by index-only scan, without touching the wide rows
+    cursor.execute("create index if not exists bugs_sys_created_on_incident_idx on bugs(sys_created_on) include (incident_number)")
+
+
+def _create_incident_listing_index(cursor, config: VectorIndexConfig):
+    # keyset pagination of incident listings: order by (sys_created_on, id) desc
+    cursor.execute("create index if not exists bugs_sys_created_on_id_idx on bugs(sys_created_on, id)")
+
+
+def _create_generation_sequence(cursor, config: VectorIndexConfig):
+    # the data generation becomes a sequence: nextval takes no row lock, so concurrent
+    # writers (ingest workers, re-index batches, jobs in other processes) no longer
+    # serialise on the single data_generation row until they commit. A sequence is
+    # not transactional, so the bump is visible before the write commits; writers
+    # going through BugRagSystem bump again after committing (bump_data_generation)
+    cursor.execute("create sequence if not exists data_generation_seq")
+    cursor.execute("select coalesce((select generation from data_generation where id = 1), 0) + 1")
+    cursor.execute("select setval('data_generation_seq', %s)", (cursor.fetchone()[0],))
+    cursor.execute("""
+        create or replace function bump_data_generation() returns trigger
+        language plpgsql
+        as $fn$
+        begin
+            perform nextval('data_generation_seq');
+            return null;
+        end;
+        $fn$
+    """)
+    cursor.execute("drop table if exists data_generation")
+
+
+def _recreate_hybrid_search_functions(cursor, config: VectorIndexConfig):
+    # the search functions embed the query templates; re-create them so lexical-only
+    # hits honour the content type filter and similarity threshold
+    _create_hybrid_search(cursor, config)
+    _create_grouped_search(cursor, config)
+
+
+def _create_embedding_removal_sequence(cursor, config: VectorIndexConfig):
+    # the in-process indexes only add rows above the highest bug_embeddings.id they hold
+    # (LocalVectorIndex.load), so they keep vectors that were deleted or rewritten, e.g. by
+    # reindex.py. Statements that update, delete or truncate embeddings bump this sequence;
+    # an index loaded at an older value is rebuilt. Starts called at 1, so indexes saved
+    # before this migration (value 0) are rebuilt once
+    cursor.execute("create sequence if not exists embedding_removal_seq")
+    cursor.execute("select setval('embedding_removal_seq', 1)")
+    cursor.execute("""
+        create or replace function bump_embedding_removals() returns trigger
+        language plpgsql
+        as $fn$
+        begin
+            perform nextval('embedding_removal_seq');
+            return null;
+        end;
+        $fn$
+    """)
+    create_embedding_removal_trigger(cursor, "bug_embeddings")
+
+
+# (version, description, migration); append new migrations, never edit applied ones
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "bugs and bug_embeddings tables", _create_tables),
+    (2, "search_similar_bugs function", _create_search_function),
+    (3, "b-tree and vector indexes", _create_indexes),
+    (4, "data_generation counter and triggers", _create_data_generation),
+    (5, "search_tsv lexical index and hybrid search_similar_bugs", _create_hybrid_search),
+    (6, "search_similar_bugs_grouped function", _create_grouped_search),
+    (7, "embedding_model / content_hash columns and embedding_models", _create_embedding_versioning),
+    (8, "bug_daily_rollup table and triggers", _create_daily_rollup),
+    (9, "(sys_created_on, id) index for incident listings", _create_incident_listing_index),
+    (10, "data_generation sequence instead of the counter row", _create_generation_sequence),
+    (11, "search functions: content type and threshold on lexical-only hits", _recreate_hybrid_search_functions),
+    (12, "embedding_removal_seq and its trigger on bug_embeddings", _create_embedding_removal_sequence),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        create table if not exists schema_migrations(
+            version integer primary key,
+            description text not null,
+            applied_at timestamptz not null default now()
+        )
+    """)
+
+
+def applied_versions(cursor) -> List[int]:
+    _ensure_migrations_table(cursor)
+    cursor.execute("select version from schema_migrations order by version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate(rag_system, config: VectorIndexConfig) -> List[int]:
+    '''Apply pending migrations, each in its own transaction. Returns the versions applied'''
+    applied = []
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # one migrator at a time
+            cursor.execute("select pg_advisory_lock(hashtext('schema_migrations'))")
+            try:
+                done = set(applied_versions(cursor))
+                conn.commit()
+                for version, description, migration in MIGRATIONS:
+                    if version in done:
+                        continue
+                    logging.info(f"Applying migration {version}: {description}")
+                    migration(cursor, config)
+                    cursor.execute(
+                        "insert into schema_migrations(version, description) values(%s, %s)",
+                        (version, description)
+                    )
+                    conn.commit()
+                    applied.append(version)
+            finally:
+                conn.rollback()
+                cursor.execute("select pg_advisory_unlock(hashtext('schema_migrations'))")
+    logging.info(f"Applied migrations: {applied or 'none'}")
+    return applied
+
+
+def hot_queries(cursor) -> List[Tuple[str, str, tuple]]:
+    '''(label, sql, params) for the queries the application runs most'''
+    cursor.execute("select embedding::text from bug_embeddings limit 1")
+    row = cursor.fetchone()
+    queries = [
+        ("duplicate check (find_existing_incident_numbers)",
+         "select incident_number from bugs where incident_number = any(%s)", (["INC0000001", "INC0000002"],)),
+        ("incidents by days summary (get_incidents_by_days)", INCIDENT_SUMMARY_QUERY, {"days": 7}),
+        ("incident numbers by days (get_incidents_by_days)",
+         "select incident_number from bugs where sys_created_on >= localtimestamp - interval '7 days' and sys_created_on <= localtimestamp order by sys_created_on desc",
+         ()),
+    ]
+    if row:
+        vector = row[0]
+        # same SQL as inside search_similar_bugs, with the parameters inlined
+        for content_type in (None,) + CONTENT_TYPES:
+            content_filter = f"and be.content_type = '{content_type}'" if content_type else ""
+            sql = (SEARCH_QUERY_TEMPLATE
+                   .replace("{content_filter}", content_filter)
+                   .replace("$1", "%(vector)s::vector")
+                   .replace("$2", "%(product)s")
+                   .replace("$3", "%(threshold)s")
+                   .replace("$4", "%(limit)s"))
+            queries.append((
+                f"vector search, content_type={content_type}",
+                sql,
+                {"vector": vector, "product": None, "threshold": 0.5, "limit": 5},
+            ))
+        sql = (HYBRID_QUERY_TEMPLATE
+               .replace("{content_filter}", "")
+               .replace("$1", "%(vector)s::vector")
+               .replace("$2", "%(product)s")
+               .replace("$3", "%(threshold)s")
+               .replace("$4", "%(limit)s")
+               .replace("$5", "%(query_text)s")
+               .replace("$6", "%(rrf_k)s"))
+        queries.append((
+            "hybrid search (vector + lexical, RRF)",
+            sql,
+            {"vector": vector, "product": None, "threshold": 0.5, "limit": 5, "query_text": "error timeout", "rrf_k": RRF_K},
+        ))
+    return queries
+
+
+def explain(rag_system, config: VectorIndexConfig):
+    '''Print EXPLAIN ANALYZE for each hot query'''
+    with rag_system.get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            apply_search_settings(cursor, config)
+            for label, sql, params in hot_queries(cursor):
+                cursor.execute(f"explain (analyze, buffers) {sql}", params)
+                print(f"=== {label}")
+                for (line,) in cursor.fetchall():
+                    print(line)
+                print()
+            conn.rollback()
+
+
+def main():
+    from config import get_env_vars
+    from rag_service import get_rag_system
+
+    parser = argparse.ArgumentParser(description="Manage the bugs / bug_embeddings schema")
+    parser.add_argument("command", choices=["migrate", "status", "explain", "rebuild-rollup"])
+    args = parser.parse_args()
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        level=logging.INFO
+    )
+    config = VectorIndexConfig.from_env(get_env_vars())
+    rag_system = get_rag_system()
+
+    if args.command == "migrate":
+        migrate(rag_system, config)
+    elif args.command == "status":
+        with rag_system.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                done = set(applied_versions(cursor))
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending':8} {description}")
+    elif args.command == "rebuild-rollup":
+        with rag_system.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                rebuild_daily_rollup(cursor)
+            conn.commit()
+    else:
+        explain(rag_system, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from constants import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL
+
+'''
+Search result cache
+
+Results of handler_search.search_bugs are kept for ttl seconds, up to
+max_entries (least recently used evicted first). Keys are the normalised
+search parameters plus the embedding model. Every entry remembers the data
+generation it was computed at (see BugRagSystem.get_data_generation); a lookup
+at a different generation is a miss, so stored or updated bugs are never hidden
+by a stale entry.
+'''
+
+SearchKey = Tuple[Hashable, ...]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    generation: Hashable
+    expires_at: float
+    compute_seconds: float # how long the uncached search took
+
+
+def normalize_query_text(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip())
+
+
+class SearchResultCache:
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[SearchKey, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0 # misses caused by expiry or a newer data generation
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(query: str, limit: int, content_type: Optional[str], product_filter: Optional[str],
+                 similarity_threshold: float, embedding_model: str, group_by_bug: bool = False,
+                 aggregation: str = "max") -> SearchKey:
+        return (
+            normalize_query_text(query),
+            int(limit),
+            content_type or None,
+            product_filter or None,
+            round(float(similarity_threshold), 6),
+            embedding_model,
+            aggregation if group_by_bug else None,
+        )
+
+    def get(self, key: SearchKey, generation: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.generation != generation or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                self.stale += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.compute_seconds
+            return entry.value
+
+    def put(self, key: SearchKey, generation: Hashable, value: Any, compute_seconds: float = 0.0):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(value, generation, time.monotonic() + self.ttl, compute_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_latency_ms": round(self.saved_seconds * 1000, 1),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+            }
@@ -0,0 +1,72 @@
+import numpy as np
+
+from ann_index import IVFIndex, spherical_kmeans
+from local_search_index import LocalVectorIndex, normalize_rows
+
+DIMENSION = 32
+
+
+def cluster_centers(n_clusters: int) -> np.ndarray:
+    return normalize_rows(np.random.default_rng(0).normal(size=(n_clusters, DIMENSION)).astype(np.float32))
+
+
+def clustered_vectors(n_clusters: int, per_cluster: int, seed: int = 0, noise: float = 0.15) -> np.ndarray:
+    # per_cluster points around each of the (fixed) centers, grouped by cluster
+    rng = np.random.default_rng(seed + 1)
+    points = np.repeat(cluster_centers(n_clusters), per_cluster, axis=0)
+    points += noise * rng.normal(size=points.shape)
+    return normalize_rows(points.astype(np.float32))
+
+
+def rows(vectors: np.ndarray):
+    return [
+        {"embedding_id": i + 1, "bug_id": i + 1, "content_type": "description", "embedding": vector,
+         "incident_number": f"INC{i + 1}", "product": "p", "description": "", "closing_notes": ""}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def test_spherical_kmeans_improves_on_its_seeds():
+    vectors = clustered_vectors(8, 50, noise=0.05)
+    seeds = spherical_kmeans(vectors, 8, iterations=0)
+    centroids = spherical_kmeans(vectors, 8, iterations=10)
+    assert centroids.shape == (8, DIMENSION)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+    # mean cosine similarity of every point to its nearest centroid
+    fit = (vectors @ centroids.T).max(axis=1).mean()
+    assert fit >= (vectors @ seeds.T).max(axis=1).mean()
+    assert fit > 0.85
+
+
+def test_spherical_kmeans_caps_clusters_at_the_number_of_vectors():
+    vectors = clustered_vectors(2, 2)
+    assert spherical_kmeans(vectors, 8).shape == (4, DIMENSION)
+
+
+def test_ivf_recall_against_exact_scan():
+    vectors = clustered_vectors(16, 60)
+    ivf = IVFIndex(DIMENSION, n_lists=16, nprobe=4)
+    exact = LocalVectorIndex(DIMENSION)
+    ivf.add(rows(vectors))
+    exact.add(rows(vectors))
+    assert ivf.is_trained
+
+    queries = clustered_vectors(16, 3, seed=1)
+    found = expected = 0
+    for query in queries:
+        approximate = {row["bug_id"] for row in ivf.search(query, limit=10, similarity_threshold=-1.0)}
+        truth = {row["bug_id"] for row in exact.search(query, limit=10, similarity_threshold=-1.0)}
+        found += len(approximate & truth)
+        expected += len(truth)
+    assert found / expected >= 0.9
+
+
+def test_ivf_probing_every_list_is_exact():
+    vectors = clustered_vectors(16, 60)
+    ivf = IVFIndex(DIMENSION, n_lists=16, nprobe=16)
+    exact = LocalVectorIndex(DIMENSION)
+    ivf.add(rows(vectors))
+    exact.add(rows(vectors))
+    query = clustered_vectors(1, 1, seed=2)[0]
+    assert ([row["bug_id"] for row in ivf.search(query, limit=5, similarity_threshold=-1.0)]
+            == [row["bug_id"] for row in exact.search(query, limit=5, similarity_threshold=-1.0)])
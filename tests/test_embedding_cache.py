@@ -0,0 +1,44 @@
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "test-model"
+# 4 float32 values: 16 bytes per vector
+VECTOR = [0.1, 0.2, 0.3, 0.4]
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = EmbeddingCache(max_bytes=3 * 16)
+    cache.put_many(MODEL, ["a", "b", "c"], [VECTOR] * 3)
+    # a is used, so b is the least recently used
+    assert cache.get(MODEL, "a") is not None
+    cache.put(MODEL, "d", VECTOR)
+    assert cache.get(MODEL, "b") is None
+    assert all(cache.get(MODEL, text) is not None for text in ("a", "c", "d"))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["size_bytes"] == 3 * 16
+
+
+def test_replacing_an_entry_keeps_the_size():
+    cache = EmbeddingCache(max_bytes=2 * 16)
+    cache.put(MODEL, "a", VECTOR)
+    cache.put(MODEL, "a", [0.5, 0.6, 0.7, 0.8])
+    cache.put(MODEL, "b", VECTOR)
+    assert cache.get(MODEL, "a") == pytest.approx([0.5, 0.6, 0.7, 0.8])
+    assert cache.stats()["size_bytes"] == 2 * 16
+
+
+def test_keys_include_the_model():
+    cache = EmbeddingCache(max_bytes=1024)
+    cache.put(MODEL, "a", VECTOR)
+    assert cache.get("other-model", "a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(max_bytes=1024, db_path=path).put(MODEL, "a", VECTOR)
+    cache = EmbeddingCache(max_bytes=1024, db_path=path)
+    assert cache.get(MODEL, "a") == pytest.approx(VECTOR)
+    assert cache.stats()["disk_hits"] == 1
@@ -0,0 +1,50 @@
+from datetime import date
+
+import pytest
+
+from intent_parser import INCIDENTS_BY_DAYS_TOOL, parse_days, parse_tool_call
+
+# a Thursday
+TODAY = date(2026, 10, 15)
+
+
+@pytest.mark.parametrize("text, days", [
+    ("incidents of the last 2 weeks", 14),
+    ("show me two-weeks of incidents", 14),
+    ("past month", 30),
+    ("last week", 7),
+    ("a couple of days", 2),
+    ("in 15 days", 15),
+    ("48 hours", 2),
+    ("1 hour", 1),
+    ("today", 1),
+    ("yesterday", 2),
+    ("this week", 4),
+    ("this month", 15),
+    ("since monday", 4),
+    ("since last monday", 4),
+    ("since thursday", 1),
+    ("since friday", 7),
+])
+def test_parse_days(text, days):
+    assert parse_days(text, TODAY) == days
+
+
+@pytest.mark.parametrize("text", [
+    "incidents in the last 1.5 weeks",
+    "1.5 hours",
+    "last 2,5 days",
+    "how many incidents are there",
+    "",
+    None,
+    # conflicting windows
+    "last week or the last 3 days",
+])
+def test_parse_days_leaves_to_llm(text):
+    assert parse_days(text, TODAY) is None
+
+
+def test_parse_tool_call():
+    assert parse_tool_call("incidents of the last 3 days") == (INCIDENTS_BY_DAYS_TOOL, {"days": 3, "include_details": False})
+    assert parse_tool_call("details of the incidents of the last week")[1] == {"days": 7, "include_details": True}
+    assert parse_tool_call("incidents in the last 1.5 weeks") is None
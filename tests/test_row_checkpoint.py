@@ -0,0 +1,27 @@
+from ingest_pipeline import RowCheckpoint
+
+
+def test_in_order():
+    checkpoint = RowCheckpoint()
+    checkpoint.mark([0, 1, 2], stored=True)
+    checkpoint.mark([3], stored=False)
+    assert checkpoint.to_dict() == {"last_committed_row": 3, "processed_count": 3, "skipped_count": 1}
+
+
+def test_out_of_order_batches_wait_for_the_gap():
+    checkpoint = RowCheckpoint()
+    checkpoint.mark([5, 6, 7], stored=True)
+    checkpoint.mark([3], stored=False)
+    assert checkpoint.to_dict() == {"last_committed_row": -1, "processed_count": 0, "skipped_count": 0}
+    checkpoint.mark([0, 1, 2], stored=True)
+    assert checkpoint.to_dict() == {"last_committed_row": 3, "processed_count": 3, "skipped_count": 1}
+    checkpoint.mark([4], stored=True)
+    assert checkpoint.to_dict() == {"last_committed_row": 7, "processed_count": 7, "skipped_count": 1}
+
+
+def test_resume_from_start_row():
+    checkpoint = RowCheckpoint(start_row=10, processed_count=8, skipped_count=2)
+    checkpoint.mark([11], stored=True)
+    assert checkpoint.last_committed_row == 9
+    checkpoint.mark([10], stored=False)
+    assert checkpoint.to_dict() == {"last_committed_row": 11, "processed_count": 9, "skipped_count": 3}
@@ -0,0 +1,29 @@
+from bug_rag_system import _rrf_fuse
+
+
+def row(bug_id: int, score: float, content_type: str = "description"):
+    return {"bug_id": bug_id, "content_type": content_type, "similarity_score": score}
+
+
+def test_bugs_in_both_rankings_come_first():
+    vector = [row(1, 0.9), row(2, 0.8), row(3, 0.7)]
+    lexical = [row(3, 0.7, "resolution"), row(4, 0.6, "resolution")]
+    fused = _rrf_fuse(vector, lexical, rrf_k=60, limit=10)
+    assert [r["bug_id"] for r in fused] == [3, 1, 2, 4]
+
+
+def test_keeps_the_vector_row_of_a_bug():
+    fused = _rrf_fuse([row(1, 0.9, "combined")], [row(1, 0.5, "resolution")], rrf_k=60, limit=10)
+    assert fused == [row(1, 0.9, "combined")]
+
+
+def test_one_row_per_bug_and_limit():
+    vector = [row(1, 0.9), row(1, 0.8, "resolution"), row(2, 0.7)]
+    fused = _rrf_fuse(vector, [], rrf_k=60, limit=1)
+    assert [r["bug_id"] for r in fused] == [1]
+
+
+def test_equal_fused_scores_are_ordered_by_similarity():
+    # rank 1 in one list each: same fused score
+    fused = _rrf_fuse([row(1, 0.6)], [row(2, 0.8)], rrf_k=60, limit=10)
+    assert [r["bug_id"] for r in fused] == [2, 1]
@@ -1,21 +1,13 @@
 import logging
-from bug_rag_system import BugRagSystem
-from config import read_env_file
+from rag_service import get_rag_system
 from result_data import Result
 
-def get_incidents_by_days_tool(days: int) -> Result:
+def get_incidents_by_days_tool(days: int, include_details: bool = False) -> Result:
     
-    env_vars = read_env_file()
-    rag_system = BugRagSystem({
-        "host": env_vars.get("DB_HOST"),
-        "database": env_vars.get("DB_NAME"),
-        "user": env_vars.get("DB_USERNAME"),
-        "password": env_vars.get("DB_PASSWORD"),
-        "port": env_vars.get("DB_PORT")
-    })
+    rag_system = get_rag_system()
 
     try:
-        incidents = rag_system.get_incidents_by_days(days)
+        incidents = rag_system.get_incidents_by_days(days, include_details)
         logging.info(f"raw Incidents responses: {incidents}")
         if not incidents or not incidents.count > 0:
             logging.warning("No incidents found for the given days")
@@ -1,14 +1,22 @@
 # handler_tool_manager.py - Alternative approach
 from tool_find_days import get_incidents_by_days_tool
+from intent_parser import parse_days
 import logging
 import json
-import ollama
-from typing import Dict, Any, List
+import os
+import threading
+from typing import Dict, Any, List, Tuple
 from result_data import Result
 
+# per process: (pid, model name) -> OllamaToolCaller, see get_tool_caller
+_tool_callers: Dict[Tuple[int, str], "OllamaToolCaller"] = {}
+_tool_callers_lock = threading.Lock()
+
 class ToolManager:
     """Manages tool definitions and execution for Ollama"""
-    
+
+    _tool_definitions: List[Dict[str, Any]] = None # built once per process, shared by all instances
+
     def __init__(self):
         self.tools = {}
         self._register_tools()
@@ -27,6 +35,10 @@ class ToolManager:
                         'days': {
                             'type': 'number',
                             'description': 'Number of days'
+                        },
+                        'include_details': {
+                            'type': 'boolean',
+                            'description': 'Also return the full incident records, only when the user asks for them'
                         }
                     },
                     'required': ['days']
@@ -36,14 +48,21 @@ class ToolManager:
 
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """Get all tool definitions for Ollama"""
-        return list(self.tools.values())
+        if ToolManager._tool_definitions is None:
+            ToolManager._tool_definitions = list(self.tools.values())
+        return ToolManager._tool_definitions
 
     def convert_to_days(self,days_param) -> int:
         """Convert time period to days"""
         if isinstance(days_param, int):
             return days_param
+        if isinstance(days_param, float):
+            return int(days_param)
         if isinstance(days_param, str):
             s = days_param.lower().strip()
+            days = parse_days(s)
+            if days is not None:
+                return days
             if 'week' in s:
                 num = [int(x) for x in s.split() if x.isdigit()]
                 return num[0] * 7 if num else 7
@@ -74,7 +93,8 @@ class ToolManager:
                 days_raw = arguments.get('days', 7)
                 days = self.convert_to_days(days_raw)
                 logging.info(f"Days: {days}")
-                result = get_incidents_by_days_tool(days)
+                include_details = str(arguments.get('include_details', False)).lower() == 'true'
+                result = get_incidents_by_days_tool(days, include_details)
                 logging.info(f"Result: {result}")
 
                 return result
@@ -84,10 +104,24 @@ class ToolManager:
             logging.error(f"Error executing {tool_name}: {str(e)}")
             return Result(error=True, message=f"Error executing {tool_name}: {str(e)}", result=None)
 
+def get_tool_caller(model_name: str = "qwen3:0.6b") -> "OllamaToolCaller":
+    """This process's OllamaToolCaller for model_name, created (and the model checked) on first use"""
+    key = (os.getpid(), model_name)
+    caller = _tool_callers.get(key)
+    if caller is None:
+        with _tool_callers_lock:
+            caller = _tool_callers.get(key)
+            if caller is None:
+                caller = _tool_callers[key] = OllamaToolCaller(model_name)
+    return caller
+
+
 class OllamaToolCaller:
     """Main class for Ollama tool calling"""
     
     def __init__(self, model_name: str = "qwen3:0.6b"):
+        #imported here: only messages the intent parser cannot resolve need the model
+        import ollama
         self.tool_manager = ToolManager()
         self.client = ollama.Client()
         self.model_name = model_name